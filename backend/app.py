@@ -1,343 +1,186 @@
+import math
 import os
-import io
-import re
 import time
 import json
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-from google.cloud import vision
-from PIL import Image, ImageEnhance, ImageFilter
-import pytesseract
 # Removed Groq import - using pure rule-based parsing
 from dotenv import load_dotenv
-import boto3
-from botocore.exceptions import ClientError, NoCredentialsError
 
-# Load environment variables
+# Load environment variables (before the local modules read their settings)
 load_dotenv()
 
+from batch_upload import BatchError, collect_images, get_batch_executor, stream_batch
+from card_dedup import dedup_index_from_env
+from card_export import ExportError, filters_from_args, get_format, open_source, stream_export
+from card_parser import extract_business_card_info, parse_confidence
+from card_search import SEARCH_MAX_RESULTS, search_index_from_env
+from metrics import CONTENT_TYPE, PARSE_SECONDS, RATE_LIMITED, REQUEST_BYTES, REQUEST_SECONDS, render
+from ocr_cache import cache_from_env
+from ocr_logging import DEBUG_HEADER, begin_request, configure_logging, end_request, request_log
+from ocr_jobs import QueueFull, job_queue_from_env
+from ocr_limits import current_user, rate_limiter_from_env, set_current_user, user_key
+from upload_archive import archive_from_env
+from ocr_clients import textract_pool, vision_pool
+from image_preprocess import prepare_upload
+from ocr_backends import backend_health, run_ocr, warm_backends
+
 app = Flask(__name__)
 CORS(app)
 
+# Structured logs go through a background queue so requests never wait on stdout
+configure_logging()
+
 # Set up Google Cloud Vision credentials
 os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = '/home/maverick/Documents/PROJECTS/Card_OCR/business-card-465407-b9c5a04b327b.json'
 
 # Removed Groq client - using pure rule-based parsing
 
-# Initialize AWS Textract client
-def get_textract_client():
-    """Initialize AWS Textract client with credentials from environment"""
-    aws_access_key = os.getenv('AWS_ACCESS_KEY_ID')
-    aws_secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
-    aws_region = os.getenv('AWS_REGION', 'us-east-1')
-    
-    if aws_access_key and aws_secret_key:
-        return boto3.client(
-            'textract',
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-            region_name=aws_region
-        )
-    else:
-        # Try using default AWS credentials (from ~/.aws/credentials or IAM role)
-        try:
-            return boto3.client('textract', region_name=aws_region)
-        except NoCredentialsError:
-            return None
-
-def extract_text_with_textract(image_data):
-    """Extract text using Amazon Textract"""
-    try:
-        client = get_textract_client()
-        if not client:
-            raise Exception("AWS Textract credentials not configured")
-        
-        # Call Textract
-        response = client.detect_document_text(
-            Document={'Bytes': image_data}
-        )
-        
-        # Extract text from response
-        text_lines = []
-        for item in response['Blocks']:
-            if item['BlockType'] == 'LINE':
-                text_lines.append(item['Text'])
-        
-        return '\n'.join(text_lines)
-        
-    except Exception as e:
-        raise Exception(f"Amazon Textract failed: {str(e)}")
+# OCR backends are imported on first use; import them up front instead (with gunicorn --preload,
+# in the master, so every worker shares them copy-on-write)
+if os.getenv('OCR_WARM_BACKENDS', 'false').lower() in ('1', 'true', 'yes'):
+    warm_backends()
 
-# AI parsing function removed - using pure rule-based parsing
+# Cache of OCR results keyed by image content (None when disabled)
+ocr_cache = cache_from_env()
 
-def extract_business_card_info(text):
-    """Enhanced rule-based extraction of structured information from OCR text"""
-    print(f"Extracting business card info from: {text}")
-    
-    # Initialize result structure
-    info = {
-        'name': '',
-        'company': '',
-        'title': '',
-        'phone': '',
-        'email': '',
-        'website': '',
-        'address': '',
-        'raw_text': text
-    }
-    
-    if not text or text.strip() == '':
-        return info
-    
-    # Split the text into lines and clean them
-    lines = text.split('\n')
-    lines = [line.strip() for line in lines if line.strip()]
-    lines = [line for line in lines if not re.match(r'^[\s\-_=]+$', line)]  # Remove separator lines
-    
-    print(f"Cleaned lines: {lines}")
-    
-    # Enhanced regex patterns
-    phone_patterns = [
-        r'\+?1?[-.\s]?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}',  # US format
-        r'\+\d{1,3}[-.\s]?\d{8,15}',  # International format
-        r'\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b'  # Simple format
-    ]
-    # Enhanced email pattern to handle OCR errors (allows numbers that might be letters)
-    email_pattern = r'\b[A-Za-z0-9._%-]+@[A-Za-z0-9.-]+\.[A-Za-z0-9]{2,}\b'
-    website_patterns = [
-        r'https?://[A-Za-z0-9.-]+\.[A-Za-z]{2,}(?:/\S*)?',
-        r'www\.[A-Za-z0-9.-]+\.[A-Za-z]{2,}(?:/\S*)?',
-        r'\b[A-Za-z0-9-]+\.[A-Za-z]{2,}\b'
-    ]
-    
-    # Title keywords (comprehensive list)
-    title_keywords = [
-        'CEO', 'CTO', 'CFO', 'COO', 'President', 'Director', 'Manager', 'Senior', 'Lead',
-        'Engineer', 'Developer', 'Designer', 'Analyst', 'Consultant', 'Specialist',
-        'Executive', 'Vice President', 'VP', 'Assistant', 'Coordinator', 'Supervisor',
-        'Partner', 'Founder', 'Owner', 'Principal', 'Chief', 'Head', 'Administrator',
-        'Sales', 'Marketing', 'Operations', 'Finance', 'HR', 'Human Resources',
-        'Account', 'Project', 'Product', 'Business', 'Strategy', 'Technical'
-    ]
-    
-    # Company indicators
-    company_indicators = [
-        'Inc', 'Corp', 'Corporation', 'LLC', 'Ltd', 'Limited', 'Company', 'Co.',
-        'Solutions', 'Services', 'Systems', 'Technologies', 'Tech', 'Group', 'Associates',
-        'Partners', 'Consulting', 'Holdings', 'Enterprises', 'International', 'Global',
-        'Industries', 'Ventures', 'Capital', 'Fund', 'Bank', 'Insurance', 'Healthcare'
-    ]
-    
-    used_lines = set()
-    
-    # Extract contact information first (most reliable)
-    for i, line in enumerate(lines):
-        # Extract email
-        email_match = re.search(email_pattern, line)
-        if email_match and not info['email']:
-            info['email'] = email_match.group()
-            used_lines.add(i)
-            continue
-        
-        # Extract phone
-        for phone_pattern in phone_patterns:
-            phone_match = re.search(phone_pattern, line)
-            if phone_match and not info['phone']:
-                # Clean up phone number
-                phone = re.sub(r'[^\d+()-.\s]', '', phone_match.group()).strip()
-                info['phone'] = phone
-                used_lines.add(i)
-                break
-        
-        # Extract website
-        for website_pattern in website_patterns:
-            website_match = re.search(website_pattern, line)
-            if website_match and not info['website'] and '@' not in line:
-                website = website_match.group()
-                # Add www. prefix if needed
-                if not website.startswith(('http', 'www.')):
-                    website = 'www.' + website
-                info['website'] = website
-                used_lines.add(i)
-                break
-    
-    # Extract title and company using keywords
-    for i, line in enumerate(lines):
-        if i in used_lines:
-            continue
-            
-        # Check for title keywords
-        has_title = any(keyword.lower() in line.lower() for keyword in title_keywords)
-        if has_title and not info['title'] and len(line) > 2:
-            info['title'] = line
-            used_lines.add(i)
-            continue
-        
-        # Check for company indicators
-        has_company = any(indicator.lower() in line.lower() for indicator in company_indicators)
-        if has_company and not info['company'] and len(line) > 2:
-            info['company'] = line
-            used_lines.add(i)
-            continue
-    
-    # Extract name (first meaningful line that's not contact info, title, or company)
-    for i, line in enumerate(lines[:5]):  # Check first 5 lines for name
-        if i in used_lines:
-            continue
-            
-        # Name heuristics (allow numbers for OCR errors like D0e)
-        if (len(line) > 2 and len(line) < 50 and 
-            re.match(r'^[A-Za-z0-9\s\.\-\']+$', line) and  # Allow numbers for OCR errors
-            not info['name'] and
-            any(c.isalpha() for c in line)):  # Must have at least one letter
-            info['name'] = line
-            used_lines.add(i)
-            break
-    
-    # Fill in missing company with remaining meaningful lines
-    if not info['company']:
-        for i, line in enumerate(lines):
-            if i in used_lines:
-                continue
-                
-            # Company heuristics
-            if (len(line) > 3 and
-                (line.isupper() or len(line.split()) <= 4) and  # All caps or short
-                line != info['name']):
-                info['company'] = line
-                used_lines.add(i)
-                break
-    
-    # Extract address from remaining lines
-    address_keywords = [
-        'street', 'st', 'avenue', 'ave', 'road', 'rd', 'suite', 'floor',
-        'building', 'blvd', 'boulevard', 'drive', 'dr', 'lane', 'ln', 'way',
-        'plaza', 'place', 'court', 'ct'
-    ]
-    
-    address_lines = []
-    for i, line in enumerate(lines):
-        if i in used_lines:
-            continue
-            
-        lower_line = line.lower()
-        has_address_keyword = any(keyword in lower_line for keyword in address_keywords)
-        has_number = bool(re.search(r'\d', line))
-        is_zip_code = bool(re.search(r'\b\d{5}(-\d{4})?\b', line))
-        is_city_state = bool(re.search(r'[A-Z][a-z]+,\s*[A-Z]{2}\s*\d{5}', line))
-        
-        if has_address_keyword and has_number or is_zip_code or is_city_state:
-            address_lines.append(line)
-            used_lines.add(i)
-            
-            # Check next line for continuation
-            if i + 1 < len(lines) and (i + 1) not in used_lines:
-                next_line = lines[i + 1]
-                if (re.search(r'[A-Z][a-z]+,\s*[A-Z]{2}\s*\d{5}', next_line) or
-                    re.search(r'\b\d{5}(-\d{4})?\b', next_line)):
-                    address_lines.append(next_line)
-                    used_lines.add(i + 1)
-    
-    # If no specific address found, use remaining lines as potential address
-    if not address_lines:
-        for i, line in enumerate(lines):
-            if i in used_lines or len(line) < 5:
-                continue
-            # Potential address if it has numbers or multiple words
-            if re.search(r'\d', line) or len(line.split()) >= 2:
-                address_lines.append(line)
-                used_lines.add(i)
-    
-    if address_lines:
-        info['address'] = ', '.join(address_lines)
-    
-    print(f"Final extracted info: {info}")
-    return info
+# Sampled, size-capped copies of uploaded images (None when disabled)
+upload_archive = archive_from_env()
+
+# Keys of stored entries for spotting repeat scans of the same contact (None when disabled)
+dedup_index = dedup_index_from_env()
+
+# Trigram index of stored entries for fuzzy search, loaded in the background (None when disabled)
+search_index = search_index_from_env()
+
+# Per-user token bucket on uploaded cards (None when disabled)
+rate_limiter = rate_limiter_from_env()
+
+# AI parsing function removed - using pure rule-based parsing
 
 def perform_ocr_with_rule_based_parsing(image_data):
     """Enhanced OCR with rule-based structured parsing (no AI)"""
-    ocr_text = ""
-    ocr_method = ""
-    
-    # Step 1: Extract text using OCR (Priority: Textract > Google Vision > Tesseract)
-    try:
-        # Try Amazon Textract first
-        ocr_text = extract_text_with_textract(image_data)
-        ocr_method = 'amazon_textract'
-        print(f"Amazon Textract successful, extracted {len(ocr_text)} characters")
-        
-    except Exception as textract_error:
-        print(f"Amazon Textract failed: {str(textract_error)}")
-        
-        try:
-            # Fallback to Google Cloud Vision
-            client = vision.ImageAnnotatorClient()
-            image = vision.Image(content=image_data)
-            response = client.text_detection(image=image)
-            
-            if response.error.message:
-                raise Exception(f'Vision API error: {response.error.message}')
-            
-            texts = response.text_annotations
-            if not texts:
-                raise Exception('No text found in image')
-            
-            ocr_text = texts[0].description
-            ocr_method = 'google_vision'
-            print(f"Google Vision successful, extracted {len(ocr_text)} characters")
-            
-        except Exception as vision_error:
-            print(f"Google Vision API failed: {str(vision_error)}")
-            print("Falling back to Tesseract OCR...")
-            
-            try:
-                # Final fallback to Tesseract OCR with preprocessing
-                image = Image.open(io.BytesIO(image_data))
-                
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                
-                # Image preprocessing for better OCR results
-                enhancer = ImageEnhance.Contrast(image)
-                image = enhancer.enhance(1.5)
-                
-                enhancer = ImageEnhance.Sharpness(image)
-                image = enhancer.enhance(2.0)
-                
-                image = image.filter(ImageFilter.MedianFilter())
-                
-                # Try multiple Tesseract configurations
-                custom_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz.@-+()[]{}/:;,!?$%&*# '
-                ocr_text = pytesseract.image_to_string(image, config=custom_config)
-                
-                if not ocr_text.strip():
-                    custom_config = r'--oem 3 --psm 3'
-                    ocr_text = pytesseract.image_to_string(image, config=custom_config)
-                
-                if not ocr_text.strip():
-                    custom_config = r'--oem 3 --psm 4'
-                    ocr_text = pytesseract.image_to_string(image, config=custom_config)
-                
-                if not ocr_text.strip():
-                    raise Exception('No text found in image using Tesseract')
-                
-                ocr_method = 'tesseract'
-                print(f"Tesseract successful, extracted {len(ocr_text)} characters")
-                
-            except Exception as tesseract_error:
-                raise Exception(f"All OCR methods failed. Textract: {str(textract_error)}, Google Vision: {str(vision_error)}, Tesseract: {str(tesseract_error)}")
+    # Step 1: Extract text using the OCR backends (default priority: Textract > Google Vision > Tesseract),
+    # each receiving the image orientation-corrected and downscaled to suit it
+    upload = prepare_upload(image_data)
+    ocr_text, ocr_method = run_ocr(image_data, upload)
+    bytes_saved = upload.bytes_saved(ocr_method)
+    request_log().note(ocr_method=ocr_method, image_bytes_saved=bytes_saved, text_chars=len(ocr_text))
     
     # Step 2: Parse OCR text with enhanced rule-based parsing (no AI)
-    parsed_data = extract_business_card_info(ocr_text)
+    with PARSE_SECONDS.time():
+        parsed_data = extract_business_card_info(ocr_text)
+    request_log().note(parse_confidence=parse_confidence(parsed_data))
     
     return {
         'raw_text': ocr_text,
         'parsed_data': parsed_data,
         'ocr_method': ocr_method,
         'parsing_method': 'rule_based',
+        'image_bytes_saved': bytes_saved,
         'success': True
     }
 
+def process_image(image_data):
+    """Run OCR (or reuse a cached result) and build the /upload response body"""
+    # Reuse the result of an identical earlier upload if we have one
+    cached = ocr_cache.get(image_data) if ocr_cache else None
+    request_log().note(image_bytes=len(image_data), cached=bool(cached))
+    if cached:
+        return with_duplicates({
+            'text': cached['raw_text'],
+            'parsed_data': cached['parsed_data'],
+            'ocr_method': cached['ocr_method'],
+            'parsing_method': 'rule_based',
+            'success': True,
+            'cached': True
+        })
+
+    # Perform OCR with rule-based parsing (no AI)
+    result = perform_ocr_with_rule_based_parsing(image_data)
+    if ocr_cache:
+        ocr_cache.put(image_data, result)
+
+    return with_duplicates({
+        'text': result['raw_text'],
+        'parsed_data': result['parsed_data'],
+        'ocr_method': result['ocr_method'],
+        'parsing_method': result['parsing_method'],
+        'success': result['success'],
+        'cached': False
+    })
+
+def with_duplicates(body):
+    """Add already-stored entries that look like the same contact (not cached: the index keeps changing)"""
+    if dedup_index:
+        body['possible_duplicates'] = dedup_index.check(body['parsed_data'])
+        request_log().note(possible_duplicates=len(body['possible_duplicates']))
+    return body
+
+def error_body(error):
+    """Response body for a failed upload"""
+    return {
+        'error': str(error),
+        'text': '',
+        'parsed_data': {
+            'name': '',
+            'title': '',
+            'company': '',
+            'email': '',
+            'phone': '',
+            'website': '',
+            'address': ''
+        },
+        'success': False
+    }
+
+# Polled endpoints that get no per-request summary record
+UNLOGGED_PATHS = ('/health', '/metrics')
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if request.path not in UNLOGGED_PATHS:
+        g.request_log = begin_request(request.method, request.path, request.headers.get(DEBUG_HEADER))
+
+@app.after_request
+def record_request_time(response):
+    """Request latency by route (time to first byte for streamed responses) and the request summary"""
+    if request.url_rule is not None and request.url_rule.rule != '/metrics':
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                endpoint=request.url_rule.rule, status=str(response.status_code))
+    if 'request_log' in g:
+        log = g.request_log
+        response.headers['X-Request-ID'] = log.request_id
+        if response.is_streamed:
+            # Batch cards are still running: summarize once the stream has been sent
+            response.call_on_close(lambda: log.finish(response.status_code))
+        else:
+            log.finish(response.status_code)
+    return response
+
+@app.teardown_request
+def end_request_log(error=None):
+    if 'request_log' in g:
+        end_request(g.request_log)
+
+# Background OCR workers for POST /upload?async=1
+job_queue = job_queue_from_env(process_image, error_body)
+MAX_JOB_WAIT_SECONDS = 30
+
+def begin_upload(endpoint, cards=1):
+    """Tag the request with the uploading user and charge their rate limit; returns a 429 response when over it"""
+    user_name = user_key(request.form.get('username'), request.remote_addr)
+    set_current_user(user_name)
+    request_log().note(user=user_name)
+    wait = rate_limiter.acquire(user_name, cards) if rate_limiter else 0
+    if not wait:
+        return None
+    RATE_LIMITED.inc(endpoint=endpoint)
+    response = jsonify({'error': f'Upload rate limit reached, retry in {math.ceil(wait)} s', 'success': False})
+    response.headers['Retry-After'] = str(math.ceil(wait))
+    return response, 429
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     try:
@@ -347,62 +190,186 @@ def upload_file():
         file = request.files['image']
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
+
+        limited = begin_upload('/upload')
+        if limited:
+            return limited
         
         # Read image data
         image_data = file.read()
+        REQUEST_BYTES.observe(len(image_data), endpoint='/upload')
         
-        # Save uploaded image for debugging (optional)
-        debug_mode = True  # Set to False in production
-        if debug_mode:
+        # Keep a copy of the upload for debugging (written in the background)
+        if upload_archive:
+            upload_archive.submit(image_data)
+
+        # Async mode: queue the image and hand back a job id straight away
+        if request.args.get('async') in ('1', 'true'):
             try:
-                os.makedirs('static/uploads', exist_ok=True)
-                debug_path = f'static/uploads/debug_{int(time.time())}.jpg'
-                with open(debug_path, 'wb') as f:
-                    f.write(image_data)
-                print(f"Debug: Saved uploaded image to {debug_path}")
-            except Exception as debug_err:
-                print(f"Debug save failed: {debug_err}")
-
-        # Perform OCR with rule-based parsing (no AI)
-        result = perform_ocr_with_rule_based_parsing(image_data)
-        
-        return jsonify({
-            'text': result['raw_text'],
-            'parsed_data': result['parsed_data'],
-            'ocr_method': result['ocr_method'],
-            'parsing_method': result['parsing_method'],
-            'success': result['success']
-        })
+                job_id = job_queue.submit(image_data, current_user())
+            except QueueFull as e:
+                response = jsonify({'error': f'OCR queue is full, retry later ({str(e)})', 'success': False})
+                response.headers['Retry-After'] = '5'
+                return response, 429
+            return jsonify({
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': f'/jobs/{job_id}'
+            }), 202
+
+        return jsonify(process_image(image_data))
         
     except Exception as e:
-        print(f"Error: {str(e)}")
-        return jsonify({
-            'error': str(e),
-            'text': '',
-            'parsed_data': {
-                'name': '',
-                'title': '',
-                'company': '',
-                'email': '',
-                'phone': '',
-                'website': '',
-                'address': ''
-            },
-            'success': False
-        }), 500
+        request_log().note(error=str(e))
+        return jsonify(error_body(e)), 500
+
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """OCR many cards (files under 'images' and/or ZIP archives), streaming NDJSON as each finishes"""
+    files = request.files.getlist('images') + request.files.getlist('image')
+    try:
+        images = collect_images(files)
+    except BatchError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+    for _, image_data in images:
+        REQUEST_BYTES.observe(len(image_data), endpoint='/upload/batch')
+    request_log().note(cards=len(images))
+    limited = begin_upload('/upload/batch', cards=len(images))
+    if limited:
+        return limited
+
+    return Response(stream_batch(images, process_image, error_body, current_user()), mimetype='application/x-ndjson')
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status of an async upload; ?wait=N long-polls up to N seconds for the result"""
+    try:
+        wait = min(float(request.args.get('wait', 0)), MAX_JOB_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+
+    job = job_queue.get(job_id, wait=wait)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    body = {'job_id': job_id, 'status': job['status']}
+    if 'result' in job:
+        body.update(job['result'])
+    return jsonify(body)
+
+@app.route('/export', methods=['GET'])
+def export_entries():
+    """Stream business_card_entries as CSV, JSONL or vCard 4.0, a chunk of rows at a time.
+
+    Filters: user_name, company, created_from and created_to (ISO 8601, end exclusive).
+    """
+    try:
+        export_format = get_format(request.args.get('format'))
+        filters = filters_from_args(request.args)
+    except ExportError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+
+    try:
+        chunks = stream_export(open_source(), export_format, filters)
+        # Runs the query, so a database error is still a normal error response
+        first = next(chunks)
+    except Exception as e:
+        request_log().note(error=str(e))
+        return jsonify({'error': f'Export failed: {str(e)}', 'success': False}), 500
+    request_log().note(export_format=export_format.extension, filters=sorted(filters))
+
+    def body():
+        yield first
+        yield from chunks
+
+    response = Response(body(), content_type=export_format.content_type)
+    response.headers['Content-Disposition'] = f'attachment; filename="business_cards.{export_format.extension}"'
+    return response
+
+@app.route('/entries', methods=['POST'])
+def index_entry():
+    """Add a stored entry ({"id": ..., "user_name": ..., "name": ..., "ocr_text": ...}) to the duplicate
+    and search indexes, replacing any earlier version, and return its likely duplicates"""
+    if not (dedup_index or search_index):
+        return jsonify({'error': 'Entry indexes are disabled', 'success': False}), 503
+    entry = request.get_json(silent=True) or {}
+    if not isinstance(entry.get('id'), int):
+        return jsonify({'error': 'An integer entry id is required', 'success': False}), 400
+
+    body = {'id': entry['id'], 'success': True}
+    if dedup_index:
+        body['possible_duplicates'] = dedup_index.add(entry['id'], entry)
+        request_log().note(possible_duplicates=len(body['possible_duplicates']))
+    if search_index:
+        search_index.add(entry['id'], entry)
+    request_log().note(entry_id=entry['id'])
+    return jsonify(body)
+
+@app.route('/entries/<int:entry_id>', methods=['DELETE'])
+def unindex_entry(entry_id):
+    """Drop a deleted entry from the duplicate and search indexes"""
+    if not (dedup_index or search_index):
+        return jsonify({'error': 'Entry indexes are disabled', 'success': False}), 503
+    removed = [index.remove(entry_id) for index in (dedup_index, search_index) if index]
+    if not any(removed):
+        return jsonify({'error': 'Entry not indexed', 'success': False}), 404
+    return jsonify({'id': entry_id, 'success': True})
+
+@app.route('/search', methods=['GET'])
+def search_entries():
+    """Fuzzy search of stored entries by name, company, title and OCR text: ?q=...&user_name=...&limit=..."""
+    if not search_index:
+        return jsonify({'error': 'Search is disabled', 'success': False}), 503
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required', 'success': False}), 400
+    try:
+        limit = min(int(request.args.get('limit', 10)), SEARCH_MAX_RESULTS)
+    except ValueError:
+        return jsonify({'error': 'limit must be a whole number', 'success': False}), 400
+
+    results = search_index.search(query, user_name=request.args.get('user_name'), limit=max(limit, 1))
+    request_log().note(results=len(results))
+    return jsonify({'query': query, 'results': results, 'loading': search_index.loading, 'success': True})
+
+def health_body(message='Flask server is running'):
+    """Service health plus cache, queue, backend and client statistics"""
+    health = {'status': 'healthy', 'message': message}
+    if ocr_cache:
+        health['ocr_cache'] = ocr_cache.stats()
+    if upload_archive:
+        health['upload_archive'] = upload_archive.stats()
+    if dedup_index:
+        health['dedup_index'] = dedup_index.stats()
+    if search_index:
+        health['search_index'] = search_index.stats()
+    if rate_limiter:
+        health['rate_limit'] = rate_limiter.stats()
+    health['ocr_jobs'] = job_queue.stats()
+    health['ocr_batch'] = get_batch_executor().stats()
+    health['ocr_backends'] = backend_health()
+    health['ocr_clients'] = {pool.name: pool.stats() for pool in (textract_pool, vision_pool)}
+    return health
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'message': 'Flask server is running'})
+    return jsonify(health_body())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Latency histograms and counters in the Prometheus text format (per worker process)"""
+    return Response(render(), content_type=CONTENT_TYPE)
+
+TEST_OCR_BODY = {
+    'tesseract_available': True,
+    'message': 'OCR service is ready',
+    'fallback_enabled': True
+}
 
 @app.route('/test-ocr', methods=['GET'])
 def test_ocr():
     """Test endpoint to verify OCR functionality"""
-    return jsonify({
-        'tesseract_available': True,
-        'message': 'OCR service is ready',
-        'fallback_enabled': True
-    })
+    return jsonify(TEST_OCR_BODY)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
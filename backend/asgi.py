@@ -0,0 +1,248 @@
+"""
+Native asyncio serving path for the OCR service.
+
+Serves the same /upload, /health, /test-ocr and /metrics endpoints as the Flask app
+without a thread per request: OCR API calls are awaited, while normalization,
+parsing and Tesseract run in executors. Run with:
+
+    uvicorn asgi:app --workers 2
+"""
+
+import json
+import math
+import os
+import time
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+import app as flask_app
+from async_ocr import cpu_executor, perform_ocr_async, run_cpu
+from metrics import CONTENT_TYPE, RATE_LIMITED, REQUEST_BYTES, REQUEST_SECONDS, render
+from ocr_limits import current_user, set_current_user, user_key
+from ocr_logging import DEBUG_HEADER, begin_request, end_request, request_log
+
+MAX_UPLOAD_BYTES = int(os.getenv('OCR_ASGI_MAX_UPLOAD_BYTES', str(20 * 1024 * 1024)))
+
+
+class BadRequest(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+async def read_upload(receive, headers, field_name='image'):
+    """Stream a multipart body through the decoder, returning (filename, bytes, text fields) of one file field"""
+    mimetype, options = parse_options_header(headers.get(b'content-type', b'').decode('latin-1'))
+    boundary = options.get('boundary')
+    if mimetype != 'multipart/form-data' or not boundary:
+        raise BadRequest('No image file provided')
+
+    decoder = MultipartDecoder(boundary.encode('latin-1'), max_parts=100)
+    filename, chunks, current, size = None, [], None, 0
+    fields, field = {}, None
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise BadRequest('Client disconnected')
+        body = message.get('body', b'')
+        more_body = message.get('more_body', False)
+        size += len(body)
+        if size > MAX_UPLOAD_BYTES:
+            raise BadRequest(f'Upload is larger than {MAX_UPLOAD_BYTES} bytes', status=413)
+        if body:
+            decoder.receive_data(body)
+        if not more_body:
+            decoder.receive_data(None)
+
+        event = decoder.next_event()
+        while not isinstance(event, (NeedData, Epilogue)):
+            if isinstance(event, File):
+                current, field = event.name, None
+                if current == field_name:
+                    filename = event.filename
+            elif isinstance(event, Field):
+                current, field = None, event.name
+                fields[field] = b''
+            elif isinstance(event, Data) and current == field_name:
+                chunks.append(event.data)
+            elif isinstance(event, Data) and field is not None:
+                fields[field] += event.data
+            event = decoder.next_event()
+
+    if filename is None:
+        raise BadRequest('No image file provided')
+    if filename == '':
+        raise BadRequest('No file selected')
+    return filename, b''.join(chunks), {name: value.decode('utf-8', 'replace') for name, value in fields.items()}
+
+
+async def process_image_async(image_data):
+    """Async counterpart of app.process_image, sharing its OCR cache"""
+    ocr_cache = flask_app.ocr_cache
+    cached = await run_cpu(ocr_cache.get, image_data) if ocr_cache else None
+    request_log().note(image_bytes=len(image_data), cached=bool(cached))
+    if cached:
+        return await with_duplicates_async({
+            'text': cached['raw_text'],
+            'parsed_data': cached['parsed_data'],
+            'ocr_method': cached['ocr_method'],
+            'parsing_method': 'rule_based',
+            'success': True,
+            'cached': True
+        })
+
+    result = await perform_ocr_async(image_data)
+    request_log().note(ocr_method=result['ocr_method'], image_bytes_saved=result['image_bytes_saved'],
+                       text_chars=len(result['raw_text']))
+    if ocr_cache:
+        await run_cpu(ocr_cache.put, image_data, result)
+
+    return await with_duplicates_async({
+        'text': result['raw_text'],
+        'parsed_data': result['parsed_data'],
+        'ocr_method': result['ocr_method'],
+        'parsing_method': result['parsing_method'],
+        'success': result['success'],
+        'cached': False
+    })
+
+
+async def with_duplicates_async(body):
+    """Async counterpart of app.with_duplicates (the SQLite lookup runs in the CPU executor)"""
+    dedup_index = flask_app.dedup_index
+    if dedup_index:
+        body['possible_duplicates'] = await run_cpu(dedup_index.check, body['parsed_data'])
+        request_log().note(possible_duplicates=len(body['possible_duplicates']))
+    return body
+
+
+async def send_json(send, status, body, headers=()):
+    await send_body(send, status, json.dumps(body).encode('utf-8'), b'application/json', headers)
+
+
+async def send_body(send, status, payload, content_type, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', content_type),
+            (b'content-length', str(len(payload)).encode('ascii')),
+            (b'access-control-allow-origin', b'*'),
+            *headers,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def upload(receive, send, headers):
+    try:
+        filename, image_data, fields = await read_upload(receive, headers)
+    except BadRequest as e:
+        return await send_json(send, e.status, {'error': str(e)})
+
+    # Requests start out keyed by client address; the username sent with the upload replaces it
+    if fields.get('username', '').strip():
+        set_current_user(user_key(fields['username']))
+    user_name = current_user()
+    request_log().note(user=user_name)
+    wait = 0
+    if flask_app.rate_limiter:
+        wait = await run_cpu(flask_app.rate_limiter.acquire, user_name)
+    if wait:
+        RATE_LIMITED.inc(endpoint='/upload')
+        return await send_json(send, 429, {'error': f'Upload rate limit reached, retry in {math.ceil(wait)} s',
+                                           'success': False},
+                               headers=[(b'retry-after', str(math.ceil(wait)).encode('ascii'))])
+
+    REQUEST_BYTES.observe(len(image_data), endpoint='/upload')
+    if flask_app.upload_archive:
+        flask_app.upload_archive.submit(image_data)
+
+    try:
+        body = await process_image_async(image_data)
+    except Exception as e:
+        request_log().note(error=str(e))
+        return await send_json(send, 500, flask_app.error_body(e))
+    await send_json(send, 200, body)
+
+
+async def health(receive, send, headers):
+    body = await run_cpu(flask_app.health_body, 'ASGI server is running')
+    await send_json(send, 200, body)
+
+
+async def test_ocr(receive, send, headers):
+    await send_json(send, 200, flask_app.TEST_OCR_BODY)
+
+
+async def metrics(receive, send, headers):
+    await send_body(send, 200, render().encode('utf-8'), CONTENT_TYPE.encode('ascii'))
+
+
+ROUTES = {
+    ('POST', '/upload'): upload,
+    ('GET', '/health'): health,
+    ('GET', '/test-ocr'): test_ocr,
+    ('GET', '/metrics'): metrics,
+}
+
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+    (b'access-control-allow-headers', b'*'),
+]
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                cpu_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http':
+        return
+
+    method, path = scope['method'], scope['path'].rstrip('/') or '/'
+    if method == 'OPTIONS':
+        await send({'type': 'http.response.start', 'status': 204, 'headers': CORS_HEADERS})
+        return await send({'type': 'http.response.body', 'body': b''})
+
+    handler = ROUTES.get((method, path))
+    if handler is None:
+        allowed = any(route_path == path for _, route_path in ROUTES)
+        return await send_json(send, 405 if allowed else 404,
+                               {'error': 'Method not allowed' if allowed else 'Not found'})
+    headers = dict(scope['headers'])
+    if handler is metrics:
+        return await handler(receive, send, headers)
+
+    status = []
+    log = None
+    client = scope.get('client')
+    set_current_user(user_key(None, client[0] if client else None))
+    if path not in flask_app.UNLOGGED_PATHS:
+        log = begin_request(method, path, headers.get(DEBUG_HEADER.lower().encode('latin-1'), b'').decode('latin-1'))
+
+    async def send_recording_status(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+            if log:
+                message = dict(message, headers=[*message['headers'], (b'x-request-id', log.request_id.encode('ascii'))])
+        await send(message)
+
+    start = time.perf_counter()
+    try:
+        await handler(receive, send_recording_status, headers)
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=path,
+                                status=str(status[0]) if status else '500')
+        if log:
+            log.finish(status[0] if status else 500)
+            end_request(log)
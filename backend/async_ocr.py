@@ -0,0 +1,228 @@
+import asyncio
+import base64
+import contextvars
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ocr_backends
+from card_parser import extract_business_card_info, parse_confidence
+from image_preprocess import prepare_upload
+from ocr_backends import BACKEND_LABELS, ImageRejected, NoTextFound, attempt_outcome, record_attempt, record_fallback
+from metrics import PARSE_SECONDS
+from ocr_layout import textract_text, vision_text
+from ocr_logging import request_log
+from ocr_clients import (
+    CONNECT_TIMEOUT, MAX_POOL_CONNECTIONS, READ_TIMEOUT, STUB_BACKENDS, STUB_LATENCY, STUB_TEXT,
+    ClientPool, textract_fingerprint, vision_fingerprint
+)
+
+# Executor for CPU-bound work (image normalization, parsing, in-thread Tesseract)
+CPU_WORKERS = int(os.getenv('OCR_ASYNC_CPU_WORKERS', str(os.cpu_count() or 1)))
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix='ocr-cpu')
+
+
+def run_cpu(function, *args):
+    """Run function on the CPU executor in a copy of this context, so it sees the request log and user"""
+    return asyncio.get_running_loop().run_in_executor(cpu_executor, contextvars.copy_context().run, function, *args)
+
+
+class AsyncTextractClient:
+    """Textract DetectDocumentText over a pooled async HTTP client, signed with SigV4"""
+
+    def __init__(self):
+        import botocore.session
+        import httpx
+
+        self.region = os.getenv('AWS_REGION', 'us-east-1')
+        self.endpoint = f'https://textract.{self.region}.amazonaws.com/'
+        self.credentials = botocore.session.get_session().get_credentials()
+        self.http = httpx.AsyncClient(
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=MAX_POOL_CONNECTIONS * 10, max_keepalive_connections=MAX_POOL_CONNECTIONS)
+        )
+
+    async def detect_document_text(self, image_data):
+        from botocore.auth import SigV4Auth
+        from botocore.awsrequest import AWSRequest
+        from ocr_textract import CREDENTIAL_ERROR_CODES, IMAGE_ERROR_CODES
+
+        if self.credentials is None:
+            raise Exception("AWS Textract credentials not configured")
+
+        body = json.dumps({'Document': {'Bytes': base64.b64encode(image_data).decode('ascii')}})
+        request = AWSRequest(method='POST', url=self.endpoint, data=body, headers={
+            'Content-Type': 'application/x-amz-json-1.1',
+            'X-Amz-Target': 'Textract.DetectDocumentText',
+        })
+        # Frozen credentials pick up refreshed IAM role keys between requests
+        SigV4Auth(self.credentials.get_frozen_credentials(), 'textract', self.region).add_auth(request)
+        response = await self.http.post(self.endpoint, content=body, headers=dict(request.headers.items()))
+
+        if response.status_code != 200:
+            try:
+                code = response.json().get('__type', '').split('#')[-1]
+            except ValueError:
+                code = ''
+            if code in CREDENTIAL_ERROR_CODES:
+                async_textract_pool.invalidate()
+            message = f"Amazon Textract failed: HTTP {response.status_code} {code or response.text[:200]}"
+            if code in IMAGE_ERROR_CODES:
+                raise ImageRejected(message)
+            raise Exception(message)
+        return response.json()
+
+
+class AsyncVisionClient:
+    """Google Vision text detection over the gRPC asyncio client"""
+
+    def __init__(self):
+        from google.cloud import vision
+
+        self.vision = vision
+        self.client = vision.ImageAnnotatorAsyncClient()
+
+    async def text_detection(self, image_data):
+        vision = self.vision
+        request = vision.AnnotateImageRequest(
+            image=vision.Image(content=image_data),
+            features=[vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)]
+        )
+        response = await self.client.batch_annotate_images(requests=[request], timeout=READ_TIMEOUT)
+        return response.responses[0]
+
+
+class AsyncStubClient:
+    """Local stand-in for both API backends; waits without holding a thread"""
+
+    def __init__(self, text=STUB_TEXT, latency=None):
+        self.text = text
+        self.latency = STUB_LATENCY if latency is None else latency
+
+    async def detect_document_text(self, image_data):
+        await asyncio.sleep(self.latency)
+        return {'Blocks': [{'BlockType': 'LINE', 'Text': line} for line in self.text.split('\n')]}
+
+    async def text_detection(self, image_data):
+        await asyncio.sleep(self.latency)
+        return AsyncStubVisionResponse(self.text)
+
+
+class AsyncStubVisionResponse:
+    def __init__(self, text):
+        self.error = type('Status', (), {'message': ''})()
+        self.text_annotations = [type('Annotation', (), {'description': text})()]
+
+
+def build_async_textract_client():
+    return AsyncStubClient() if 'textract' in STUB_BACKENDS else AsyncTextractClient()
+
+
+def build_async_vision_client():
+    return AsyncStubClient() if 'vision' in STUB_BACKENDS else AsyncVisionClient()
+
+
+async_textract_pool = ClientPool('textract_async', build_async_textract_client, textract_fingerprint)
+async_vision_pool = ClientPool('vision_async', build_async_vision_client, vision_fingerprint)
+
+
+async def extract_text_with_textract_async(image_data):
+    try:
+        response = await async_textract_pool.get().detect_document_text(image_data)
+    except (ImageRejected, NoTextFound):
+        raise
+    except Exception as e:
+        message = str(e)
+        raise Exception(message if message.startswith('Amazon Textract failed') else f"Amazon Textract failed: {message}")
+    return textract_text(response)
+
+
+async def extract_text_with_vision_async(image_data):
+    response = await async_vision_pool.get().text_detection(image_data)
+    if response.error.message:
+        raise Exception(f'Vision API error: {response.error.message}')
+    if not response.text_annotations:
+        raise NoTextFound('No text found in image')
+    return vision_text(response)
+
+
+async def extract_text_with_tesseract_async(image_data):
+    from tesseract_ocr import TESSERACT_PROCESSES, get_tesseract_executor, tesseract_text
+
+    loop = asyncio.get_running_loop()
+    if TESSERACT_PROCESSES > 0:
+        return await loop.run_in_executor(get_tesseract_executor(), tesseract_text, image_data)
+    return await run_cpu(tesseract_text, image_data)
+
+
+ASYNC_BACKENDS = {
+    'amazon_textract': extract_text_with_textract_async,
+    'google_vision': extract_text_with_vision_async,
+    'tesseract': extract_text_with_tesseract_async,
+}
+
+
+async def call_backend_async(name, image_data):
+    """Await one OCR backend, feeding the outcome to the shared circuit breaker"""
+    breaker = ocr_backends.BREAKERS[name]
+    start = time.perf_counter()
+    try:
+        ocr_text = await ASYNC_BACKENDS[name](image_data)
+    except (NoTextFound, ImageRejected) as e:
+        elapsed = time.perf_counter() - start
+        breaker.record_success(elapsed)
+        record_attempt(name, attempt_outcome(e), elapsed, e)
+        raise
+    except Exception as e:
+        elapsed = time.perf_counter() - start
+        breaker.record_failure(elapsed)
+        record_attempt(name, 'error', elapsed, e)
+        raise
+
+    elapsed = time.perf_counter() - start
+    breaker.record_success(elapsed)
+    record_attempt(name, 'success', elapsed)
+    return ocr_text
+
+
+async def run_ocr_chain_async(image_data, order=None):
+    """Async OCR fallback chain; returns (text, ocr_method, bytes_saved)"""
+    loop = asyncio.get_running_loop()
+    upload = prepare_upload(image_data)
+    errors = []
+    for name in order or ocr_backends.BACKEND_ORDER:
+        label = BACKEND_LABELS[name]
+        skipped = ocr_backends.skip_reason(name)
+        if skipped:
+            errors.append(f"{label}: {ocr_backends.SKIP_MESSAGES[skipped]}")
+            record_fallback(name, skipped=skipped)
+            continue
+        try:
+            payload = await run_cpu(upload.for_backend, name)
+            return await call_backend_async(name, payload), name, upload.bytes_saved(name)
+        except Exception as e:
+            errors.append(f"{label}: {str(e)}")
+            record_fallback(name, e)
+
+    raise Exception(f"All OCR methods failed. {', '.join(errors)}")
+
+
+def parse_timed(ocr_text):
+    with PARSE_SECONDS.time():
+        return extract_business_card_info(ocr_text)
+
+
+async def perform_ocr_async(image_data):
+    """Async counterpart of perform_ocr_with_rule_based_parsing"""
+    ocr_text, ocr_method, bytes_saved = await run_ocr_chain_async(image_data)
+    parsed_data = await run_cpu(parse_timed, ocr_text)
+    request_log().note(parse_confidence=parse_confidence(parsed_data))
+    return {
+        'raw_text': ocr_text,
+        'parsed_data': parsed_data,
+        'ocr_method': ocr_method,
+        'parsing_method': 'rule_based',
+        'image_bytes_saved': bytes_saved,
+        'success': True
+    }
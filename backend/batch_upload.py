@@ -0,0 +1,167 @@
+import io
+import json
+import logging
+import os
+import threading
+import zipfile
+from concurrent.futures import as_completed
+
+from ocr_limits import ANONYMOUS, FairExecutor, user_weights_from_env
+from ocr_logging import log_event
+
+log = logging.getLogger('ocr.batch')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff', '.gif', '.heic')
+
+# Cards processed at once across all batch requests in this worker, taken from each user's batches in turn
+BATCH_WORKERS = int(os.getenv('OCR_BATCH_WORKERS', '8'))
+BATCH_MAX_FILES = int(os.getenv('OCR_BATCH_MAX_FILES', '500'))
+BATCH_MAX_FILE_BYTES = int(os.getenv('OCR_BATCH_MAX_FILE_BYTES', str(20 * 1024 * 1024)))
+# Total image bytes in one batch, counted as ZIP entries are decompressed
+BATCH_MAX_BYTES = int(os.getenv('OCR_BATCH_MAX_BYTES', str(200 * 1024 * 1024)))
+
+batch_executor = None
+batch_executor_lock = threading.Lock()
+
+
+class BatchError(Exception):
+    """The batch request itself is unusable (as opposed to one card failing)"""
+
+
+def get_batch_executor():
+    global batch_executor
+    if batch_executor is None:
+        with batch_executor_lock:
+            if batch_executor is None:
+                batch_executor = FairExecutor(BATCH_WORKERS, user_weights_from_env(), name='ocr-batch')
+    return batch_executor
+
+
+def is_zip(file_storage):
+    return (file_storage.filename or '').lower().endswith('.zip') or file_storage.mimetype in (
+        'application/zip', 'application/x-zip-compressed')
+
+
+class BatchLimits:
+    """Count and size of the images collected for one batch, refused as soon as a limit is crossed"""
+
+    def __init__(self, max_files=None, max_file_bytes=None, max_bytes=None):
+        self.max_files = BATCH_MAX_FILES if max_files is None else max_files
+        self.max_file_bytes = BATCH_MAX_FILE_BYTES if max_file_bytes is None else max_file_bytes
+        self.max_bytes = BATCH_MAX_BYTES if max_bytes is None else max_bytes
+        self.files = 0
+        self.bytes = 0
+
+    def count(self):
+        """Count one more image, before any of it is read"""
+        self.files += 1
+        if self.files > self.max_files:
+            raise BatchError(f'A batch may contain at most {self.max_files} images')
+
+    def room(self):
+        """Bytes the next image may take: the per-file limit or what is left of the batch's"""
+        return min(self.max_file_bytes, self.max_bytes - self.bytes)
+
+    def add(self, name, size):
+        if size > self.max_file_bytes:
+            raise BatchError(f'{name} is larger than {self.max_file_bytes} bytes')
+        self.bytes += size
+        if self.bytes > self.max_bytes:
+            raise BatchError(f'A batch may contain at most {self.max_bytes} bytes of images')
+
+
+def read_zip(data, limits=None):
+    """Yield (filename, bytes) for every image inside a ZIP archive.
+
+    Entries are counted before they are decompressed, and each one is read
+    only up to the room left under the size limits: the sizes in the entry
+    headers are written by the uploader and cannot be trusted.
+    """
+    limits = limits or BatchLimits()
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile as e:
+        raise BatchError(f'Invalid ZIP archive: {str(e)}')
+
+    with archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or name.startswith('__MACOSX/') or os.path.basename(name).startswith('.'):
+                continue
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            limits.count()
+            room = limits.room()
+            if info.file_size > room:
+                # The header already admits to more than fits: refused without decompressing
+                limits.add(name, info.file_size)
+            try:
+                with archive.open(info) as entry:
+                    image_data = entry.read(room + 1)
+            except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError, OSError) as e:
+                raise BatchError(f'Cannot read {name} from the ZIP archive: {str(e)}')
+            limits.add(name, len(image_data))
+            yield name, image_data
+
+
+def collect_images(files, limits=None):
+    """Flatten uploaded files and ZIP archives into a list of (filename, bytes).
+
+    Every file is read only up to the room left under the size limits, so an
+    oversized upload is refused after one byte past the limit.
+    """
+    limits = limits or BatchLimits()
+    images = []
+    for file_storage in files:
+        name = file_storage.filename
+        if is_zip(file_storage):
+            room = limits.max_bytes - limits.bytes
+            data = file_storage.stream.read(room + 1)
+            if len(data) > room:
+                raise BatchError(f'{name} is larger than the {limits.max_bytes} bytes of images a batch may contain')
+            images.extend(read_zip(data, limits))
+            continue
+        data = file_storage.stream.read(limits.room() + 1)
+        if data:
+            limits.count()
+            limits.add(name, len(data))
+            images.append((name, data))
+    if not images:
+        raise BatchError('No images found in request')
+    return images
+
+
+def stream_batch(images, process, on_error, user_name=ANONYMOUS):
+    """Run every image through process() concurrently, yielding NDJSON lines as cards finish.
+
+    Each line carries the card's index and filename so the client can match
+    results to uploads; the last line is a summary. Cards queue behind the
+    user's own earlier cards, not behind other users' batches. The cards are
+    queued when this is called, in the request's context, so their backend
+    attempts reach its log.
+    """
+    executor = get_batch_executor()
+    futures = {executor.submit(user_name, process, data): (index, filename)
+               for index, (filename, data) in enumerate(images)}
+    return batch_lines(images, futures, on_error)
+
+
+def batch_lines(images, futures, on_error):
+    failed = 0
+    try:
+        for future in as_completed(futures):
+            index, filename = futures[future]
+            try:
+                body = future.result()
+            except Exception as e:
+                log_event(log, logging.WARNING, 'Batch card failed', filename=filename, error=str(e))
+                body = on_error(e)
+            if not body.get('success'):
+                failed += 1
+            yield json.dumps({'index': index, 'filename': filename, **body}) + '\n'
+    finally:
+        # Client went away: drop cards that have not started yet
+        for future in futures:
+            future.cancel()
+
+    yield json.dumps({'summary': {'total': len(images), 'succeeded': len(images) - failed, 'failed': failed}}) + '\n'
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Load-test the ASGI serving path against Flask under gunicorn.
+
+Both servers run with the API backends stubbed (OCR_STUB_BACKENDS) so the
+numbers reflect how each server waits on slow OCR calls, not the network.
+Reports throughput, latency percentiles and the servers' resident memory.
+
+    python bench_asgi.py --concurrency 300 --requests 1200 --latency-ms 500
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import subprocess
+import sys
+import time
+
+from PIL import Image
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def card_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (640, 400), 'white').save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def tree_rss_mb(pid):
+    """Resident memory of a process and its children (Linux /proc)"""
+    total = 0
+    pids = [pid]
+    while pids:
+        current = pids.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return total / 1024
+
+
+def upload_request(port, image):
+    """One pre-encoded multipart POST /upload, reused for every request"""
+    boundary = b'benchboundary'
+    body = (b'--' + boundary + b'\r\nContent-Disposition: form-data; name="image"; filename="card.jpg"\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + image + b'\r\n--' + boundary + b'--\r\n')
+    head = (f'POST /upload HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n'
+            f'Content-Type: multipart/form-data; boundary={boundary.decode()}\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n').encode('ascii')
+    return head + body
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response, returning its status code"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('server closed the connection')
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def wait_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f'GET /test-ocr HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n\r\n'.encode('ascii'))
+            status = await read_response(reader)
+            writer.close()
+            if status == 200:
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+async def load(port, image, requests, concurrency):
+    """Keep-alive connections issuing uploads back to back; a raw client keeps the load generator cheap"""
+    payload = upload_request(port, image)
+    latencies, errors = [], 0
+    remaining = requests
+
+    async def connection():
+        nonlocal remaining, errors
+        reader = writer = None
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(payload)
+                if await read_response(reader) != 200:
+                    errors += 1
+            except (OSError, ConnectionError, asyncio.IncompleteReadError):
+                errors += 1
+                writer = None
+            latencies.append(time.perf_counter() - start)
+        if writer is not None:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[connection() for _ in range(concurrency)])
+    return time.perf_counter() - start, sorted(latencies), errors
+
+
+def run_server(label, command, port, env, args, image):
+    server = subprocess.Popen(command, cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        asyncio.run(wait_ready(port))
+        idle = tree_rss_mb(server.pid)
+        elapsed, latencies, errors = asyncio.run(load(port, image, args.requests, args.concurrency))
+        busy = tree_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    print(f"{label:<24} {args.requests / elapsed:8.1f} req/s  p50 {p50:8.1f} ms  p95 {p95:8.1f} ms  "
+          f"errors {errors:4d}  RSS idle {idle:6.1f} MB  loaded {busy:6.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1200)
+    parser.add_argument('--concurrency', type=int, default=300)
+    parser.add_argument('--latency-ms', type=float, default=500, help='stubbed OCR API latency')
+    parser.add_argument('--workers', type=int, default=2, help='server processes for both servers')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    args = parser.parse_args()
+
+    env = dict(os.environ, OCR_STUB_BACKENDS='textract,vision', OCR_STUB_LATENCY_MS=str(args.latency_ms),
+               OCR_CACHE_ENABLED='false', OCR_HEDGE_ENABLED='false')
+    image = card_image()
+    print(f"{args.requests} uploads, {args.concurrency} concurrent, OCR latency {args.latency_ms:.0f} ms, "
+          f"{args.workers} workers")
+
+    run_server(f'flask+gunicorn ({args.threads}t)', [
+        sys.executable, '-m', 'gunicorn', '--bind', '127.0.0.1:8101', '--workers', str(args.workers),
+        '--threads', str(args.threads), '--timeout', '120', 'app:app'
+    ], 8101, env, args, image)
+    run_server('asgi+uvicorn', [
+        sys.executable, '-m', 'uvicorn', '--host', '127.0.0.1', '--port', '8102', '--workers', str(args.workers),
+        '--log-level', 'warning', 'asgi:app'
+    ], 8102, env, args, image)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Memory per parsed card: a list of result dicts against a columnar CardBatch.
+
+Parses a synthetic corpus both ways and reports the bytes allocated per card
+(tracemalloc), the parse time, and the size and load time of the batch file.
+
+    python bench_card_batch.py --cards 100000
+"""
+
+import argparse
+import gc
+import io
+import time
+import tracemalloc
+
+from card_batch import CardBatch
+from card_corpus import generate_cards
+from card_parser import RESULT_FIELDS, parse_batch
+
+
+def measure(build):
+    """(result, bytes allocated and still held by it, seconds)"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, held, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cards', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    texts = [card['text'] for card in generate_cards(args.cards, seed=args.seed)]
+    rows = [
+        ('dicts (parse_batch)', lambda: parse_batch(texts)),
+        ('CardBatch', lambda: parse_batch(texts, CardBatch())),
+        ('CardBatch + raw_text', lambda: parse_batch(texts, CardBatch(RESULT_FIELDS + ('raw_text',)))),
+    ]
+    baseline = None
+    batch = None
+    for label, build in rows:
+        result, held, elapsed = measure(build)
+        per_card = held / args.cards
+        baseline = baseline or per_card
+        print(f'{label:<22} {per_card:8.0f} bytes/card  {baseline / per_card:5.1f}x smaller  '
+              f'{args.cards / elapsed:8.0f} cards/s (traced)')
+        if isinstance(result, CardBatch) and batch is None:
+            batch = result
+        del result
+
+    buffer = io.BytesIO()
+    batch.write(buffer)
+    start = time.perf_counter()
+    loaded = CardBatch.read(io.BytesIO(buffer.getvalue()))
+    load_seconds = time.perf_counter() - start
+    assert loaded.column('email') == batch.column('email')
+    print(f'Batch file: {len(buffer.getvalue()) / args.cards:.0f} bytes/card, '
+          f'loaded in {load_seconds * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
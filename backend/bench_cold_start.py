@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Worker cold start: import time and memory of the app with lazily loaded OCR backends.
+
+Each scenario imports the app in a fresh interpreter and reports the wall
+time of the import and the resident memory afterwards:
+
+- lazy: the default, no OCR SDK is imported until a backend is first used
+- eager: OCR_WARM_BACKENDS=true, every backend imported at startup (what
+  the module-level SDK imports used to cost every worker)
+- tesseract only: OCR_BACKEND_ORDER=tesseract, the cloud SDKs are disabled
+
+Then it forks workers the way gunicorn does and sums their proportional set
+size (shared pages split between the processes sharing them) once each has
+loaded every backend: once with the backends imported after the fork, once
+with them warmed in the master first (--preload), where the workers share
+them copy-on-write.
+
+    python bench_cold_start.py --runs 5 --workers 4
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+IMPORT_SCRIPT = '''
+import json, os, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+rss = [int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmRSS')][0]
+print('RESULT', json.dumps({'seconds': elapsed, 'rss_kib': rss}))
+'''
+
+FORK_SCRIPT = '''
+import json, os, sys
+import app
+from ocr_backends import warm_backends
+
+preload, workers = sys.argv[1] == 'preload', int(sys.argv[2])
+if preload:
+    warm_backends()
+pipes = []
+for _ in range(workers):
+    read, write = os.pipe()
+    if os.fork() == 0:
+        warm_backends()
+        pss = [int(line.split()[1]) for line in open('/proc/self/smaps_rollup') if line.startswith('Pss:')][0]
+        os.write(write, str(pss).encode())
+        os._exit(0)
+    os.close(write)
+    pipes.append(read)
+pss = [int(os.read(read, 64)) for read in pipes]
+for _ in pipes:
+    os.wait()
+print('RESULT', json.dumps({'workers_pss_kib': sum(pss)}))
+'''
+
+
+def run(script, env, *args):
+    output = subprocess.run([sys.executable, '-c', script, *args], env=dict(os.environ, **env), check=True,
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    return json.loads([line for line in output.splitlines() if line.startswith('RESULT ')][0][7:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    scenarios = [
+        ('lazy', {}),
+        ('eager', {'OCR_WARM_BACKENDS': 'true'}),
+        ('tesseract only', {'OCR_WARM_BACKENDS': 'true', 'OCR_BACKEND_ORDER': 'tesseract'}),
+    ]
+    for label, env in scenarios:
+        results = [run(IMPORT_SCRIPT, env) for _ in range(args.runs)]
+        print(f'{label:<15} import {statistics.median(r["seconds"] for r in results) * 1000:6.0f} ms  '
+              f'RSS {statistics.median(r["rss_kib"] for r in results) / 1024:6.1f} MiB')
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        print('No /proc/self/smaps_rollup here; skipping the fork comparison')
+        return
+    for label, mode in (('import after fork', 'lazy'), ('warmed in master', 'preload')):
+        pss = run(FORK_SCRIPT, {}, mode, str(args.workers))['workers_pss_kib']
+        print(f'{args.workers} workers, {label:<17} total PSS {pss / 1024:6.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Duplicate-check cost against the number of indexed entries.
+
+Indexes synthetic cards (clean field values, as stored) at growing sizes,
+then checks OCR-noisy rescans of the first few. The corpus only has a few
+hundred names, so the rest of the index is filled with made-up contacts,
+as a real table of distinct people would be. The time per check should
+stay flat as the index grows; recall is the share of rescans that find
+their original entry.
+
+    python bench_dedup.py --sizes 10000,100000,1000000 --checks 2000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from card_corpus import generate_cards
+from card_dedup import DedupIndex
+from card_parser import EXTRACTOR
+
+
+SYLLABLES = ['ka', 'ro', 'mi', 'sel', 'ta', 'vin', 'lo', 'ber', 'na', 'dor', 'fi', 'gan', 'ul', 'pe', 'zan',
+             'ti', 'mar', 'os', 'ke', 'wen', 'ha', 'lis', 'bo', 'rek']
+
+
+def made_up_word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+
+def made_up_entry(rng, entry_id):
+    first, last, company = made_up_word(rng), made_up_word(rng), made_up_word(rng)
+    return {'id': entry_id, 'name': f'{first} {last}', 'company': f'{company} {rng.choice(["Inc.", "GmbH", "Ltd"])}',
+            'email': f'{first}.{last}@{company}.com'.lower(),
+            'phone': f'+1 {rng.randint(201, 989)} {rng.randint(200, 999)} {rng.randint(0, 9999):04d}'}
+
+
+def entry_chunks(count, seed, real_entries, chunk_rows=5000):
+    cards = generate_cards(min(real_entries, count), seed=seed)
+    yield [dict(card['truth'], id=entry_id) for entry_id, card in enumerate(cards)]
+    rng = random.Random(seed)
+    for start in range(len(cards), count, chunk_rows):
+        yield [made_up_entry(rng, entry_id) for entry_id in range(start, min(start + chunk_rows, count))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000')
+    parser.add_argument('--checks', type=int, default=1000)
+    parser.add_argument('--noise', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    # Noisy rescans of the corpus cards, which are the first entries at every size
+    rescans = [EXTRACTOR.parse(card['text'])
+               for card in generate_cards(args.checks, seed=args.seed, noise=args.noise)]
+    with tempfile.TemporaryDirectory() as directory:
+        for size in [int(size) for size in args.sizes.split(',')]:
+            index = DedupIndex(os.path.join(directory, f'dedup-{size}.db'))
+            start = time.perf_counter()
+            index.rebuild(entry_chunks(size, args.seed, args.checks))
+            build_seconds = time.perf_counter() - start
+
+            timings, found = [], 0
+            for entry_id, record in enumerate(rescans):
+                start = time.perf_counter()
+                matches = index.check(record)
+                timings.append(time.perf_counter() - start)
+                found += any(match['id'] == entry_id for match in matches)
+            timings.sort()
+            print(f'{size:>9} entries  built at {size / build_seconds:6.0f}/s  '
+                  f'check median {statistics.median(timings) * 1000:6.3f} ms  '
+                  f'p99 {timings[int(len(timings) * 0.99)] * 1000:6.3f} ms  '
+                  f'recall {found / len(rescans):.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-request cost of building OCR clients versus reusing a pooled one.
+
+The OCR call itself goes to a local stub, so the numbers isolate client
+construction (credential resolution, endpoint and session setup).
+
+    python bench_ocr_clients.py --requests 200
+"""
+
+import argparse
+import os
+import time
+
+import ocr_clients
+from ocr_clients import ClientPool, StubTextractClient, StubVisionClient
+
+
+def timed(label, requests, fn):
+    start = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed / requests * 1000:8.3f} ms/request")
+    return elapsed
+
+
+def bench_textract(requests):
+    import boto3
+
+    # Dummy credentials: nothing is sent over the network
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+    stub = StubTextractClient()
+    image = {'Bytes': b'card'}
+
+    def per_request():
+        boto3.client('textract', region_name='us-east-1')
+        stub.detect_document_text(Document=image)
+
+    pool = ClientPool('textract', ocr_clients.build_textract_client, ocr_clients.textract_fingerprint)
+
+    def pooled():
+        pool.get()
+        stub.detect_document_text(Document=image)
+
+    print("Amazon Textract")
+    before = timed('  new boto3 client per request', requests, per_request)
+    after = timed('  pooled client', requests, pooled)
+    print(f"  saved {(before - after) / requests * 1000:.3f} ms/request ({pool.builds} client build)")
+
+
+def bench_vision(requests):
+    from google.cloud import vision
+
+    stub = StubVisionClient()
+    try:
+        vision.ImageAnnotatorClient()
+    except Exception as e:
+        print(f"Google Vision: skipped, client cannot be built here ({type(e).__name__})")
+        return
+
+    def per_request():
+        vision.ImageAnnotatorClient()
+        stub.text_detection(image=None)
+
+    pool = ClientPool('vision', ocr_clients.build_vision_client, ocr_clients.vision_fingerprint)
+
+    def pooled():
+        pool.get()
+        stub.text_detection(image=None)
+
+    print("Google Vision")
+    before = timed('  new Vision client per request', requests, per_request)
+    after = timed('  pooled client', requests, pooled)
+    print(f"  saved {(before - after) / requests * 1000:.3f} ms/request ({pool.builds} client build)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+    bench_textract(args.requests)
+    bench_vision(args.requests)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Parser benchmark on a synthetic card corpus, with a saved baseline.
+
+Measures extract_business_card_info throughput, per-field accuracy against
+the corpus ground truth (clean and with OCR-style noise, overall and per
+locale), both from plain text and from the line boxes an OCR backend would
+report for the rendered card, and end-to-end /upload latency with the OCR backends stubbed to
+return each card's text. Results are compared with the baseline JSON and the
+run exits non-zero on a regression.
+
+    python bench_parser.py                      # compare with the baseline
+    python bench_parser.py --update-baseline    # record a new baseline
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+from card_corpus import card_ocr_text, field_matches, generate_cards, render_card
+from card_parser import RESULT_FIELDS, CardExtractor, extract_business_card_info
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, 'bench_parser_baseline.json')
+# Layout parsing is opt-in (OCR_LAYOUT_PARSING), so it is measured through its own extractor
+LAYOUT_EXTRACTOR = CardExtractor(use_layout=True)
+
+
+def card_inputs(cards, layout=False):
+    """What the parser is given for each card: its text, or its lines with boxes"""
+    return [card_ocr_text(card) if layout else card['text'] for card in cards]
+
+
+def card_parser(layout=False):
+    return LAYOUT_EXTRACTOR.parse if layout else extract_business_card_info
+
+
+def bench_throughput(cards, repeats, layout=False):
+    """Best-of-N cards per second for extract_business_card_info (or the layout parser)"""
+    texts = card_inputs(cards, layout)
+    parse = card_parser(layout)
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for text in texts:
+            parse(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {'cards_per_second': round(len(texts) / best, 1), 'us_per_card': round(best / len(texts) * 1e6, 2)}
+
+
+def accuracy(cards, layout=False):
+    """Fraction of cards with each field extracted correctly, overall, per locale and per typesetting style"""
+    overall = {field: 0 for field in RESULT_FIELDS}
+    groups = {'by_locale': {}, 'by_style': {}}
+    parse = card_parser(layout)
+    for card, text in zip(cards, card_inputs(cards, layout)):
+        result = parse(text)
+        totals = [groups['by_locale'].setdefault(card['locale'], {'cards': 0, **{field: 0 for field in RESULT_FIELDS}}),
+                  groups['by_style'].setdefault(card['style'], {'cards': 0, **{field: 0 for field in RESULT_FIELDS}})]
+        for counts in totals:
+            counts['cards'] += 1
+        for field in RESULT_FIELDS:
+            if field_matches(field, card['truth'][field], result[field]):
+                overall[field] += 1
+                for counts in totals:
+                    counts[field] += 1
+    summary = {'overall': {field: round(hits / len(cards), 4) for field, hits in overall.items()}}
+    for group, totals in groups.items():
+        summary[group] = {
+            name: {field: round(counts[field] / counts['cards'], 4) for field in RESULT_FIELDS}
+            for name, counts in sorted(totals.items())
+        }
+    return summary
+
+
+def bench_upload(cards, latency):
+    """Per-request /upload latency with the OCR backend stubbed to return the card's own text"""
+    import app
+    import ocr_backends
+    from circuit_breaker import CircuitBreaker
+
+    images = [render_card(card, seed=index) for index, card in enumerate(cards)]
+    current = {'text': ''}
+
+    def stub_backend(image_data):
+        # Requests are sequential, so the card being uploaded is the current one
+        if latency:
+            time.sleep(latency)
+        return current['text']
+
+    saved = (ocr_backends.BACKENDS, ocr_backends.BREAKERS, ocr_backends.BACKEND_ORDER,
+             ocr_backends.HEDGE_ENABLED, app.ocr_cache, app.upload_archive)
+    ocr_backends.BACKENDS = {'amazon_textract': stub_backend}
+    ocr_backends.BREAKERS = {name: CircuitBreaker(name) for name in ocr_backends.BACKENDS}
+    ocr_backends.BACKEND_ORDER = ['amazon_textract']
+    ocr_backends.HEDGE_ENABLED = False
+    app.ocr_cache = None
+    app.upload_archive = None
+    # Per-request summary records would otherwise fill the report
+    log_level = logging.getLogger('ocr').level
+    logging.getLogger('ocr').setLevel(logging.WARNING)
+    latencies = []
+    try:
+        client = app.app.test_client()
+        for image, card in zip(images, cards):
+            current['text'] = card['text']
+            start = time.perf_counter()
+            response = client.post('/upload', data={'image': (io.BytesIO(image), 'card.jpg')})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f'/upload failed: {response.get_json()}')
+    finally:
+        (ocr_backends.BACKENDS, ocr_backends.BREAKERS, ocr_backends.BACKEND_ORDER,
+         ocr_backends.HEDGE_ENABLED, app.ocr_cache, app.upload_archive) = saved
+        logging.getLogger('ocr').setLevel(log_level)
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+    }
+
+
+def compare(result, baseline, speed_tolerance, accuracy_tolerance, latency_tolerance):
+    """Regression messages for result against baseline (empty when nothing regressed)"""
+    problems = []
+    config, expected_config = result['config'], baseline['config']
+
+    for section, label in (('parser', 'throughput'), ('layout_parser', 'layout throughput')):
+        if section not in result or section not in baseline:
+            continue
+        floor = baseline[section]['cards_per_second'] * (1 - speed_tolerance)
+        if result[section]['cards_per_second'] < floor:
+            problems.append(f"{label} {result[section]['cards_per_second']} cards/s is below {floor:.1f} "
+                            f"(baseline {baseline[section]['cards_per_second']})")
+
+    corpus = ('cards', 'seed')
+    if any(config[key] != expected_config[key] for key in corpus):
+        problems.append(f"corpus settings differ from the baseline ({expected_config}); "
+                        f"rerun with the same settings or --update-baseline")
+    else:
+        for section, label in (('accuracy', ''), ('layout_accuracy', 'layout ')):
+            for noise, fields in result.get(section, {}).items():
+                if noise not in baseline.get(section, {}):
+                    continue
+                for field, value in fields['overall'].items():
+                    expected = baseline[section][noise]['overall'][field]
+                    if value < expected - accuracy_tolerance:
+                        problems.append(f"{label}{field} accuracy at noise {noise} fell from {expected} to {value}")
+
+    upload = ('seed', 'upload_cards', 'upload_latency_ms')
+    if 'upload' in result and 'upload' in baseline and all(config[key] == expected_config[key] for key in upload):
+        ceiling = baseline['upload']['p95_ms'] * (1 + latency_tolerance)
+        if result['upload']['p95_ms'] > ceiling:
+            problems.append(f"/upload p95 {result['upload']['p95_ms']} ms is above {ceiling:.1f} ms "
+                            f"(baseline {baseline['upload']['p95_ms']} ms)")
+    return problems
+
+
+def print_report(result):
+    for section, label in (('parser', 'Parser'), ('layout_parser', 'Layout parser')):
+        print(f"{label}: {result[section]['cards_per_second']} cards/s ({result[section]['us_per_card']} us/card)")
+    for section, label in (('accuracy', 'Accuracy'), ('layout_accuracy', 'Layout accuracy')):
+        for noise, fields in result[section].items():
+            overall = '  '.join(f"{field} {value:.3f}" for field, value in fields['overall'].items())
+            print(f"{label} (noise {noise}): {overall}")
+            for locale, values in fields['by_locale'].items():
+                print(f"  {locale:<3} " + '  '.join(f"{field} {value:.3f}" for field, value in values.items()))
+            if section == 'layout_accuracy':
+                for style, values in fields.get('by_style', {}).items():
+                    print(f"  {style:<15} " + '  '.join(f"{field} {value:.3f}" for field, value in values.items()))
+    if 'upload' in result:
+        upload = result['upload']
+        print(f"/upload: p50 {upload['p50_ms']} ms  p95 {upload['p95_ms']} ms  mean {upload['mean_ms']} ms "
+              f"over {upload['requests']} requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cards', type=int, default=5000, help='text cards for throughput and accuracy')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--noise', default='0,0.03', help='comma-separated OCR noise rates for accuracy')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--upload-cards', type=int, default=200, help='rendered cards for /upload (0 to skip)')
+    parser.add_argument('--upload-latency-ms', type=float, default=0.0, help='stubbed OCR latency')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--speed-tolerance', type=float, default=0.4, help='allowed throughput drop (fraction)')
+    parser.add_argument('--accuracy-tolerance', type=float, default=0.005, help='allowed per-field accuracy drop')
+    parser.add_argument('--latency-tolerance', type=float, default=0.5, help='allowed /upload p95 increase (fraction)')
+    parser.add_argument('--output', help='also write this run\'s results to a JSON file')
+    args = parser.parse_args()
+
+    noise_levels = [float(level) for level in args.noise.split(',')]
+    result = {
+        'config': {'cards': args.cards, 'seed': args.seed, 'noise': noise_levels, 'upload_cards': args.upload_cards,
+                   'upload_latency_ms': args.upload_latency_ms},
+        'parser': bench_throughput(generate_cards(args.cards, seed=args.seed), args.repeats),
+        'layout_parser': bench_throughput(generate_cards(args.cards, seed=args.seed), args.repeats, layout=True),
+    }
+    for section, layout in (('accuracy', False), ('layout_accuracy', True)):
+        result[section] = {str(noise): accuracy(generate_cards(args.cards, seed=args.seed, noise=noise), layout)
+                           for noise in noise_levels}
+    if args.upload_cards:
+        result['upload'] = bench_upload(generate_cards(args.upload_cards, seed=args.seed + 1),
+                                        args.upload_latency_ms / 1000.0)
+    print_report(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    problems = compare(result, baseline, args.speed_tolerance, args.accuracy_tolerance, args.latency_tolerance)
+    for problem in problems:
+        print(f"REGRESSION: {problem}")
+    if not problems:
+        print(f"No regressions against {args.baseline}")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark Tesseract image preprocessing: original PIL chain vs NumPy pipeline.
+
+Generates a 12-megapixel phone-style photo of a business card (uneven
+lighting, sensor noise), then runs each pipeline in its own child process
+and reports median time and peak RSS growth over the decoded source image.
+
+    python bench_preprocess.py --runs 5
+    python bench_preprocess.py --image photo.jpg
+"""
+
+import argparse
+import io
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from image_preprocess import preprocess_with_numpy, preprocess_with_pil
+
+PIPELINES = {
+    'pil': preprocess_with_pil,
+    'numpy': preprocess_with_numpy,
+}
+
+CARD_LINES = [
+    ('John Smith', 150),
+    ('Senior Software Engineer', 90),
+    ('TechCorp Solutions Inc', 90),
+    ('john.smith@techcorp.com', 80),
+    ('(555) 123-4567', 80),
+    ('123 Technology Lane, Silicon Valley, CA 94105', 70),
+]
+
+
+def synthetic_photo(width=4000, height=3000, seed=0):
+    """JPEG bytes of a card photographed under uneven light"""
+    rng = np.random.default_rng(seed)
+    # Light falls off from the top-left corner
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    light = 230 - 90 * (xx / width + yy / height) / 2
+    noise = rng.normal(0, 6, size=(height, width)).astype(np.float32)
+    base = np.clip(light + noise, 0, 255).astype(np.uint8)
+    image = Image.merge('RGB', [Image.fromarray(base)] * 3)
+
+    draw = ImageDraw.Draw(image)
+    y = 500
+    for text, size in CARD_LINES:
+        draw.text((500, y), text, fill=(30, 30, 40), font_size=size)
+        y += int(size * 1.8)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def max_rss_bytes():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def run_pipeline(name, image_data, runs, results):
+    image = Image.open(io.BytesIO(image_data))
+    image.load()
+    baseline = max_rss_bytes()
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = PIPELINES[name](image)
+        timings.append(time.perf_counter() - start)
+        del output
+
+    results[name] = (statistics.median(timings), max_rss_bytes() - baseline, image.size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Tesseract preprocessing pipelines')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--image', help='Use this photo instead of a synthetic 12 MP card')
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            image_data = f.read()
+    else:
+        image_data = synthetic_photo()
+
+    manager = multiprocessing.Manager()
+    results = manager.dict()
+    for name in PIPELINES:
+        # Fresh process per pipeline so peak RSS is not shared between them
+        process = multiprocessing.Process(target=run_pipeline, args=(name, image_data, args.runs, results))
+        process.start()
+        process.join()
+
+    size = results['pil'][2]
+    print(f"Source image: {size[0]}x{size[1]} ({size[0] * size[1] / 1e6:.1f} MP), {args.runs} runs")
+    print(f"{'pipeline':<10} {'median ms':>10} {'peak RSS MB':>12}")
+    for name in PIPELINES:
+        seconds, peak, _ = results[name]
+        print(f"{name:<10} {seconds * 1000:>10.1f} {peak / 1e6:>12.1f}")
+
+    pil_time, pil_peak, _ = results['pil']
+    numpy_time, numpy_peak, _ = results['numpy']
+    print(f"NumPy pipeline is {pil_time / numpy_time:.1f}x faster, "
+          f"peak memory {pil_peak / max(numpy_peak, 1):.1f}x lower")
+
+
+if __name__ == '__main__':
+    main()
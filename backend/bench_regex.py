@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Worst-case parse time against input size on adversarial OCR text.
+
+Each family is a line (or lines) built to make the extraction patterns
+backtrack: long runs of address characters with no '@', domains with no
+TLD, digit and separator soup for the phone patterns, and so on. They are
+parsed with the length caps and time budget turned off, at growing sizes,
+and the growth exponent is fitted on a log-log scale. The run exits non-zero
+if any family grows faster than --max-exponent (1.0 is linear, 2.0 quadratic).
+
+    python bench_regex.py
+    python bench_regex.py --sizes 2000,8000,32000,128000
+"""
+
+import argparse
+import math
+import sys
+import time
+
+from card_parser import CardExtractor
+
+FAMILIES = {
+    'local_part_run': lambda n: 'a.' * (n // 2),
+    'hyphen_run': lambda n: 'a-' * (n // 2),
+    'domain_without_tld': lambda n: 'a@' + 'a.' * (n // 2),
+    'repeated_at': lambda n: 'a@a.' * (n // 4),
+    'www_without_tld': lambda n: 'www.' + 'a.' * (n // 2),
+    'url_without_tld': lambda n: 'http://' + 'a-' * (n // 2),
+    'digit_soup': lambda n: '1 ' * (n // 2),
+    'parenthesised_digits': lambda n: '(1' * (n // 2),
+    'international_prefixes': lambda n: '+1-' * (n // 3),
+    'short_digit_groups': lambda n: '123456789 ' * (n // 10),
+    'city_without_state': lambda n: 'Aa, ' * (n // 4),
+    'keyword_prefixes': lambda n: 'vice presiden' * (n // 13),
+    'many_lines': lambda n: 'a.a\n' * (n // 4),
+}
+
+
+def worst_case(extractor, text, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        extractor.parse(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def growth_exponent(sizes, seconds):
+    """Least-squares slope of log(time) against log(size)"""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(value, 1e-9)) for value in seconds]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    return (sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+            / sum((x - mean_x) ** 2 for x in xs))
+
+
+def run(sizes, repeats=3, families=FAMILIES):
+    """Per-family timings (seconds, one per size) and growth exponent"""
+    unbounded = CardExtractor(max_text_length=math.inf, max_line_length=math.inf, time_budget=math.inf)
+    results = {}
+    for name, build in families.items():
+        seconds = [worst_case(unbounded, build(size), repeats) for size in sizes]
+        results[name] = {'seconds': seconds, 'exponent': growth_exponent(sizes, seconds)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='2000,8000,32000,128000', help='comma-separated input sizes in characters')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--max-exponent', type=float, default=1.3)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = run(sizes, args.repeats)
+
+    print(f"{'family':<24}" + ''.join(f'{size:>11}' for size in sizes) + '   exponent')
+    failures = []
+    for name, result in results.items():
+        times = ''.join(f'{seconds * 1000:>9.2f}ms' for seconds in result['seconds'])
+        print(f'{name:<24}{times}   {result["exponent"]:.2f}')
+        if result['exponent'] > args.max_exponent:
+            failures.append(name)
+
+    # What a worker actually spends with the default limits on the largest input
+    capped = CardExtractor()
+    largest = max(sizes)
+    slowest = max(worst_case(capped, build(largest), args.repeats) for build in FAMILIES.values())
+    print(f'Slowest family with the default limits at {largest} chars: {slowest * 1000:.2f} ms')
+
+    for name in failures:
+        print(f'SUPERLINEAR: {name} grows with exponent {results[name]["exponent"]:.2f}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Fuzzy card search latency on a large index.
+
+Indexes synthetic cards (OCR-noisy text plus their parsed fields, spread
+over many users) and runs queries made from a name, company or title word
+of a random card with one character garbled the way OCR garbles it, such as
+"inn0vate" for "innovate". Reports build throughput, index size and query
+latency for all cards and scoped to one user, and the share of queries
+whose top result contains the intended word.
+
+    python bench_search.py --cards 1000000 --queries 2000
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from card_corpus import OCR_CONFUSIONS, generate_cards
+from card_dedup import fold
+from card_search import SearchIndex
+
+
+def card_records(count, seed, users, chunk_rows=50000):
+    for start in range(0, count, chunk_rows):
+        cards = generate_cards(min(chunk_rows, count - start), seed=f'{seed}-{start}', noise=0.03)
+        yield [{'id': start + offset, 'user_name': f'user{(start + offset) % users}', 'name': card['truth']['name'],
+                'company': card['truth']['company'], 'title': card['truth']['title'], 'ocr_text': card['text']}
+               for offset, card in enumerate(cards)]
+
+
+def garble(rng, word):
+    positions = [i for i, char in enumerate(word) if char in OCR_CONFUSIONS]
+    if not positions:
+        return word
+    i = rng.choice(positions)
+    return word[:i] + OCR_CONFUSIONS[word[i]] + word[i + 1:]
+
+
+def make_queries(rng, count, seed):
+    queries = []
+    for card in generate_cards(count, seed=f'{seed}-queries'):
+        field = rng.choice(['name', 'company', 'title'])
+        words = [word for word in card['truth'][field].split() if len(word) >= 4] or card['truth'][field].split()
+        word = rng.choice(words)
+        queries.append((garble(rng, word), word))
+    return queries
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return (statistics.median(timings) * 1000, timings[int(len(timings) * 0.95)] * 1000,
+            timings[int(len(timings) * 0.99)] * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cards', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    for records in card_records(args.cards, args.seed, args.users):
+        index.add_many(records)
+    build_seconds = time.perf_counter() - start
+    print(f'Indexed {args.cards} cards at {args.cards / build_seconds:.0f} cards/s: '
+          f'{index.nbytes() / 2 ** 20:.0f} MiB ({index.nbytes() / args.cards:.0f} bytes/card), '
+          f'{len(index.segments)} segments')
+
+    rng = random.Random(args.seed)
+    queries = make_queries(rng, args.queries, args.seed)
+    for label, user_name in (('all cards', None), ('one user', 'user7')):
+        timings, hits, results = [], 0, 0
+        for query, word in queries:
+            start = time.perf_counter()
+            found = index.search(query, user_name=user_name, limit=10)
+            timings.append(time.perf_counter() - start)
+            results += len(found)
+            if found:
+                top = fold(' '.join(found[0][field] for field in ('name', 'company', 'title')))
+                hits += all(part in top for part in fold(word))
+        median, p95, p99 = percentiles(timings)
+        print(f'{label:<10} median {median:6.2f} ms  p95 {p95:6.2f} ms  p99 {p99:6.2f} ms  '
+              f'{results / len(queries):4.1f} results/query  top hit {hits / len(queries):.3f}')
+    print('Example:', queries[0][0], '->', index.search(queries[0][0], limit=3))
+
+
+if __name__ == '__main__':
+    main()
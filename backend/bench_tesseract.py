@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Tesseract fallback: sequential retries vs confidence-driven mode.
+
+The worst case for the sequential mode is an image with no readable text,
+where all three page segmentation modes run one after another. Requires the
+tesseract binary.
+
+    python bench_tesseract.py --runs 3
+"""
+
+import argparse
+import statistics
+import time
+
+from PIL import Image, ImageDraw
+
+from tesseract_ocr import run_tesseract_sequential, run_tesseract_smart
+
+
+def blank_card():
+    return Image.new('L', (1050, 600), 255)
+
+
+def text_card():
+    image = Image.new('L', (1050, 600), 255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(['John Smith', 'Senior Software Engineer', 'john.smith@techcorp.com']):
+        draw.text((60, 60 + i * 90), line, fill=0, font_size=56)
+    return image
+
+
+def median_seconds(fn, image, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(image)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark Tesseract OCR modes')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    for label, image in [('blank card (worst case)', blank_card()), ('readable card', text_card())]:
+        sequential = median_seconds(run_tesseract_sequential, image, args.runs)
+        smart = median_seconds(run_tesseract_smart, image, args.runs)
+        print(f"{label:<24} sequential {sequential * 1000:8.0f} ms   smart {smart * 1000:8.0f} ms   "
+              f"({sequential / smart:.1f}x)")
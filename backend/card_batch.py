@@ -0,0 +1,220 @@
+import json
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+
+from card_parser import RESULT_FIELDS
+
+# Fields whose values repeat across a batch and are stored once each
+DICTIONARY_FIELDS = ('company', 'title', 'ocr_method')
+
+MAGIC = b'CARDCOL1'
+FOOTER_LENGTH = struct.Struct('<I')
+
+
+def little_endian(values):
+    """Bytes of an array in little-endian order, as written to batch files"""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def array_from(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+class StringColumn:
+    """Strings stored as one UTF-8 buffer plus end offsets, as in Arrow's string layout"""
+
+    kind = 'string'
+
+    def __init__(self, data=None, offsets=None):
+        self.data = bytearray() if data is None else data
+        self.offsets = array('I', [0]) if offsets is None else offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def append(self, value):
+        if not isinstance(self.data, bytearray):
+            # Loaded from a file: copy on first write
+            self.data = bytearray(self.data)
+        if value:
+            self.data += value.encode('utf-8')
+        self.offsets.append(len(self.data))
+
+    def get(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        if start == end:
+            return ''
+        with memoryview(self.data) as view:
+            return str(view[start:end], 'utf-8')
+
+    def nbytes(self):
+        return len(self.data) + self.offsets.itemsize * len(self.offsets)
+
+    def buffers(self):
+        return [little_endian(self.offsets), bytes(self.data)]
+
+    @classmethod
+    def from_buffers(cls, offsets, data):
+        return cls(data, array_from('I', offsets))
+
+
+class DictionaryColumn:
+    """Interned strings: each distinct value is stored once and rows hold its code"""
+
+    kind = 'dictionary'
+
+    def __init__(self, codes=None, values=None):
+        self.codes = array('I') if codes is None else codes
+        self.values = [] if values is None else values
+        self.index = {value: code for code, value in enumerate(self.values)}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def append(self, value):
+        value = value or ''
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def get(self, index):
+        return self.values[self.codes[index]]
+
+    def nbytes(self):
+        return self.codes.itemsize * len(self.codes) + sum(len(value.encode('utf-8')) + 4 for value in self.values)
+
+    def buffers(self):
+        dictionary = StringColumn()
+        for value in self.values:
+            dictionary.append(value)
+        return [little_endian(self.codes), *dictionary.buffers()]
+
+    @classmethod
+    def from_buffers(cls, codes, offsets, data):
+        dictionary = StringColumn.from_buffers(offsets, data)
+        return cls(array_from('I', codes), [dictionary.get(code) for code in range(len(dictionary))])
+
+
+COLUMN_KINDS = {'string': StringColumn, 'dictionary': DictionaryColumn}
+
+
+class CardRow(Mapping):
+    """Read-only view of one card in a batch; fields are decoded when looked up"""
+
+    __slots__ = ('batch', 'index')
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    def __getitem__(self, field):
+        return self.batch.columns[field].get(self.index)
+
+    def __iter__(self):
+        return iter(self.batch.fields)
+
+    def __len__(self):
+        return len(self.batch.fields)
+
+    def __repr__(self):
+        return f'CardRow({dict(self)!r})'
+
+
+class CardBatch:
+    """Parsed cards stored column by column instead of one dict per card.
+
+    String fields share a UTF-8 buffer per column; fields that repeat across
+    cards (DICTIONARY_FIELDS) are interned. Rows are read through CardRow
+    views, and a batch can be written to and read back from a single file.
+    """
+
+    def __init__(self, fields=RESULT_FIELDS, dictionary_fields=DICTIONARY_FIELDS, columns=None):
+        self.fields = tuple(fields)
+        if columns is None:
+            columns = {field: DictionaryColumn() if field in dictionary_fields else StringColumn()
+                       for field in self.fields}
+        self.columns = columns
+        self.length = len(columns[self.fields[0]]) if self.fields else 0
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('card index out of range')
+        return CardRow(self, index)
+
+    def __iter__(self):
+        for index in range(self.length):
+            yield CardRow(self, index)
+
+    def append(self, record):
+        """Add one card from a mapping of field -> string (missing fields are empty)"""
+        for field in self.fields:
+            self.columns[field].append(record.get(field))
+        self.length += 1
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def column(self, field):
+        """All values of one field, in row order"""
+        get = self.columns[field].get
+        return [get(index) for index in range(self.length)]
+
+    def nbytes(self):
+        """Bytes held in the column buffers"""
+        return sum(column.nbytes() for column in self.columns.values())
+
+    def write(self, stream):
+        """Write the batch: column buffers, then a JSON footer describing them (like Parquet)"""
+        stream.write(MAGIC)
+        position = len(MAGIC)
+        schema = []
+        for field in self.fields:
+            column = self.columns[field]
+            spans = []
+            for buffer in column.buffers():
+                stream.write(buffer)
+                spans.append([position, len(buffer)])
+                position += len(buffer)
+            schema.append({'name': field, 'kind': column.kind, 'buffers': spans})
+        footer = json.dumps({'rows': self.length, 'columns': schema}).encode('utf-8')
+        stream.write(footer)
+        stream.write(FOOTER_LENGTH.pack(len(footer)))
+        stream.write(MAGIC)
+
+    @classmethod
+    def read(cls, stream):
+        """Load a batch written by write(); string data is used in place, not copied per column"""
+        data = stream.read()
+        tail = len(MAGIC) + FOOTER_LENGTH.size
+        if len(data) < len(MAGIC) + tail or data[:len(MAGIC)] != MAGIC or data[-len(MAGIC):] != MAGIC:
+            raise ValueError('Not a card batch file')
+        footer_length, = FOOTER_LENGTH.unpack_from(data, len(data) - tail)
+        footer = json.loads(data[len(data) - tail - footer_length:len(data) - tail])
+
+        view = memoryview(data)
+        columns = {}
+        for spec in footer['columns']:
+            buffers = [view[start:start + length] for start, length in spec['buffers']]
+            columns[spec['name']] = COLUMN_KINDS[spec['kind']].from_buffers(*buffers)
+        fields = [spec['name'] for spec in footer['columns']]
+        batch = cls(fields, columns=columns)
+        if len(batch) != footer['rows']:
+            raise ValueError('Card batch file is truncated')
+        return batch
@@ -0,0 +1,304 @@
+"""
+Synthetic business-card corpus with ground truth, for parser benchmarks and tests.
+
+Cards are generated from a seed, so the same arguments always give the same
+corpus. Each card has OCR-style text (optionally with noise), the field values
+the parser should extract, and can be rendered to a JPEG or laid out as the
+line boxes an OCR backend would report for that JPEG.
+"""
+
+import functools
+import io
+import random
+import re
+import unicodedata
+
+from PIL import Image, ImageDraw, ImageFont
+
+from ocr_layout import OcrLine, from_lines
+
+FIRST_NAMES = {
+    'us': ['John', 'Emily', 'Michael', 'Sarah', 'David', 'Jessica', 'Robert', 'Ashley'],
+    'uk': ['Oliver', 'Amelia', 'Harry', 'Isla', 'George', 'Charlotte', 'Jack', 'Sophie'],
+    'de': ['Lukas', 'Zoë', 'Jürgen', 'Anna', 'Matthias', 'Lena', 'Stefan', 'Käthe'],
+    'fr': ['François', 'Chloé', 'Étienne', 'Camille', 'Hélène', 'Julien', 'Margaux', 'Loïc'],
+    'jp': ['Hiroshi', 'Yuki', 'Takeshi', 'Aiko', 'Kenji', 'Sakura', 'Daiki', 'Haruka'],
+    'in': ['Priya', 'Rahul', 'Ananya', 'Vikram', 'Deepa', 'Arjun', 'Kavya', 'Sanjay'],
+    'br': ['João', 'Ana', 'Luís', 'Beatriz', 'Thiago', 'Larissa', 'Gonçalo', 'Marília'],
+}
+LAST_NAMES = {
+    'us': ['Smith', 'Johnson', 'Williams', 'Brown', 'Miller', 'Davis', 'Garcia', 'Wilson'],
+    'uk': ['Taylor', 'Evans', 'Thomas', 'Roberts', 'Walker', 'Wright', 'Hughes', 'Edwards'],
+    'de': ['Müller', 'Schmidt', 'Schneider', 'Fischer', 'Weber', 'Becker', 'Wagner', 'Schäfer'],
+    'fr': ['Martin', 'Lefèvre', 'Dubois', 'Moreau', 'Laurent', 'Girard', 'Rousseau', 'Fontaine'],
+    'jp': ['Tanaka', 'Suzuki', 'Takahashi', 'Watanabe', 'Ito', 'Yamamoto', 'Nakamura', 'Kobayashi'],
+    'in': ['Sharma', 'Patel', 'Iyer', 'Reddy', 'Nair', 'Gupta', 'Menon', 'Chatterjee'],
+    'br': ['Silva', 'Santos', 'Oliveira', 'Souza', 'Pereira', 'Costa', 'Ferreira', 'Almeida'],
+}
+COMPANY_STEMS = ['Acme', 'Northwind', 'Bluepeak', 'Orbital', 'Granite', 'Lumen', 'Vertex', 'Harbor',
+                 'Cedar', 'Quantum', 'Summit', 'Silverline', 'Brightway', 'Ironwood', 'Nova', 'Keystone']
+COMPANY_SUFFIXES = {
+    'us': ['Inc', 'Corp', 'LLC', 'Technologies', 'Solutions', 'Group'],
+    'uk': ['Ltd', 'Limited', 'Partners', 'Consulting', 'Holdings', 'Group'],
+    'de': ['GmbH', 'AG', 'Systems GmbH', 'Technologies AG', 'Group'],
+    'fr': ['SARL', 'SAS', 'Services SA', 'International', 'Group'],
+    'jp': ['K.K.', 'Co. Ltd', 'Industries', 'Holdings', 'Systems'],
+    'in': ['Pvt Ltd', 'Solutions Pvt Ltd', 'Technologies', 'Services', 'Enterprises'],
+    'br': ['Ltda', 'S.A.', 'Tecnologia Ltda', 'Consulting', 'Global'],
+}
+TITLES = ['CEO', 'CTO', 'Chief Financial Officer', 'Senior Software Engineer', 'Product Manager',
+          'Marketing Director', 'Sales Executive', 'Vice President of Operations', 'Lead Designer',
+          'Business Analyst', 'Account Manager', 'Founder', 'Head of Strategy', 'Technical Consultant']
+TLDS = {'us': 'com', 'uk': 'co.uk', 'de': 'de', 'fr': 'fr', 'jp': 'co.jp', 'in': 'in', 'br': 'com.br'}
+STREETS = {
+    'us': ['Market Street', 'Oak Avenue', 'Technology Lane', 'Sunset Blvd', 'Park Drive'],
+    'uk': ['High Street', 'Station Road', 'Church Lane', 'Victoria Way', 'Kings Court'],
+    'de': ['Hauptstraße', 'Bahnhofstraße', 'Gartenweg', 'Schillerplatz', 'Lindenallee'],
+    'fr': ['Rue de Rivoli', 'Avenue Victor Hugo', 'Boulevard Haussmann', 'Rue du Bac', 'Place Vendôme'],
+    'jp': ['Chiyoda', 'Shibuya', 'Minato', 'Shinjuku', 'Chuo'],
+    'in': ['MG Road', 'Brigade Road', 'Linking Road', 'Park Street', 'Anna Salai'],
+    'br': ['Avenida Paulista', 'Rua Augusta', 'Rua Oscar Freire', 'Avenida Atlântica', 'Rua XV de Novembro'],
+}
+CITIES = {
+    'us': [('San Francisco', 'CA'), ('Austin', 'TX'), ('New York', 'NY'), ('Seattle', 'WA'), ('Boston', 'MA')],
+    'uk': [('London',), ('Manchester',), ('Bristol',), ('Leeds',), ('Edinburgh',)],
+    'de': [('Berlin',), ('München',), ('Hamburg',), ('Köln',), ('Frankfurt',)],
+    'fr': [('Paris',), ('Lyon',), ('Marseille',), ('Toulouse',), ('Nantes',)],
+    'jp': [('Tokyo',), ('Osaka',), ('Yokohama',), ('Nagoya',), ('Kyoto',)],
+    'in': [('Bengaluru',), ('Mumbai',), ('Chennai',), ('Pune',), ('Hyderabad',)],
+    'br': [('São Paulo',), ('Rio de Janeiro',), ('Curitiba',), ('Belo Horizonte',), ('Recife',)],
+}
+LOCALES = tuple(FIRST_NAMES)
+LAYOUTS = ('classic', 'company_first', 'labelled', 'minimal')
+# Typesetting, drawn apart from the text: the name printed largest (a company line at the top
+# stands out too), the company printed as a wordmark larger than the name, or one size throughout
+STYLES = ('name_largest', 'company_largest', 'uniform')
+# Font sizes relative to the other lines
+NAME_SCALE = 1.5
+COMPANY_SCALE = 1.25
+WORDMARK_SCALE = 1.6
+
+# Characters OCR engines commonly confuse
+OCR_CONFUSIONS = {'o': '0', 'O': '0', 'l': '1', 'I': 'l', 'S': '5', 'B': '8', 'e': 'c', 'a': 'o', 'g': '9'}
+
+
+def digits(rng, count):
+    return ''.join(rng.choice('0123456789') for _ in range(count))
+
+
+def phone_number(rng, locale):
+    if locale == 'us':
+        area, exchange, line = str(rng.randint(201, 989)), str(rng.randint(200, 999)), digits(rng, 4)
+        return rng.choice([f'({area}) {exchange}-{line}', f'{area}-{exchange}-{line}',
+                           f'+1 {area} {exchange} {line}', f'{area}.{exchange}.{line}'])
+    if locale == 'uk':
+        return rng.choice([f'+44 20 {digits(rng, 4)} {digits(rng, 4)}', f'020 {digits(rng, 4)} {digits(rng, 4)}'])
+    if locale == 'de':
+        return rng.choice([f'+49 30 {digits(rng, 8)}', f'+49 89 {digits(rng, 3)} {digits(rng, 4)}'])
+    if locale == 'fr':
+        return '+33 1 ' + ' '.join(digits(rng, 2) for _ in range(4))
+    if locale == 'jp':
+        return rng.choice([f'+81 3-{digits(rng, 4)}-{digits(rng, 4)}', f'03-{digits(rng, 4)}-{digits(rng, 4)}'])
+    if locale == 'in':
+        return f'+91 {rng.randint(70, 99)}{digits(rng, 3)} {digits(rng, 5)}'
+    return f'+55 11 {digits(rng, 5)}-{digits(rng, 4)}'
+
+
+def ascii_slug(text):
+    """Lower-case ASCII form of a name for emails and domains (Jürgen -> jurgen)"""
+    text = unicodedata.normalize('NFKD', text.replace('ß', 'ss'))
+    return re.sub(r'[^a-z0-9]', '', text.encode('ascii', 'ignore').decode('ascii').lower())
+
+
+def address_lines(rng, locale):
+    number = rng.randint(1, 999)
+    street = rng.choice(STREETS[locale])
+    city = rng.choice(CITIES[locale])
+    if locale == 'us':
+        line = f'{number} {street}'
+        if rng.random() < 0.3:
+            line += f', Suite {rng.randint(100, 999)}'
+        return [line, f'{city[0]}, {city[1]} {digits(rng, 5)}']
+    if locale == 'uk':
+        postcode = f'{rng.choice("ENSW")}{rng.randint(1, 20)} {rng.randint(1, 9)}{rng.choice("ABDEFGH")}{rng.choice("JLNPQRS")}'
+        return [f'{number} {street}', f'{city[0]} {postcode}']
+    if locale in ('de', 'br'):
+        return [f'{street} {number}', f'{digits(rng, 5)} {city[0]}']
+    if locale == 'fr':
+        return [f'{number} {street}', f'{digits(rng, 5)} {city[0]}']
+    if locale == 'jp':
+        return [f'{rng.randint(1, 9)}-{rng.randint(1, 30)}-{rng.randint(1, 20)} {street}', f'{city[0]} {digits(rng, 3)}-{digits(rng, 4)}']
+    return [f'{number} {street}', f'{city[0]} {digits(rng, 6)}']
+
+
+def make_card(rng, locale, layout):
+    first, last = rng.choice(FIRST_NAMES[locale]), rng.choice(LAST_NAMES[locale])
+    stem = rng.choice(COMPANY_STEMS)
+    domain = f'{ascii_slug(stem)}.{TLDS[locale]}'
+    truth = {
+        'name': f'{first} {last}',
+        'title': rng.choice(TITLES),
+        'company': f'{stem} {rng.choice(COMPANY_SUFFIXES[locale])}',
+        'phone': phone_number(rng, locale),
+        'email': f'{ascii_slug(first)}.{ascii_slug(last)}@{domain}',
+        'website': f'www.{domain}',
+        'address': '',
+    }
+    address = address_lines(rng, locale)
+
+    if layout == 'classic':
+        lines = [truth['name'], truth['title'], truth['company'], truth['phone'], truth['email'],
+                 truth['website'], *address]
+    elif layout == 'company_first':
+        lines = [truth['company'], truth['name'], truth['title'], *address, truth['phone'], truth['email'],
+                 truth['website']]
+    elif layout == 'labelled':
+        lines = [truth['name'], truth['title'], truth['company'], f"Tel: {truth['phone']}",
+                 f"Email: {truth['email']}", f"Web: {truth['website']}", *address]
+    else:
+        lines = [truth['name'], truth['title'], truth['company'], truth['email'], truth['phone']]
+        truth['website'] = ''
+        address = []
+
+    truth['address'] = ', '.join(address)
+    return lines, truth
+
+
+def add_noise(rng, lines, rate):
+    """OCR-style damage: confused characters, stray separators and spacing.
+
+    Returns the noisy lines and, for each, the index of the line it came from
+    (None for inserted separators).
+    """
+    noisy = []
+    sources = []
+    for index, line in enumerate(lines):
+        chars = [OCR_CONFUSIONS.get(c, c) if rng.random() < rate else c for c in line]
+        line = ''.join(chars)
+        if rng.random() < rate:
+            line = '  ' + line + ' '
+        noisy.append(line)
+        sources.append(index)
+        if rng.random() < rate / 2:
+            noisy.append(rng.choice(['---', '|', '•', '_____']))
+            sources.append(None)
+    return noisy, sources
+
+
+def line_scales(lines, truth, style):
+    """Font size of each line relative to the body text, for a typesetting style"""
+    if style == 'name_largest':
+        return [NAME_SCALE if line == truth['name'] else
+                COMPANY_SCALE if index == 0 and line == truth['company'] else 1.0
+                for index, line in enumerate(lines)]
+    if style == 'company_largest':
+        return [WORDMARK_SCALE if line == truth['company'] else COMPANY_SCALE if line == truth['name'] else 1.0
+                for line in lines]
+    return [1.0] * len(lines)
+
+
+def generate_cards(count, seed=0, noise=0.0, locales=LOCALES, layouts=LAYOUTS, styles=STYLES):
+    """Return count synthetic cards: dicts with text, truth, locale, layout, style, lines and line scales.
+
+    Noise and typesetting draw from their own generators, so a seed gives the same text at
+    every noise level and for any choice of styles.
+    """
+    rng = random.Random(seed)
+    noise_rng = random.Random(f'{seed}-noise')
+    style_rng = random.Random(f'{seed}-style')
+    cards = []
+    for _ in range(count):
+        locale, layout = rng.choice(locales), rng.choice(layouts)
+        lines, truth = make_card(rng, locale, layout)
+        style = style_rng.choice(styles)
+        scales = line_scales(lines, truth, style)
+        if noise:
+            lines, sources = add_noise(noise_rng, lines, noise)
+            scales = [1.0 if source is None else scales[source] for source in sources]
+        cards.append({'text': '\n'.join(lines), 'lines': lines, 'scales': scales, 'truth': truth,
+                      'locale': locale, 'layout': layout, 'style': style})
+    return cards
+
+
+@functools.lru_cache(maxsize=None)
+def card_font(size):
+    return ImageFont.load_default(size=size)
+
+
+@functools.lru_cache(maxsize=None)
+def glyph_metrics(size, char):
+    font = card_font(size)
+    _, top, _, bottom = font.getbbox(char)
+    return font.getlength(char), top, bottom
+
+
+def text_extent(size, line):
+    """Advance width and ink top/bottom of a line, from cached per-character metrics.
+
+    Ignores kerning, which keeps laying out thousands of cards fast.
+    """
+    width = 0.0
+    top, bottom = size, 0
+    for char in line:
+        advance, char_top, char_bottom = glyph_metrics(size, char)
+        width += advance
+        if not char.isspace():
+            top, bottom = min(top, char_top), max(bottom, char_bottom)
+    return width, top, max(bottom, top)
+
+
+def card_geometry(card, size=(1050, 600), seed=0):
+    """Where render_card draws each line: (line, x, y, font size) tuples"""
+    rng = random.Random(seed)
+    lines, scales = card['lines'], card['scales']
+    line_height = min(64, (size[1] - 60) / max(sum(scales), 1))
+    centered = card['layout'] == 'company_first'
+    placed = []
+    y = 30
+    for line, scale in zip(lines, scales):
+        font_size = int(line_height * scale * 0.7)
+        x = (size[0] - text_extent(font_size, line)[0]) / 2 if centered else 50 + rng.randint(0, 10)
+        placed.append((line, x, y, font_size))
+        y += line_height * scale
+    return placed
+
+
+def render_card(card, size=(1050, 600), seed=0):
+    """Draw a card's lines as a JPEG (3.5in x 2in at 300 DPI by default)"""
+    image = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(image)
+    for line, x, y, font_size in card_geometry(card, size, seed):
+        draw.text((x, y), line, fill='black', font=card_font(font_size))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def card_ocr_text(card, size=(1050, 600), seed=0):
+    """The card as an OCR backend would report it: lines with ink boxes as image fractions"""
+    lines = []
+    for line, x, y, font_size in card_geometry(card, size, seed):
+        text = line.strip()
+        if not text:
+            continue
+        width, top, bottom = text_extent(font_size, line)
+        lines.append(OcrLine(text, x / size[0], (y + top) / size[1], width / size[0], (bottom - top) / size[1], 1.0))
+    return from_lines(lines)
+
+
+def normalize(field, value):
+    """Comparable form of a field value: digits for phones, bare host for websites"""
+    value = ' '.join((value or '').split()).lower()
+    if field == 'phone':
+        return re.sub(r'\D', '', value)
+    if field == 'website':
+        return re.sub(r'^(https?://)?(www\.)?', '', value).rstrip('/')
+    return value
+
+
+def field_matches(field, expected, actual):
+    if field == 'phone' and expected:
+        # Accept a parsed number that is the national part of the expected one
+        expected_digits, actual_digits = normalize(field, expected), normalize(field, actual)
+        return len(actual_digits) >= 7 and expected_digits.endswith(actual_digits)
+    return normalize(field, expected) == normalize(field, actual)
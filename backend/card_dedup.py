@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Duplicate-contact index for parsed cards.
+
+Every stored entry is filed under a few keys: its normalized email, its
+phone in E.164 form, a name + company blocking key, and MinHash LSH bands
+over the character trigrams of name + company (which still line up when
+OCR garbles a letter or two). A check only looks up the entry's own keys,
+so it costs the same whatever the number of entries; candidates sharing a
+key are then scored against the card.
+
+Uploads are checked as they are parsed and entries are added as they are
+stored (POST /entries). Rebuilding over the whole table is a batch job:
+
+    python card_dedup.py rebuild --database "$DATABASE_URL" --index ocr_dedup.db
+"""
+
+import argparse
+import functools
+import hashlib
+import logging
+import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+
+from card_export import iter_chunks, open_source
+from metrics import DEDUP_CHECKS, DEDUP_SECONDS
+from ocr_logging import log_event
+
+log = logging.getLogger('ocr.dedup')
+
+# Calling code used for phone numbers written without one (and no country-code TLD to go by)
+DEDUP_DEFAULT_COUNTRY = os.getenv('OCR_DEDUP_DEFAULT_COUNTRY', '1')
+# Estimated name trigram similarity at which a candidate counts as a duplicate
+DEDUP_SIMILARITY = float(os.getenv('OCR_DEDUP_SIMILARITY', '0.6'))
+# Most entries read back per key, so a shared switchboard number cannot make a check slow
+DEDUP_MAX_BUCKET = int(os.getenv('OCR_DEDUP_MAX_BUCKET', '50'))
+DEDUP_MAX_RESULTS = 10
+
+# 16 bands of 3 rows: pairs above ~0.4 similarity share a band with high probability
+MINHASH_PERMUTATIONS = 48
+LSH_BANDS = 16
+MINHASH_PRIME = (1 << 61) - 1
+MINHASH_SEED = 20240611
+_coefficients = random.Random(MINHASH_SEED)
+MINHASH_COEFFICIENTS = [(_coefficients.randrange(1, MINHASH_PRIME), _coefficients.randrange(MINHASH_PRIME))
+                        for _ in range(MINHASH_PERMUTATIONS)]
+
+# Companies less similar than this are different employers, however alike the names
+COMPANY_SIMILARITY = 0.45
+# Score given to a shared phone number when the names do not disagree (or one side has none)
+PHONE_SCORE = 0.75
+# Each of email and phone present on both cards but different multiplies the score by this,
+# so one (a new job, a mobile instead of the office line) leaves a likely match and both rule it out
+CONFLICT_FACTOR = 0.7
+# Emails sharing at least this share of their character bigrams, and phones differing in at
+# most this many digits, are taken for the same one misread by OCR
+EMAIL_AGREEMENT = 0.6
+PHONE_DIGIT_SLIPS = 2
+
+# Digits OCR reads in place of letters, folded back before comparing names
+CONFUSABLES = str.maketrans('0158', 'olsb')
+LEGAL_SUFFIXES = frozenset(['inc', 'llc', 'ltd', 'limited', 'corp', 'corporation', 'co', 'company', 'gmbh', 'ag',
+                            'sa', 'sas', 'sarl', 'plc', 'pvt', 'kk', 'ltda', 'bv', 'nv', 'group'])
+# Country-code TLDs (from the email or website) that say which calling code a local number uses
+TLD_CALLING_CODES = {'uk': '44', 'de': '49', 'fr': '33', 'jp': '81', 'in': '91', 'br': '55', 'es': '34',
+                     'it': '39', 'nl': '31', 'au': '61', 'ca': '1', 'us': '1', 'ch': '41', 'at': '43'}
+PHONE_EXTENSION = re.compile(r'\s*(?:ext\.?|extension|x)\s*\d+\s*$', re.IGNORECASE)
+
+
+def fold(text):
+    """Lowercase ASCII words of a name or company, with accents and OCR digit confusions folded"""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii')
+    return re.findall(r'[a-z0-9]+', text.lower().translate(CONFUSABLES))
+
+
+def normalize_email(email):
+    email = (email or '').strip().strip('<>.,;:').lower()
+    local, _, domain = email.rpartition('@')
+    if not local or '.' not in domain:
+        return ''
+    return email
+
+
+def calling_code(record, default_country):
+    """Calling code implied by a country-code TLD on the email or website, else the default"""
+    for field in ('email', 'website'):
+        host = (record.get(field) or '').lower().rpartition('@')[2].split('/')[0].rstrip('.')
+        tld = host.rpartition('.')[2]
+        if tld in TLD_CALLING_CODES:
+            return TLD_CALLING_CODES[tld]
+    return default_country
+
+
+def normalize_phone(phone, country=DEDUP_DEFAULT_COUNTRY):
+    """Phone number in E.164 form (+ and up to 15 digits), or '' when it cannot be one.
+
+    Numbers without an international prefix are taken as national numbers in
+    the given calling code, dropping a leading trunk 0.
+    """
+    phone = PHONE_EXTENSION.sub('', (phone or '').strip())
+    digits = re.sub(r'\D', '', phone)
+    if phone.startswith('+'):
+        number = digits
+    elif digits.startswith('00'):
+        number = digits[2:]
+    elif digits.startswith('0'):
+        number = country + digits[1:]
+    elif country == '1' and len(digits) == 11 and digits.startswith('1'):
+        number = digits
+    else:
+        number = country + digits
+    if not 8 <= len(number) <= 15 or number.startswith('0'):
+        return ''
+    return '+' + number
+
+
+def name_company_words(record):
+    """Folded name words (sorted, so order does not matter) and company words without legal suffixes.
+
+    A card whose name was not found falls back to a first.last style email address.
+    """
+    name = sorted(fold(record.get('name')))
+    if not name:
+        local = normalize_email(record.get('email')).partition('@')[0]
+        if re.fullmatch(r'[a-z]+[._-][a-z]+', local):
+            name = sorted(fold(local))
+    company = [word for word in fold(record.get('company')) if word not in LEGAL_SUFFIXES]
+    return name, company
+
+
+@functools.lru_cache(maxsize=65536)
+def trigram_hashes(trigram):
+    """The trigram's value under every MinHash permutation (names share few enough trigrams to cache)"""
+    shingle = int.from_bytes(hashlib.blake2b(trigram.encode('utf-8'), digest_size=8).digest(), 'little')
+    return tuple((a * shingle + b) % MINHASH_PRIME for a, b in MINHASH_COEFFICIENTS)
+
+
+def minhash(text):
+    """MinHash signature over the character trigrams of text, or None when it is too short"""
+    padded = f' {text} '
+    if len(padded) < 5:
+        return None
+    trigrams = {padded[i:i + 3] for i in range(len(padded) - 2)}
+    return array('Q', map(min, *map(trigram_hashes, trigrams)))
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of the trigram sets behind two signatures"""
+    return sum(1 for x, y in zip(signature, other) if x == y) / len(signature)
+
+
+def lsh_keys(signature):
+    rows = len(signature) // LSH_BANDS
+    keys = []
+    for band in range(LSH_BANDS):
+        values = signature[band * rows:(band + 1) * rows]
+        keys.append(f'lsh:{band}:{hashlib.blake2b(values.tobytes(), digest_size=8).hexdigest()}')
+    return keys
+
+
+def fingerprint(record, default_country=DEDUP_DEFAULT_COUNTRY):
+    """Index keys for a parsed card, with MinHash signatures of its name and of its company (None if missing)"""
+    keys = []
+    email = normalize_email(record.get('email'))
+    if email:
+        keys.append('email:' + email)
+    phone = normalize_phone(record.get('phone'), calling_code(record, default_country))
+    if phone:
+        keys.append('phone:' + phone)
+
+    name, company = name_company_words(record)
+    # Without a company the name alone would make every John Smith the same contact
+    if name and company:
+        keys.append(f"name_company:{' '.join(name)}|{' '.join(company)}")
+    name_signature = minhash(' '.join(name))
+    company_signature = minhash(' '.join(company))
+    signatures = [signature for signature in (name_signature, company_signature) if signature is not None]
+    if signatures:
+        # The signature of the union of both trigram sets is their elementwise minimum
+        keys.extend(lsh_keys(array('Q', map(min, *signatures)) if len(signatures) > 1 else signatures[0]))
+    return keys, name_signature, company_signature
+
+
+def contact_values(keys):
+    """(normalized email, E.164 phone) behind a card's keys, '' for either it lacks"""
+    found = {'email': '', 'phone': ''}
+    for key in keys:
+        kind, _, value = key.partition(':')
+        if kind in found:
+            found[kind] = value
+    return found['email'], found['phone']
+
+
+def conflicts(contact, stored):
+    """Contact fields present on both cards that cannot be the same (allowing for OCR slips)"""
+    email, phone = contact
+    stored_email, stored_phone = stored
+    found = []
+    if email and stored_email and email != stored_email:
+        bigrams, stored_bigrams = ({text[i:i + 2] for i in range(len(text) - 1)} for text in (email, stored_email))
+        if len(bigrams & stored_bigrams) / len(bigrams | stored_bigrams) < EMAIL_AGREEMENT:
+            found.append('email_differs')
+    if phone and stored_phone and not (
+            len(phone) == len(stored_phone) and
+            sum(a != b for a, b in zip(phone, stored_phone)) <= PHONE_DIGIT_SLIPS):
+        found.append('phone_differs')
+    return found
+
+
+def signature_similarity(signature, stored):
+    if signature is None or stored is None:
+        return None
+    return similarity(signature, array('Q', stored))
+
+
+def key_reason(key):
+    kind = key.partition(':')[0]
+    return 'similar' if kind == 'lsh' else kind
+
+
+class DedupIndex:
+    """Index keys of stored card entries in a SQLite file shared by every worker on the host"""
+
+    def __init__(self, path, default_country=DEDUP_DEFAULT_COUNTRY, threshold=DEDUP_SIMILARITY,
+                 max_bucket=DEDUP_MAX_BUCKET):
+        self.path = path
+        self.default_country = default_country
+        self.threshold = threshold
+        self.max_bucket = max_bucket
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS dedup_entries ('
+            ' entry_id INTEGER PRIMARY KEY,'
+            ' name_signature BLOB,'
+            ' company_signature BLOB,'
+            ' email TEXT,'
+            ' phone TEXT,'
+            ' indexed_at REAL NOT NULL)'
+        )
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(dedup_entries)')}
+        if 'email' not in columns:
+            # Index files from before contact conflicts were checked (filled in by the next rebuild)
+            self.conn.execute('ALTER TABLE dedup_entries ADD COLUMN email TEXT')
+            self.conn.execute('ALTER TABLE dedup_entries ADD COLUMN phone TEXT')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS dedup_keys ('
+            ' key TEXT NOT NULL,'
+            ' entry_id INTEGER NOT NULL,'
+            ' PRIMARY KEY (key, entry_id)) WITHOUT ROWID'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_dedup_keys_entry ON dedup_keys (entry_id)')
+
+    def check(self, record, exclude=None):
+        """Likely duplicates of a parsed card among indexed entries, best first.
+
+        Each is {'id', 'score', 'reasons'}. An exact email or name + company
+        match scores 1; otherwise the score is the estimated name similarity,
+        as long as the companies do not disagree (colleagues share a company,
+        and often a phone number, but not a name). An email or phone on both
+        cards that differs lowers the score; two people who share a common
+        name rarely share either.
+        """
+        start = time.perf_counter()
+        keys, name_signature, company_signature = fingerprint(record, self.default_country)
+        matches = self.match(keys, name_signature, company_signature, exclude)
+        DEDUP_SECONDS.observe(time.perf_counter() - start)
+        DEDUP_CHECKS.inc(result='duplicate' if matches else 'unique')
+        return matches
+
+    def match(self, keys, name_signature, company_signature, exclude):
+        reasons = {}
+        with self.lock:
+            for key in keys:
+                rows = self.conn.execute(
+                    'SELECT entry_id FROM dedup_keys WHERE key = ? LIMIT ?', (key, self.max_bucket)
+                ).fetchall()
+                for entry_id, in rows:
+                    if entry_id != exclude:
+                        reasons.setdefault(entry_id, set()).add(key_reason(key))
+            if not reasons:
+                return []
+            ids = list(reasons)
+            stored = {row[0]: row[1:] for row in self.conn.execute(
+                'SELECT entry_id, name_signature, company_signature, email, phone FROM dedup_entries '
+                f"WHERE entry_id IN ({', '.join('?' * len(ids))})", ids
+            )}
+
+        contact = contact_values(keys)
+        matches = []
+        for entry_id, found in reasons.items():
+            stored_name, stored_company, stored_email, stored_phone = stored.get(entry_id, (None,) * 4)
+            score = self.score(found, signature_similarity(name_signature, stored_name),
+                               signature_similarity(company_signature, stored_company))
+            if (score is None or score < self.threshold) and name_signature and company_signature:
+                # The parser can put the name in the company field and the other way round
+                score = self.score(found, signature_similarity(company_signature, stored_name),
+                                   signature_similarity(name_signature, stored_company))
+            if score is None or score < self.threshold:
+                continue
+            differs = conflicts(contact, (stored_email or '', stored_phone or ''))
+            score *= CONFLICT_FACTOR ** len(differs)
+            if score >= self.threshold:
+                matches.append({'id': entry_id, 'score': round(score, 3), 'reasons': sorted(found) + differs})
+        matches.sort(key=lambda match: (-match['score'], match['id']))
+        return matches[:DEDUP_MAX_RESULTS]
+
+    def score(self, reasons, name, company):
+        """Match score from the shared keys and the name and company similarities (None when unknown)"""
+        if 'email' in reasons or 'name_company' in reasons:
+            return 1.0
+        if name is None:
+            return PHONE_SCORE if 'phone' in reasons else None
+        if company is not None and company < COMPANY_SIMILARITY:
+            return None
+        if 'phone' in reasons and name >= self.threshold / 2:
+            return max(name, PHONE_SCORE)
+        return name
+
+    def write(self, entry_id, record, now):
+        """Replace an entry's keys (transaction held by the caller)"""
+        keys, name_signature, company_signature = fingerprint(record, self.default_country)
+        self.conn.execute('DELETE FROM dedup_keys WHERE entry_id = ?', (entry_id,))
+        self.conn.execute(
+            'INSERT OR REPLACE INTO dedup_entries (entry_id, name_signature, company_signature, email, phone, '
+            'indexed_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (entry_id, *(signature.tobytes() if signature is not None else None
+                         for signature in (name_signature, company_signature)),
+             *(value or None for value in contact_values(keys)), now)
+        )
+        self.conn.executemany('INSERT OR IGNORE INTO dedup_keys (key, entry_id) VALUES (?, ?)',
+                              [(key, entry_id) for key in keys])
+
+    def transaction(self, work):
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = work()
+                self.conn.execute('COMMIT')
+                return result
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def add(self, entry_id, record):
+        """Index a stored entry (replacing any earlier version) and return its likely duplicates"""
+        matches = self.check(record, exclude=entry_id)
+        self.transaction(lambda: self.write(entry_id, record, time.time()))
+        return matches
+
+    def remove(self, entry_id):
+        def work():
+            self.conn.execute('DELETE FROM dedup_keys WHERE entry_id = ?', (entry_id,))
+            return self.conn.execute('DELETE FROM dedup_entries WHERE entry_id = ?', (entry_id,)).rowcount
+
+        return self.transaction(work) > 0
+
+    def rebuild(self, chunks):
+        """Re-index every entry from chunks of row dicts, then drop entries that were not in them.
+
+        Each chunk is its own transaction, so uploads keep being indexed while
+        a rebuild runs; entries they add are newer than the rebuild and kept.
+        """
+        started = time.time()
+        total = 0
+        for rows in chunks:
+            def work():
+                now = time.time()
+                for row in rows:
+                    self.write(row['id'], row, now)
+
+            self.transaction(work)
+            total += len(rows)
+
+        def drop_stale():
+            self.conn.execute('DELETE FROM dedup_keys WHERE entry_id IN '
+                              '(SELECT entry_id FROM dedup_entries WHERE indexed_at < ?)', (started,))
+            return self.conn.execute('DELETE FROM dedup_entries WHERE indexed_at < ?', (started,)).rowcount
+
+        dropped = self.transaction(drop_stale)
+        log_event(log, logging.INFO, 'Duplicate index rebuilt', entries=total, dropped=dropped,
+                  seconds=round(time.time() - started, 1))
+        return total
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM dedup_entries').fetchone()[0]
+
+    def stats(self):
+        return {'entries': self.count(), 'path': self.path}
+
+
+def dedup_index_from_env():
+    """Build the duplicate index from environment settings, or None when disabled"""
+    if os.getenv('OCR_DEDUP_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    return DedupIndex(os.getenv('OCR_DEDUP_DB_PATH', 'ocr_dedup.db'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--database', help='business_card_entries source (defaults to OCR_EXPORT_DATABASE_URL)')
+    parser.add_argument('--index', default=os.getenv('OCR_DEDUP_DB_PATH', 'ocr_dedup.db'))
+    parser.add_argument('--chunk-rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    index = DedupIndex(args.index)
+    source = open_source(args.database)
+    start = time.perf_counter()
+    try:
+        total = index.rebuild(iter_chunks(source, {}, args.chunk_rows))
+    finally:
+        source.close()
+    elapsed = time.perf_counter() - start
+    print(f'Indexed {total} entries in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} entries/s)',
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
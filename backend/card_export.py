@@ -0,0 +1,255 @@
+import csv
+import io
+import json
+import logging
+import os
+import re
+import sqlite3
+from datetime import datetime
+from urllib.parse import quote
+
+from metrics import EXPORT_ROWS
+from ocr_logging import log_event
+
+log = logging.getLogger('ocr.export')
+
+# Query parameters that filter the export; each maps to an indexed column
+EXPORT_FILTERS = ('user_name', 'company', 'created_from', 'created_to')
+EXPORT_COLUMNS = ('id', 'user_name', 'name', 'title', 'company', 'email', 'phone', 'website', 'address',
+                  'user_comment', 'ocr_method', 'parsing_method', 'created_at')
+
+# Rows fetched from the database (and written out) at a time
+EXPORT_CHUNK_ROWS = int(os.getenv('OCR_EXPORT_CHUNK_ROWS', '1000'))
+EXPORT_DATABASE_URL = os.getenv('OCR_EXPORT_DATABASE_URL') or os.getenv('DATABASE_URL', '')
+
+
+class ExportError(Exception):
+    """The export request is unusable (bad format or filter)"""
+
+
+class SqliteSource:
+    """business_card_entries in a local SQLite file; its cursor steps through rows as they are fetched"""
+
+    placeholder = '?'
+
+    def __init__(self, path):
+        # Read-only, so a wrong path fails instead of creating an empty database
+        self.conn = sqlite3.connect(f'file:{quote(path)}?mode=ro', uri=True, check_same_thread=False)
+
+    def cursor(self):
+        return self.conn.cursor()
+
+    def close(self):
+        self.conn.close()
+
+
+class PostgresSource:
+    """business_card_entries in PostgreSQL, read through a named (server-side) cursor"""
+
+    placeholder = '%s'
+
+    def __init__(self, url):
+        import psycopg2
+
+        self.conn = psycopg2.connect(url)
+        # Named cursors only live inside a transaction; nothing is written
+        self.conn.set_session(readonly=True)
+
+    def cursor(self):
+        return self.conn.cursor(name='card_export')
+
+    def close(self):
+        self.conn.close()
+
+
+def open_source(url=None):
+    """Connect to the export database: a postgres:// URL, or a SQLite path (optionally sqlite:///path)"""
+    url = url or EXPORT_DATABASE_URL
+    if not url:
+        raise ExportError('No export database configured (set OCR_EXPORT_DATABASE_URL or DATABASE_URL)')
+    if url.startswith(('postgres://', 'postgresql://')):
+        return PostgresSource(url)
+    return SqliteSource(url[len('sqlite:///'):] if url.startswith('sqlite:///') else url)
+
+
+def filters_from_args(args):
+    """Export filters from request arguments; created_from/created_to become naive datetimes"""
+    filters = {}
+    for name in EXPORT_FILTERS:
+        value = args.get(name)
+        if not value:
+            continue
+        if name.startswith('created_'):
+            try:
+                value = datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+            except ValueError:
+                raise ExportError(f'{name} must be an ISO 8601 date or timestamp')
+        filters[name] = value
+    return filters
+
+
+def build_query(filters, placeholder, columns=EXPORT_COLUMNS):
+    """SELECT over business_card_entries restricted by the indexed filters, in id order"""
+    clauses, params = [], []
+    for name, condition in (('user_name', 'user_name ='), ('company', 'company ='),
+                            ('created_from', 'created_at >='), ('created_to', 'created_at <')):
+        if name in filters:
+            value = filters[name]
+            clauses.append(f'{condition} {placeholder}')
+            params.append(value.isoformat(sep=' ') if isinstance(value, datetime) else value)
+
+    sql = f"SELECT {', '.join(columns)} FROM business_card_entries"
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    return sql + ' ORDER BY id', params
+
+
+def iter_chunks(source, filters, chunk_rows=None, columns=EXPORT_COLUMNS):
+    """Yield lists of row dicts, chunk_rows at a time, holding only one chunk in memory"""
+    chunk_rows = chunk_rows or EXPORT_CHUNK_ROWS
+    sql, params = build_query(filters, source.placeholder, columns)
+    cursor = source.cursor()
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                return
+            yield [dict(zip(columns, row)) for row in rows]
+    finally:
+        cursor.close()
+
+
+def text_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return str(value)
+
+
+class CsvFormat:
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def header(self):
+        return self.rows([dict(zip(EXPORT_COLUMNS, EXPORT_COLUMNS))])
+
+    def rows(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([text_value(row[column]) for column in EXPORT_COLUMNS])
+        return buffer.getvalue()
+
+
+class JsonlFormat:
+    content_type = 'application/x-ndjson'
+    extension = 'jsonl'
+
+    def header(self):
+        return ''
+
+    def rows(self, rows):
+        return ''.join(json.dumps({column: row[column] for column in EXPORT_COLUMNS}, ensure_ascii=False,
+                                  default=text_value) + '\n' for row in rows)
+
+
+def vcard_escape(value):
+    """Escape a vCard text value (RFC 6350, 3.4)"""
+    return (text_value(value).replace('\\', '\\\\').replace(',', '\\,').replace(';', '\\;')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    """Fold a content line at 75 octets without splitting a UTF-8 character (RFC 6350, 3.2)"""
+    if len(line.encode('utf-8')) <= 75:
+        return line + '\r\n'
+    parts, current, size = [], [], 0
+    for char in line:
+        width = len(char.encode('utf-8'))
+        # Continuation lines start with a space, which counts against their 75 octets
+        limit = 75 if not parts else 74
+        if size + width > limit:
+            parts.append(''.join(current))
+            current, size = [], 0
+        current.append(char)
+        size += width
+    parts.append(''.join(current))
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def tel_uri(phone):
+    digits = re.sub(r'[^\d+]', '', phone)
+    return f'tel:{digits}' if digits else ''
+
+
+def website_uri(website):
+    return website if re.match(r'^[a-z][a-z0-9+.-]*://', website, re.IGNORECASE) else f'https://{website}'
+
+
+class VcardFormat:
+    content_type = 'text/vcard; charset=utf-8'
+    extension = 'vcf'
+
+    def header(self):
+        return ''
+
+    def card(self, row):
+        name = row['name'] or row['company'] or row['email'] or ''
+        lines = ['BEGIN:VCARD', 'VERSION:4.0', f'FN:{vcard_escape(name)}']
+        if row['company']:
+            lines.append(f"ORG:{vcard_escape(row['company'])}")
+        if row['title']:
+            lines.append(f"TITLE:{vcard_escape(row['title'])}")
+        if row['phone'] and tel_uri(row['phone']):
+            lines.append(f"TEL;VALUE=uri;TYPE=work:{tel_uri(row['phone'])}")
+        if row['email']:
+            lines.append(f"EMAIL;TYPE=work:{vcard_escape(row['email'])}")
+        if row['website']:
+            lines.append(f"URL:{website_uri(row['website'])}")
+        if row['address']:
+            # Stored unstructured, so it all goes in the street component and the label
+            address = vcard_escape(row['address'])
+            label = text_value(row['address']).replace('\\', '\\\\').replace('"', "'").replace('\n', '\\n')
+            lines.append(f'ADR;TYPE=work;LABEL="{label}":;;{address};;;;')
+        if row['user_comment']:
+            lines.append(f"NOTE:{vcard_escape(row['user_comment'])}")
+        lines.append('END:VCARD')
+        return ''.join(fold(line) for line in lines)
+
+    def rows(self, rows):
+        return ''.join(self.card(row) for row in rows)
+
+
+FORMATS = {'csv': CsvFormat, 'jsonl': JsonlFormat, 'vcard': VcardFormat, 'vcf': VcardFormat}
+
+
+def get_format(name):
+    try:
+        return FORMATS[(name or 'csv').lower()]()
+    except KeyError:
+        raise ExportError(f"Unknown export format '{name}' (use csv, jsonl or vcard)")
+
+
+def stream_export(source, export_format, filters, chunk_rows=None):
+    """Yield the export a chunk at a time, closing the source when done or abandoned.
+
+    The first piece is only produced once the query has run, so taking it
+    before sending the response surfaces database errors as a normal error.
+    """
+    name = export_format.extension
+    try:
+        chunks = iter_chunks(source, filters, chunk_rows)
+        rows = next(chunks, [])
+        yield export_format.header() + export_format.rows(rows)
+        EXPORT_ROWS.inc(len(rows), format=name)
+        for rows in chunks:
+            yield export_format.rows(rows)
+            EXPORT_ROWS.inc(len(rows), format=name)
+    except Exception as e:
+        # Headers are already sent: the client sees a truncated file
+        log_event(log, logging.ERROR, 'Export failed', format=name, error=str(e))
+        raise
+    finally:
+        source.close()
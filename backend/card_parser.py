@@ -0,0 +1,604 @@
+import os
+import re
+import time
+
+from metrics import PARSE_LIMITED
+from ocr_layout import OcrText, reading_order
+from ocr_logging import request_log
+
+
+# Enhanced regex patterns
+PHONE_PATTERNS = [
+    r'\+?1?[-.\s]?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}',  # US format
+    r'\+\d{1,3}[-.\s]?\d{8,15}',  # International format
+    r'\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b'  # Simple format
+]
+# Enhanced email pattern to handle OCR errors (allows numbers that might be letters).
+#
+# Matches what r'\b[A-Za-z0-9._%-]+@[A-Za-z0-9.-]+\.[A-Za-z0-9]{2,}\b' matches, but
+# in linear time: a failed attempt inside a long run such as 'a.a.a.a...' would
+# otherwise rescan the rest of the run from every start position. Attempts only
+# begin where a run of local-part characters begins, skip to the first word
+# boundary in it, and the TLD is taken whole. (?=(X))\N is an atomic group that
+# also works before Python 3.11.
+EMAIL_PATTERN = (
+    r'(?<![A-Za-z0-9._%-])(?=([A-Za-z0-9._%-]*?\b))\1'
+    r'(?P<match>[A-Za-z0-9._%-]+@[A-Za-z0-9.-]+\.(?=([A-Za-z0-9]{2,}))\3\b)'
+)
+WEBSITE_PATTERNS = [
+    r'(?P<match>https?://[A-Za-z0-9.-]+\.[A-Za-z]{2,}(?:/\S*)?)',
+    r'(?P<match>www\.[A-Za-z0-9.-]+\.[A-Za-z]{2,}(?:/\S*)?)',
+    # Bare domain, r'\b[A-Za-z0-9-]+\.[A-Za-z]{2,}\b' anchored the same way as the email
+    r'(?<![A-Za-z0-9-])(?=([A-Za-z0-9-]*?\b))\1(?P<match>[A-Za-z0-9-]+\.(?=([A-Za-z]{2,}))\3\b)'
+]
+
+# Bounds on untrusted OCR text: longer lines are cut, text past the limit is
+# ignored, and classification stops once a card has used its time budget
+# (CPU time of the parsing thread, so waiting behind other threads is not counted)
+MAX_TEXT_LENGTH = 20000
+MAX_LINE_LENGTH = 500
+PARSE_BUDGET_SECONDS = 0.05
+
+# Parse from line boxes when the OCR backend reports them. Off by default: on the benchmark
+# corpus it only beats the text parser on cards that print the name largest
+LAYOUT_PARSING = os.getenv('OCR_LAYOUT_PARSING', 'false').lower() in ('1', 'true', 'yes')
+# A later name candidate must be this much taller to replace an earlier one
+NAME_HEIGHT_RATIO = 1.1
+
+# Title keywords (comprehensive list)
+TITLE_KEYWORDS = [
+    'CEO', 'CTO', 'CFO', 'COO', 'President', 'Director', 'Manager', 'Senior', 'Lead',
+    'Engineer', 'Developer', 'Designer', 'Analyst', 'Consultant', 'Specialist',
+    'Executive', 'Vice President', 'VP', 'Assistant', 'Coordinator', 'Supervisor',
+    'Partner', 'Founder', 'Owner', 'Principal', 'Chief', 'Head', 'Administrator',
+    'Sales', 'Marketing', 'Operations', 'Finance', 'HR', 'Human Resources',
+    'Account', 'Project', 'Product', 'Business', 'Strategy', 'Technical'
+]
+
+# Company indicators
+COMPANY_INDICATORS = [
+    'Inc', 'Corp', 'Corporation', 'LLC', 'Ltd', 'Limited', 'Company', 'Co.',
+    'Solutions', 'Services', 'Systems', 'Technologies', 'Tech', 'Group', 'Associates',
+    'Partners', 'Consulting', 'Holdings', 'Enterprises', 'International', 'Global',
+    'Industries', 'Ventures', 'Capital', 'Fund', 'Bank', 'Insurance', 'Healthcare'
+]
+
+# Address keywords
+ADDRESS_KEYWORDS = [
+    'street', 'st', 'avenue', 'ave', 'road', 'rd', 'suite', 'floor',
+    'building', 'blvd', 'boulevard', 'drive', 'dr', 'lane', 'ln', 'way',
+    'plaza', 'place', 'court', 'ct'
+]
+
+TITLE = 1
+COMPANY = 2
+ADDRESS = 4
+
+RESULT_FIELDS = ('name', 'company', 'title', 'phone', 'email', 'website', 'address')
+
+# How much each way of finding a field is trusted (0-1). A field's confidence
+# is this times the OCR confidence of its line, when the backend reports one.
+EMAIL_STRENGTH = 0.95
+PHONE_STRENGTHS = (0.9, 0.85, 0.6)  # per PHONE_PATTERNS entry
+WEBSITE_STRENGTHS = (0.95, 0.9, 0.6)  # per WEBSITE_PATTERNS entry
+TITLE_STRENGTH = 0.8
+COMPANY_STRENGTH = 0.85
+NAME_STRENGTH = 0.75
+# A name picked as the tallest of the top lines
+NAME_LAYOUT_STRENGTH = 0.9
+# Digits in a name are usually misread letters
+NAME_DIGIT_FACTOR = 0.6
+# Address lines with a zip code or 'City, ST 12345', and keyword lines with a number
+ADDRESS_STRENGTH = 0.85
+ADDRESS_KEYWORD_STRENGTH = 0.7
+# Guesses from whatever lines are left over
+COMPANY_FALLBACK_STRENGTH = 0.35
+ADDRESS_FALLBACK_STRENGTH = 0.3
+
+
+def required_fields_from_env():
+    """Fields that must be confident before the fallback guesses are skipped, from OCR_PARSE_REQUIRED_FIELDS"""
+    fields = tuple(field.strip() for field in
+                   os.getenv('OCR_PARSE_REQUIRED_FIELDS', 'name,company,email,phone').split(',') if field.strip())
+    unknown = [field for field in fields if field not in RESULT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields in OCR_PARSE_REQUIRED_FIELDS: {', '.join(unknown)}")
+    return fields
+
+
+REQUIRED_FIELDS = required_fields_from_env()
+# Confidence every required field needs for the early exit (above 1 disables it)
+EARLY_EXIT_CONFIDENCE = float(os.getenv('OCR_PARSE_EARLY_EXIT_CONFIDENCE', '0.7'))
+
+
+class KeywordMatcher:
+    """Single-scan, case-insensitive substring matcher over several keyword groups"""
+
+    def __init__(self, groups):
+        # Every keyword that matches at a position is a prefix of the longest one
+        # matching there, so the longest match carries the flags of all of them.
+        flags = {}
+        for flag, keywords in groups:
+            for keyword in keywords:
+                keyword = keyword.lower()
+                flags[keyword] = flags.get(keyword, 0) | flag
+        self.flags = {
+            keyword: prefix_flags(flags, keyword)
+            for keyword in flags
+        }
+        self.all_flags = 0
+        for flag, _ in groups:
+            self.all_flags |= flag
+        self.regex = re.compile(f'(?=({trie_pattern(flags)}))')
+
+    def scan(self, lower_line):
+        """Return the OR of the group flags of every keyword found in the line"""
+        found = 0
+        flags = self.flags
+        for match in self.regex.finditer(lower_line):
+            found |= flags[match.group(1)]
+            if found == self.all_flags:
+                break
+        return found
+
+
+def trie_pattern(keywords):
+    """Build a regex that branches per character, matching the longest keyword first"""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+def prefix_flags(flags, keyword):
+    """Combine the flags of a keyword with those of all keywords that prefix it"""
+    combined = 0
+    for other, flag in flags.items():
+        if keyword.startswith(other):
+            combined |= flag
+    return combined
+
+
+class CardExtractor:
+    """Rule-based business card parser with all patterns compiled up front"""
+
+    def __init__(self, max_text_length=MAX_TEXT_LENGTH, max_line_length=MAX_LINE_LENGTH,
+                 time_budget=PARSE_BUDGET_SECONDS, use_layout=LAYOUT_PARSING,
+                 required_fields=REQUIRED_FIELDS, early_exit_confidence=EARLY_EXIT_CONFIDENCE):
+        self.max_text_length = max_text_length
+        self.max_line_length = max_line_length
+        self.time_budget = time_budget
+        self.use_layout = use_layout
+        self.required_fields = required_fields
+        self.early_exit_confidence = early_exit_confidence
+        self.separator_re = re.compile(r'^[\s\-_=]+$')
+        self.email_re = re.compile(EMAIL_PATTERN)
+        self.phone_res = [re.compile(p) for p in PHONE_PATTERNS]
+        self.phone_cleanup_re = re.compile(r'[^\d+()-.\s]')
+        self.website_res = [re.compile(p) for p in WEBSITE_PATTERNS]
+        self.name_re = re.compile(r'^[A-Za-z0-9\s\.\-\']+$')
+        self.digit_re = re.compile(r'\d')
+        self.zip_re = re.compile(r'\b\d{5}(-\d{4})?\b')
+        self.city_state_re = re.compile(r'[A-Z][a-z]+,\s*[A-Z]{2}\s*\d{5}')
+        self.keywords = KeywordMatcher([
+            (TITLE, TITLE_KEYWORDS),
+            (COMPANY, COMPANY_INDICATORS),
+            (ADDRESS, ADDRESS_KEYWORDS),
+        ])
+
+    def clean_lines(self, text):
+        """Split OCR text into stripped, non-empty, non-separator lines"""
+        separator = self.separator_re.match
+        max_length = self.max_line_length
+        lines = []
+        cut = False
+        for line in text.split('\n'):
+            line = line.strip()
+            if len(line) > max_length:
+                line = line[:max_length].rstrip()
+                cut = True
+            if line and not separator(line):
+                lines.append(line)
+        if cut:
+            limited('line_length')
+        return lines
+
+    def find_email(self, line):
+        match = self.email_re.search(line)
+        return match.group('match') if match else ''
+
+    def find_phone(self, line):
+        """(phone, strength of the pattern that found it), or ('', 0.0)"""
+        for phone_re, strength in zip(self.phone_res, PHONE_STRENGTHS):
+            match = phone_re.search(line)
+            if match:
+                # Clean up phone number
+                return self.phone_cleanup_re.sub('', match.group()).strip(), strength
+        return '', 0.0
+
+    def find_website(self, line):
+        """(website, strength of the pattern that found it), or ('', 0.0)"""
+        for website_re, strength in zip(self.website_res, WEBSITE_STRENGTHS):
+            match = website_re.search(line)
+            if match:
+                website = match.group('match')
+                # Add www. prefix if needed
+                if not website.startswith(('http', 'www.')):
+                    website = 'www.' + website
+                return website, strength
+        return '', 0.0
+
+    def name_strength(self, name, strength):
+        return strength * NAME_DIGIT_FACTOR if self.digit_re.search(name) else strength
+
+    def confident(self, scores):
+        """Whether every required field is at or above the early-exit confidence"""
+        threshold = self.early_exit_confidence
+        return all(scores[field] >= threshold for field in self.required_fields)
+
+    def parse(self, text):
+        """Extract structured fields from OCR text (from its line boxes when it has them).
+
+        Every field is scored in info['confidence']. Once all the required
+        fields are confident, the company and address guesses made from
+        leftover lines are skipped. A confident company is never a guess, so
+        while company is required (the default) only the address guess is
+        skipped; the company guess is skipped only when it is not required.
+        """
+        if self.use_layout and isinstance(text, OcrText) and text.has_layout():
+            return self.parse_layout(text)
+
+        info = empty_result(text)
+        if not text or text.strip() == '':
+            return info
+
+        if len(text) > self.max_text_length:
+            limited('text_length')
+            lines = self.clean_lines(text[:self.max_text_length])
+        else:
+            lines = self.clean_lines(text)
+        count = len(lines)
+        used = [False] * count
+        keyword_flags = [0] * count
+        ocr_confidence = line_confidences(text).get
+        scores = dict.fromkeys(RESULT_FIELDS, 0.0)
+
+        email = phone = website = ''
+        scan = self.keywords.scan
+        deadline = time.thread_time() + self.time_budget
+
+        # Single classification sweep: contact fields plus keyword groups per line
+        for i, line in enumerate(lines):
+            if i and time.thread_time() > deadline:
+                # Out of time: the rest of the card is left unclassified
+                limited('time_budget')
+                del lines[i:], used[i:], keyword_flags[i:]
+                count = i
+                break
+
+            keyword_flags[i] = scan(line.lower())
+
+            if not email:
+                email = self.find_email(line)
+                if email:
+                    used[i] = True
+                    scores['email'] = EMAIL_STRENGTH * ocr_confidence(line, 1.0)
+                    continue
+
+            if not phone:
+                phone, strength = self.find_phone(line)
+                if phone:
+                    used[i] = True
+                    scores['phone'] = strength * ocr_confidence(line, 1.0)
+
+            if not website and '@' not in line:
+                website, strength = self.find_website(line)
+                if website:
+                    used[i] = True
+                    scores['website'] = strength * ocr_confidence(line, 1.0)
+
+        info['email'] = email
+        info['phone'] = phone
+        info['website'] = website
+
+        # Resolve title and company from the keyword flags
+        title = company = ''
+        for i in range(count):
+            if used[i] or len(lines[i]) <= 2:
+                continue
+            flags = keyword_flags[i]
+            if flags & TITLE and not title:
+                title = lines[i]
+                used[i] = True
+                scores['title'] = TITLE_STRENGTH * ocr_confidence(title, 1.0)
+            elif flags & COMPANY and not company:
+                company = lines[i]
+                used[i] = True
+                scores['company'] = COMPANY_STRENGTH * ocr_confidence(company, 1.0)
+            if title and company:
+                break
+
+        # Name: first meaningful line in the top five not already claimed
+        name = ''
+        name_match = self.name_re.match
+        for i in range(min(count, 5)):
+            line = lines[i]
+            if used[i]:
+                continue
+            if (2 < len(line) < 50 and name_match(line)
+                    and any(c.isalpha() for c in line)):
+                name = line
+                used[i] = True
+                scores['name'] = self.name_strength(name, NAME_STRENGTH) * ocr_confidence(name, 1.0)
+                break
+
+        # Required fields all confident: leave the rest to the strong address patterns
+        early_exit = self.confident(scores)
+
+        # Fill in missing company with remaining meaningful lines (early exit only
+        # applies here when company is not a required field)
+        if not company and not early_exit:
+            for i, line in enumerate(lines):
+                if used[i]:
+                    continue
+                if (len(line) > 3 and
+                        (line.isupper() or len(line.split()) <= 4) and
+                        line != name):
+                    company = line
+                    used[i] = True
+                    scores['company'] = COMPANY_FALLBACK_STRENGTH * ocr_confidence(company, 1.0)
+                    break
+
+        info['name'] = name
+        info['title'] = title
+        info['company'] = company
+
+        # Extract address from remaining lines
+        digit_search = self.digit_re.search
+        zip_search = self.zip_re.search
+        city_state_search = self.city_state_re.search
+        address_lines = []
+        address_score = 0.0
+        for i, line in enumerate(lines):
+            if used[i]:
+                continue
+            if zip_search(line) or city_state_search(line):
+                strength = ADDRESS_STRENGTH
+            elif keyword_flags[i] & ADDRESS and digit_search(line):
+                strength = ADDRESS_KEYWORD_STRENGTH
+            else:
+                continue
+            address_lines.append(line)
+            used[i] = True
+            address_score = max(address_score, strength * ocr_confidence(line, 1.0))
+
+            # Check next line for continuation
+            if i + 1 < count and not used[i + 1]:
+                next_line = lines[i + 1]
+                if city_state_search(next_line) or zip_search(next_line):
+                    address_lines.append(next_line)
+                    used[i + 1] = True
+                    address_score = max(address_score, ADDRESS_STRENGTH * ocr_confidence(next_line, 1.0))
+
+        # If no specific address found, use remaining lines as potential address
+        if not address_lines and not early_exit:
+            for i, line in enumerate(lines):
+                if used[i] or len(line) < 5:
+                    continue
+                # Potential address if it has numbers or multiple words
+                if digit_search(line) or len(line.split()) >= 2:
+                    address_lines.append(line)
+                    used[i] = True
+                    address_score = max(address_score, ADDRESS_FALLBACK_STRENGTH * ocr_confidence(line, 1.0))
+
+        if address_lines:
+            info['address'] = ', '.join(address_lines)
+            scores['address'] = address_score
+
+        info['confidence'] = rounded(scores)
+        return info
+
+    def parse_layout(self, text):
+        """Extract structured fields from OCR lines with boxes, in one sweep in reading order.
+
+        Each line is classified when it is reached: contact fields, then
+        address, title and company. The name is the tallest line among the
+        first five that is none of those, so a company or address line above
+        it no longer takes its place. Fields are scored as in parse().
+        """
+        info = empty_result(text)
+        separator = self.separator_re.match
+        max_length = self.max_line_length
+        lines = []
+        length = 0
+        cut = False
+        for ocr_line in reading_order(text.lines):
+            length += len(ocr_line.text) + 1
+            if length > self.max_text_length:
+                limited('text_length')
+                break
+            line = ocr_line.text.strip()
+            if len(line) > max_length:
+                line = line[:max_length].rstrip()
+                cut = True
+            if line and not separator(line):
+                lines.append((line, ocr_line.height, 1.0 if ocr_line.confidence is None else ocr_line.confidence))
+        if cut:
+            limited('line_length')
+
+        email = phone = website = title = company = name = ''
+        name_index, name_height = None, 0.0
+        address_lines = []
+        remaining = []
+        scores = dict.fromkeys(RESULT_FIELDS, 0.0)
+        scan = self.keywords.scan
+        name_match = self.name_re.match
+        digit_search = self.digit_re.search
+        zip_search = self.zip_re.search
+        city_state_search = self.city_state_re.search
+        deadline = time.thread_time() + self.time_budget
+
+        for i, (line, height, ocr_confidence) in enumerate(lines):
+            if i and time.thread_time() > deadline:
+                limited('time_budget')
+                break
+
+            if not email:
+                email = self.find_email(line)
+                if email:
+                    scores['email'] = EMAIL_STRENGTH * ocr_confidence
+                    continue
+            claimed = False
+            if not phone:
+                phone, strength = self.find_phone(line)
+                if phone:
+                    scores['phone'] = strength * ocr_confidence
+                    claimed = True
+            if not website and '@' not in line:
+                website, strength = self.find_website(line)
+                if website:
+                    scores['website'] = strength * ocr_confidence
+                    claimed = True
+            if claimed:
+                continue
+
+            flags = scan(line.lower())
+            if zip_search(line) or city_state_search(line):
+                address_lines.append(line)
+                scores['address'] = max(scores['address'], ADDRESS_STRENGTH * ocr_confidence)
+                continue
+            if flags & ADDRESS and digit_search(line):
+                address_lines.append(line)
+                scores['address'] = max(scores['address'], ADDRESS_KEYWORD_STRENGTH * ocr_confidence)
+                continue
+            if len(line) > 2:
+                if flags & TITLE and not title:
+                    title = line
+                    scores['title'] = TITLE_STRENGTH * ocr_confidence
+                    continue
+                if flags & COMPANY and not company:
+                    company = line
+                    scores['company'] = COMPANY_STRENGTH * ocr_confidence
+                    continue
+            if (i < 5 and height > name_height * NAME_HEIGHT_RATIO and 2 < len(line) < 50
+                    and name_match(line) and any(c.isalpha() for c in line)):
+                name, name_index, name_height = line, i, height
+                scores['name'] = self.name_strength(name, NAME_LAYOUT_STRENGTH) * ocr_confidence
+            remaining.append((i, line, ocr_confidence))
+
+        # Lines nothing claimed, in reading order, for the company and address fallbacks,
+        # which are skipped once the required fields are all confident
+        if not self.confident(scores):
+            remaining = [(line, ocr_confidence) for i, line, ocr_confidence in remaining if i != name_index]
+            if not company:
+                for line, ocr_confidence in remaining:
+                    if len(line) > 3 and (line.isupper() or len(line.split()) <= 4):
+                        company = line
+                        scores['company'] = COMPANY_FALLBACK_STRENGTH * ocr_confidence
+                        break
+            if not address_lines:
+                for line, ocr_confidence in remaining:
+                    if line != company and len(line) >= 5 and (digit_search(line) or len(line.split()) >= 2):
+                        address_lines.append(line)
+                        scores['address'] = max(scores['address'], ADDRESS_FALLBACK_STRENGTH * ocr_confidence)
+
+        info.update(name=name, title=title, company=company, phone=phone, email=email, website=website)
+        if address_lines:
+            info['address'] = ', '.join(address_lines)
+        info['confidence'] = rounded(scores)
+        return info
+
+
+def empty_result(text):
+    return {
+        'name': '',
+        'company': '',
+        'title': '',
+        'phone': '',
+        'email': '',
+        'website': '',
+        'address': '',
+        'raw_text': text,
+        'confidence': dict.fromkeys(RESULT_FIELDS, 0.0)
+    }
+
+
+def line_confidences(text):
+    """{line text: 0-1 OCR confidence} for the lines of an OcrText whose backend scored them"""
+    if not isinstance(text, OcrText):
+        return {}
+    return {line.text.strip(): line.confidence for line in text.lines if line.confidence is not None}
+
+
+def rounded(scores):
+    return {field: round(score, 2) for field, score in scores.items()}
+
+
+def parse_confidence(info):
+    """Confidence of a parsed card: that of its least confident required field"""
+    confidence = info.get('confidence') or {}
+    return min((confidence.get(field, 0.0) for field in REQUIRED_FIELDS), default=1.0)
+
+
+def with_parse(text):
+    """text as an OcrText carrying its parsed fields, which extract_business_card_info reuses"""
+    info = EXTRACTOR.parse(text)
+    parsed = {field: value for field, value in info.items() if field != 'raw_text'}
+    return OcrText(text, getattr(text, 'lines', ()), parsed)
+
+
+def parses_confidently(info):
+    """Whether every required field of a parse is at or above the early-exit confidence"""
+    return parse_confidence(info) >= EARLY_EXIT_CONFIDENCE
+
+
+def limited(limit):
+    """Record that a card was cut short by one of the parser limits"""
+    PARSE_LIMITED.inc(limit=limit)
+    request_log().note(parse_limited=limit)
+
+
+# Built once per process and shared by every caller
+EXTRACTOR = CardExtractor()
+
+
+def extract_business_card_info(text):
+    """Enhanced rule-based extraction of structured information from OCR text"""
+    parsed = getattr(text, 'parsed', None)
+    if parsed is not None:
+        # Already parsed by the OCR backend
+        info = dict(parsed, raw_text=text, confidence=dict(parsed['confidence']))
+    else:
+        info = EXTRACTOR.parse(text)
+    # Full text, lines and fields only when this request asked for a debug dump
+    log = request_log()
+    if log.debug_enabled:
+        log.debug('Extracted business card info', ocr_text=text, lines=EXTRACTOR.clean_lines(text),
+                  parsed_data={field: info[field] for field in RESULT_FIELDS})
+    return info
+
+
+def parse_batch(texts, batch=None):
+    """Parse a list of OCR texts, returning one result dict per text in order.
+
+    Given a card_batch.CardBatch, the results are appended to it instead of
+    being kept as dicts, and the batch is returned.
+    """
+    parse = EXTRACTOR.parse
+    if batch is not None:
+        append = batch.append
+        for text in texts:
+            append(parse(text))
+        return batch
+    return [parse(text) for text in texts]
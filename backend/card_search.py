@@ -0,0 +1,440 @@
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+from card_batch import CardBatch
+from card_dedup import fold
+from card_export import EXPORT_DATABASE_URL, iter_chunks, open_source
+from metrics import SEARCH_SECONDS
+from ocr_logging import log_event
+
+log = logging.getLogger('ocr.search')
+
+# Parsed fields shown with each result and searched along with the OCR text
+SEARCH_FIELDS = ('name', 'company', 'title')
+SEARCH_COLUMNS = ('id', 'user_name') + SEARCH_FIELDS + ('ocr_text',)
+# Share of the query's trigrams a card must contain to be a result
+SEARCH_MIN_SIMILARITY = float(os.getenv('OCR_SEARCH_MIN_SIMILARITY', '0.5'))
+SEARCH_MAX_RESULTS = 50
+# Best candidates by OCR text re-scored against the parsed fields, per result asked for
+RERANK_FACTOR = 5
+
+# Postings are stored as uint16 offsets from the first card of their segment
+SEGMENT_DOCS = 65536
+# Cards added one at a time are kept as sets until this many are frozen into a segment
+PENDING_DOCS = 1024
+# Trailing segments merged into one once this many fit in a segment together
+MERGE_FACTOR = 8
+# How long entry changes stay in the shared feed for workers to pick up
+SEARCH_FEED_RETENTION_SECONDS = float(os.getenv('OCR_SEARCH_FEED_RETENTION_SECONDS', str(7 * 24 * 3600)))
+
+# Folded text is spaces, a-z and 0-9, so a trigram is a number below 37 ** 3
+ALPHABET = ' abcdefghijklmnopqrstuvwxyz0123456789'
+TRIGRAM_SPACE = len(ALPHABET) ** 3
+SYMBOL_CODES = {char: code for code, char in enumerate(ALPHABET)}
+SYMBOLS = np.zeros(256, dtype=np.int32)
+for char, code in SYMBOL_CODES.items():
+    SYMBOLS[ord(char)] = code
+
+
+def trigram_set(text):
+    """Trigram codes of each folded word padded with a space on both sides (pg_trgm style)"""
+    codes = set()
+    for word in fold(text):
+        symbols = [0] + [SYMBOL_CODES[char] for char in word] + [0]
+        for i in range(len(symbols) - 2):
+            codes.add((symbols[i] * 37 + symbols[i + 1]) * 37 + symbols[i + 2])
+    return codes
+
+
+def trigram_pairs(texts):
+    """Distinct (text number, trigram) pairs of many texts at once, ordered by text then trigram"""
+    padded = [' ' + ' '.join(fold(text)) + ' ' for text in texts]
+    symbols = SYMBOLS[np.frombuffer(''.join(padded).encode('ascii'), dtype=np.uint8)]
+    codes = (symbols[:-2] * 37 + symbols[1:-1]) * 37 + symbols[2:]
+    docs = np.repeat(np.arange(len(texts), dtype=np.int64), [len(text) for text in padded])[:-2]
+    # A trigram centred on a space spans two words (or two documents)
+    keep = symbols[1:-1] != 0
+    keys = np.unique(docs[keep] * TRIGRAM_SPACE + codes[keep])
+    return keys // TRIGRAM_SPACE, keys % TRIGRAM_SPACE
+
+
+def document_text(record):
+    return '\n'.join(record.get(field) or '' for field in SEARCH_FIELDS + ('ocr_text',))
+
+
+class Segment:
+    """Frozen postings for a run of cards: for each trigram, the cards containing it"""
+
+    def __init__(self, base, span, docs, codes):
+        self.base = base
+        self.span = span
+        order = np.argsort(codes, kind='stable')
+        self.postings = (docs[order] - base).astype(np.uint16)
+        self.offsets = np.zeros(TRIGRAM_SPACE + 1, dtype=np.uint32)
+        np.cumsum(np.bincount(codes, minlength=TRIGRAM_SPACE), out=self.offsets[1:])
+
+    def pairs(self):
+        codes = np.repeat(np.arange(TRIGRAM_SPACE, dtype=np.int64), np.diff(self.offsets))
+        return self.postings.astype(np.int64) + self.base, codes
+
+    def match(self, codes, min_shared):
+        """(cards, shared trigram counts) of cards sharing at least min_shared of the codes"""
+        offsets = self.offsets
+        hits = np.concatenate([self.postings[offsets[code]:offsets[code + 1]] for code in codes])
+        counts = np.bincount(hits, minlength=self.span)
+        docs = np.flatnonzero(counts >= min_shared)
+        return docs + self.base, counts[docs]
+
+    def nbytes(self):
+        return self.postings.nbytes + self.offsets.nbytes
+
+
+def merged(segments):
+    pairs = [segment.pairs() for segment in segments]
+    docs = np.concatenate([docs for docs, _ in pairs])
+    codes = np.concatenate([codes for _, codes in pairs])
+    base = segments[0].base
+    return Segment(base, segments[-1].base + segments[-1].span - base, docs, codes)
+
+
+class ChangeFeed:
+    """Entry adds, edits and removals in a SQLite file shared by every worker on the host.
+
+    Each worker holds its own search index in memory, but POST /entries and
+    DELETE /entries reach only one of them. That worker publishes the change
+    here, and every index applies the changes it has not seen yet before each
+    search and health check. Changes are dropped after retention seconds.
+    """
+
+    def __init__(self, path, retention=SEARCH_FEED_RETENTION_SECONDS, clock=time.time):
+        self.path = path
+        self.retention = retention
+        self.clock = clock
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS search_changes ('
+            ' seq INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' entry_id INTEGER NOT NULL,'
+            ' record TEXT,'
+            ' changed_at REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_search_changes_time ON search_changes (changed_at)')
+
+    def publish(self, entry_id, record):
+        """Record an added or edited entry (record None: removed)"""
+        value = None if record is None else json.dumps({column: record.get(column) for column in SEARCH_COLUMNS})
+        now = self.clock()
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.execute('DELETE FROM search_changes WHERE changed_at < ?', (now - self.retention,))
+                self.conn.execute('INSERT INTO search_changes (entry_id, record, changed_at) VALUES (?, ?, ?)',
+                                  (entry_id, value, now))
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def since(self, seq):
+        """(seq, entry_id, record or None) of every change after seq, oldest first"""
+        with self.lock:
+            rows = self.conn.execute('SELECT seq, entry_id, record FROM search_changes WHERE seq > ? ORDER BY seq',
+                                     (seq,)).fetchall()
+        return [(seq, entry_id, None if record is None else json.loads(record)) for seq, entry_id, record in rows]
+
+    def last_seq(self):
+        with self.lock:
+            return self.conn.execute('SELECT COALESCE(MAX(seq), 0) FROM search_changes').fetchone()[0]
+
+
+class SearchIndex:
+    """Trigram inverted index over stored cards for fuzzy search, updated as cards arrive.
+
+    Like a Lucene index it is a list of immutable segments plus a small
+    in-memory buffer; a query counts, per segment, how many of its trigrams
+    each card contains (one numpy bincount), so OCR slips in either the
+    card or the query only cost a few trigrams. The best candidates are then
+    re-scored against the parsed name, company and title.
+
+    The index is held by each worker process. Without a ChangeFeed, an
+    entry added or removed through one worker is only seen by that worker
+    until the others restart and reload.
+    """
+
+    def __init__(self, min_similarity=SEARCH_MIN_SIMILARITY, feed=None):
+        self.min_similarity = min_similarity
+        self.feed = feed
+        # Last feed change applied here
+        self.seen = 0
+        self.sync_lock = threading.Lock()
+        # Entries changed while loading (record, or None when removed), newer than their stored rows
+        self.deferred = {}
+        self.lock = threading.Lock()
+        self.cards = CardBatch(('user_name',) + SEARCH_FIELDS, dictionary_fields=('user_name', 'company', 'title'))
+        # Entry id of each document; ids arrive in increasing order, so most are found by bisection
+        self.ids = array('q')
+        self.ordered_ids = array('q')
+        self.ordered_docs = array('I')
+        # Documents of entries that arrived out of order (edits re-add an entry under its old id)
+        self.moved = {}
+        self.deleted = set()
+        self.segments = []
+        self.pending = {}
+        self.pending_start = 0
+        self.loading = False
+
+    def __len__(self):
+        return len(self.ids) - len(self.deleted)
+
+    def find(self, entry_id):
+        """Document number of the live card for an entry id, or None"""
+        doc = self.moved.get(entry_id)
+        if doc is None:
+            position = bisect_left(self.ordered_ids, entry_id)
+            if position == len(self.ordered_ids) or self.ordered_ids[position] != entry_id:
+                return None
+            doc = self.ordered_docs[position]
+        return None if doc in self.deleted else doc
+
+    def add(self, entry_id, record):
+        """Index an entry added or edited just now, replacing any earlier version"""
+        self.change(entry_id, dict(record, id=entry_id))
+
+    def remove(self, entry_id):
+        """Drop a deleted entry; False if it was not indexed (always True while loading)"""
+        with self.lock:
+            found = self.loading or self.find(entry_id) is not None
+        if found:
+            self.change(entry_id, None)
+        return found
+
+    def change(self, entry_id, record):
+        if self.feed:
+            self.feed.publish(entry_id, record)
+            self.sync()
+        else:
+            self.apply(entry_id, record)
+
+    def sync(self):
+        """Apply the entry changes published by every worker since the last sync"""
+        if not self.feed:
+            return
+        with self.sync_lock:
+            for seq, entry_id, record in self.feed.since(self.seen):
+                self.apply(entry_id, record)
+                self.seen = seq
+
+    def apply(self, entry_id, record):
+        """Index one live change (record None: removed)"""
+        with self.lock:
+            if self.loading:
+                # Stored rows still to be loaded for this entry are older: they are skipped,
+                # and the change is indexed once the load is done
+                self.deferred[entry_id] = record
+            if record is None:
+                doc = self.find(entry_id)
+                if doc is not None:
+                    self.deleted.add(doc)
+                return
+            if self.loading:
+                return
+        self.add_many([record])
+
+    def add_many(self, records):
+        """Index stored entries (row dicts with id and SEARCH_COLUMNS), replacing earlier versions"""
+        for start in range(0, len(records), SEGMENT_DOCS):
+            chunk = records[start:start + SEGMENT_DOCS]
+            docs, codes = trigram_pairs([document_text(record) for record in chunk])
+            with self.lock:
+                self.append(chunk, docs, codes)
+
+    def append(self, records, docs, codes):
+        # Large batches become a segment of their own; small ones wait in the buffer
+        direct = len(records) >= PENDING_DOCS
+        if direct:
+            self.flush()
+        first = len(self.ids)
+        for doc, record in enumerate(records, first):
+            entry_id = record['id']
+            previous = self.find(entry_id)
+            if previous is not None:
+                self.deleted.add(previous)
+            if not self.ordered_ids or entry_id > self.ordered_ids[-1]:
+                self.ordered_ids.append(entry_id)
+                self.ordered_docs.append(doc)
+            else:
+                self.moved[entry_id] = doc
+            self.ids.append(entry_id)
+            self.cards.append(record)
+
+        docs = docs + first
+        if direct:
+            self.add_segment(Segment(first, len(records), docs, codes))
+            self.pending_start = len(self.ids)
+            return
+        for doc, code in zip(docs.tolist(), codes.tolist()):
+            self.pending.setdefault(doc, set()).add(code)
+        if len(self.ids) - self.pending_start >= PENDING_DOCS:
+            self.flush()
+
+    def flush(self):
+        """Freeze the buffered cards into a segment"""
+        span = len(self.ids) - self.pending_start
+        if span:
+            docs = np.array([doc for doc, codes in self.pending.items() for _ in codes], dtype=np.int64)
+            codes = np.array([code for codes in self.pending.values() for code in codes], dtype=np.int64)
+            self.add_segment(Segment(self.pending_start, span, docs, codes))
+        self.pending = {}
+        self.pending_start = len(self.ids)
+
+    def add_segment(self, segment):
+        self.segments.append(segment)
+        tail = 0
+        span = 0
+        for previous in reversed(self.segments):
+            if span + previous.span > SEGMENT_DOCS:
+                break
+            span += previous.span
+            tail += 1
+        if tail >= MERGE_FACTOR:
+            self.segments[-tail:] = [merged(self.segments[-tail:])]
+
+    def search(self, query, user_name=None, limit=10):
+        """Best matching cards for a query, as {'id', 'score', 'name', 'company', 'title'}.
+
+        The score averages the share of the query's trigrams found in the
+        card and the best share found in one of its parsed fields.
+        """
+        start = time.perf_counter()
+        self.sync()
+        query_codes = trigram_set(query)
+        if not query_codes:
+            return []
+        min_shared = max(1, math.ceil(len(query_codes) * self.min_similarity))
+        codes = sorted(query_codes)
+        with self.lock:
+            found = [segment.match(codes, min_shared) for segment in self.segments]
+            pending = [(doc, len(doc_codes & query_codes)) for doc, doc_codes in self.pending.items()]
+            pending = [(doc, shared) for doc, shared in pending if shared >= min_shared]
+            if pending:
+                found.append((np.array([doc for doc, _ in pending]), np.array([shared for _, shared in pending])))
+            docs = np.concatenate([docs for docs, _ in found]) if found else np.zeros(0, dtype=np.int64)
+            counts = np.concatenate([counts for _, counts in found]) if found else np.zeros(0, dtype=np.int64)
+
+            keep = np.ones(len(docs), dtype=bool)
+            if user_name is not None:
+                users = self.cards.columns['user_name']
+                user_code = users.index.get(user_name)
+                if user_code is None:
+                    return []
+                keep &= np.frombuffer(users.codes, dtype=np.uint32)[docs] == user_code
+            if self.deleted:
+                keep &= ~np.isin(docs, np.fromiter(self.deleted, dtype=np.int64))
+            docs, counts = docs[keep], counts[keep]
+
+            take = min(len(docs), limit * RERANK_FACTOR)
+            if take < len(docs):
+                best = np.argpartition(-counts, take - 1)[:take]
+                docs, counts = docs[best], counts[best]
+
+            results = []
+            for doc, shared in zip(docs.tolist(), counts.tolist()):
+                card = self.cards[doc]
+                field_score = max(len(trigram_set(card[field]) & query_codes) for field in SEARCH_FIELDS)
+                score = (shared + field_score) / (2 * len(query_codes))
+                results.append((score, doc, {'id': self.ids[doc], 'score': round(score, 3),
+                                             **{field: card[field] for field in SEARCH_FIELDS}}))
+        # Newer cards first among equal scores
+        results.sort(key=lambda result: (-result[0], -result[1]))
+        SEARCH_SECONDS.observe(time.perf_counter() - start)
+        return [result for _, _, result in results[:limit]]
+
+    def load(self, chunks):
+        """Index every stored entry from chunks of row dicts (startup, in the background)"""
+        self.loading = True
+        started = time.perf_counter()
+        try:
+            for rows in chunks:
+                rows = [row for row in rows if row['id'] not in self.deferred]
+                if rows:
+                    self.add_many(rows)
+        finally:
+            self.finish_loading()
+        log_event(log, logging.INFO, 'Search index loaded', cards=len(self),
+                  seconds=round(time.perf_counter() - started, 1))
+
+    def finish_loading(self):
+        """Index the changes deferred during the load, in id order, then end it"""
+        while True:
+            with self.lock:
+                deferred, self.deferred = self.deferred, {}
+                if not deferred:
+                    self.loading = False
+                    return
+                for entry_id, record in deferred.items():
+                    # A row read just before its removal was deferred may have been loaded after all
+                    doc = self.find(entry_id) if record is None else None
+                    if doc is not None:
+                        self.deleted.add(doc)
+            added = [record for _, record in sorted(deferred.items()) if record is not None]
+            if added:
+                self.add_many(added)
+
+    def nbytes(self):
+        """Bytes held in postings, stored fields and id arrays (not the small buffer)"""
+        ids = (self.ids, self.ordered_ids, self.ordered_docs)
+        return (sum(segment.nbytes() for segment in self.segments) + self.cards.nbytes() +
+                sum(values.itemsize * len(values) for values in ids))
+
+    def stats(self):
+        self.sync()
+        with self.lock:
+            return {'cards': len(self), 'segments': len(self.segments), 'buffered': len(self.ids) - self.pending_start,
+                    'bytes': self.nbytes(), 'loading': self.loading}
+
+
+def load_from_database(index, url):
+    try:
+        source = open_source(url)
+        try:
+            index.load(iter_chunks(source, {}, columns=SEARCH_COLUMNS))
+        finally:
+            source.close()
+    except Exception as e:
+        index.finish_loading()
+        log_event(log, logging.ERROR, 'Search index load failed', error=str(e))
+
+
+def search_index_from_env():
+    """Build the search index from environment settings, or None when disabled.
+
+    Stored entries are loaded from the export database in a background thread;
+    changes made through any worker reach this one through the shared feed
+    (OCR_SEARCH_FEED_PATH, empty for none).
+    """
+    if os.getenv('OCR_SEARCH_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    feed_path = os.getenv('OCR_SEARCH_FEED_PATH', 'ocr_search_feed.db')
+    feed = ChangeFeed(feed_path) if feed_path else None
+    index = SearchIndex(feed=feed)
+    url = os.getenv('OCR_SEARCH_DATABASE_URL') or EXPORT_DATABASE_URL
+    if url:
+        # Changes published before now are already in the stored entries
+        index.seen = feed.last_seq() if feed else 0
+        index.loading = True
+        threading.Thread(target=load_from_database, args=(index, url), name='search-index-load', daemon=True).start()
+    return index
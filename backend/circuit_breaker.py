@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker for one OCR backend.
+
+    A call counts against the backend when it raises or takes longer than
+    slow_call_seconds. Once the failure rate over the last `window` calls
+    reaches `error_rate` (with at least `min_calls` recorded) the breaker
+    opens and the backend is skipped for `open_seconds`. After that a single
+    half-open probe is let through: success closes the breaker, failure
+    re-opens it.
+    """
+
+    def __init__(self, name, window=20, min_calls=5, error_rate=0.5,
+                 open_seconds=30.0, slow_call_seconds=10.0, clock=time.monotonic):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.calls = deque(maxlen=window)  # (failed, latency_seconds)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+        self.skipped = 0
+
+    def allow_request(self):
+        """Return True if the backend may be called now"""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self.clock() - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            self.skipped += 1
+            return False
+
+    def release_probe(self):
+        """Give back a half-open probe that was admitted but never called"""
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probe_in_flight = False
+
+    def record_success(self, latency):
+        failed = self.slow_call_seconds is not None and latency > self.slow_call_seconds
+        self.record(failed, latency)
+
+    def record_failure(self, latency):
+        self.record(True, latency)
+
+    def record(self, failed, latency):
+        with self.lock:
+            self.calls.append((failed, latency))
+            if self.state == HALF_OPEN:
+                self.probe_in_flight = False
+                if failed:
+                    self.trip()
+                else:
+                    self.state = CLOSED
+                    self.calls.clear()
+                    self.calls.append((failed, latency))
+                return
+            if self.state == CLOSED and len(self.calls) >= self.min_calls:
+                failures = sum(1 for call_failed, _ in self.calls if call_failed)
+                if failures / len(self.calls) >= self.error_rate:
+                    self.trip()
+
+    def trip(self):
+        """Open the breaker (lock held)"""
+        self.state = OPEN
+        self.opened_at = self.clock()
+        self.times_opened += 1
+
+    def snapshot(self):
+        with self.lock:
+            calls = list(self.calls)
+            state = self.state
+            times_opened = self.times_opened
+            skipped = self.skipped
+        latencies = sorted(latency for _, latency in calls)
+        failures = sum(1 for failed, _ in calls if failed)
+        return {
+            'state': state,
+            'calls': len(calls),
+            'error_rate': round(failures / len(calls), 4) if calls else 0.0,
+            'latency_p50_ms': percentile_ms(latencies, 0.50),
+            'latency_p95_ms': percentile_ms(latencies, 0.95),
+            'times_opened': times_opened,
+            'skipped': skipped,
+        }
+
+
+def percentile_ms(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return round(sorted_values[index] * 1000, 1)
@@ -0,0 +1,222 @@
+import io
+import os
+import threading
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter, ImageOps
+
+from metrics import PREPROCESS_SECONDS
+
+# A business card is 3.5in x 2in; Tesseract works best at roughly 300 DPI
+CARD_LONG_EDGE_INCHES = 3.5
+DEFAULT_TARGET_DPI = 300
+
+
+def preprocess_with_pil(image):
+    """Original Tesseract preprocessing: contrast, sharpen and median filter at full size"""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    enhancer = ImageEnhance.Contrast(image)
+    image = enhancer.enhance(1.5)
+
+    enhancer = ImageEnhance.Sharpness(image)
+    image = enhancer.enhance(2.0)
+
+    return image.filter(ImageFilter.MedianFilter())
+
+
+def preprocess_with_numpy(image, target_dpi=DEFAULT_TARGET_DPI, window_fraction=1 / 16,
+                          threshold_percent=12, clip_percent=1.0):
+    """Grayscale, downscale, contrast-stretch and adaptively binarize an image.
+
+    Returns an 8-bit black and white PIL image ready for pytesseract. Only the
+    grayscale plane is kept at full size; everything after the downscale runs
+    on arrays of the target size, reusing buffers where possible.
+    """
+    gray = downscale(image.convert('L'), target_dpi)
+    pixels = np.asarray(gray, dtype=np.uint8).copy()
+    stretch_contrast(pixels, clip_percent)
+    return Image.fromarray(binarize(pixels, window_fraction, threshold_percent), mode='L')
+
+
+def downscale(gray, target_dpi):
+    """Shrink so the long edge matches a card printed at target_dpi (never upscale)"""
+    target_long_edge = int(target_dpi * CARD_LONG_EDGE_INCHES)
+    long_edge = max(gray.size)
+    if long_edge <= target_long_edge:
+        return gray
+
+    # Integer box reduction first (cheap), then a single resample to the exact size
+    factor = long_edge // target_long_edge
+    if factor >= 2:
+        gray = gray.reduce(factor)
+    scale = target_long_edge / max(gray.size)
+    if scale < 1:
+        size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+        gray = gray.resize(size, Image.BILINEAR)
+    return gray
+
+
+def stretch_contrast(pixels, clip_percent):
+    """Linearly stretch the clip_percent..(100 - clip_percent) intensity range to 0..255 in place"""
+    histogram = np.bincount(pixels.ravel(), minlength=256)
+    cumulative = np.cumsum(histogram)
+    total = cumulative[-1]
+    low = int(np.searchsorted(cumulative, total * clip_percent / 100.0))
+    high = int(np.searchsorted(cumulative, total * (100.0 - clip_percent) / 100.0))
+    if high <= low:
+        return pixels
+
+    levels = np.arange(256, dtype=np.float32)
+    lut = np.clip((levels - low) * (255.0 / (high - low)), 0, 255).astype(np.uint8)
+    np.take(lut, pixels, out=pixels)
+    return pixels
+
+
+def binarize(pixels, window_fraction, threshold_percent):
+    """Bradley-Roth adaptive threshold using an integral image.
+
+    A pixel becomes black when it is threshold_percent darker than the mean
+    of the window around it, which copes with uneven lighting on phone photos.
+    """
+    height, width = pixels.shape
+    half = max(1, int(max(height, width) * window_fraction) // 2)
+
+    # Integral image with a zero row and column in front
+    window = 2 * half + 1
+    dtype = np.int32 if max(height * width, window * window * 100) * 255 < 2 ** 31 else np.int64
+    integral = np.zeros((height + 1, width + 1), dtype=dtype)
+    np.cumsum(pixels, axis=0, dtype=dtype, out=integral[1:, 1:])
+    np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+
+    rows = np.arange(height)
+    cols = np.arange(width)
+    top = np.clip(rows - half, 0, height)
+    bottom = np.clip(rows + half + 1, 0, height)
+    left = np.clip(cols - half, 0, width)
+    right = np.clip(cols + half + 1, 0, width)
+
+    window_sums = integral[np.ix_(bottom, right)]
+    window_sums -= integral[np.ix_(top, right)]
+    window_sums -= integral[np.ix_(bottom, left)]
+    window_sums += integral[np.ix_(top, left)]
+    window_sums *= 100 - threshold_percent
+    del integral
+
+    # pixel * area * 100 <= sum * (100 - t), kept in integers to avoid float temporaries
+    scaled = pixels.astype(dtype)
+    scaled *= (bottom - top)[:, None] * 100
+    scaled *= (right - left)[None, :]
+    output = np.full((height, width), 255, dtype=np.uint8)
+    output[scaled <= window_sums] = 0
+    return output
+
+
+EXIF_ORIENTATION = 0x0112
+
+
+class NormalizedUpload:
+    """An uploaded photo re-encoded once per backend size.
+
+    The photo is decoded at most once, with JPEG draft mode so the decoder
+    works at reduced resolution, then EXIF orientation is applied. Each
+    backend gets a copy shrunk to its own maximum long edge and re-encoded as
+    JPEG. If the photo cannot be decoded, or re-encoding would not make it
+    smaller, the original bytes are used unchanged, except that a photo
+    rotated upright is always sent rotated.
+    """
+
+    def __init__(self, image_data, long_edges, jpeg_quality=85):
+        self.original = image_data
+        self.long_edges = long_edges
+        self.jpeg_quality = jpeg_quality
+        self.lock = threading.Lock()
+        self.decoded = None
+        self.decode_failed = False
+        self.rotated = False
+        self.variants = {}
+        self.sent = {}  # backend -> payload size
+
+    def for_backend(self, name):
+        """Bytes to send to the named OCR backend"""
+        long_edge = self.long_edges.get(name)
+        if not long_edge:
+            return self.original
+        with self.lock:
+            data = self.variants.get(long_edge)
+            if data is None:
+                with PREPROCESS_SECONDS.time(stage='normalize'):
+                    data = self.encode(long_edge)
+                self.variants[long_edge] = data
+            self.sent[name] = len(data)
+        record_normalization(len(self.original), len(data))
+        return data
+
+    def bytes_saved(self, name):
+        """Bytes saved on the payload sent to the named backend (the one that answered), once per request"""
+        return len(self.original) - self.sent.get(name, len(self.original))
+
+    def decode(self):
+        """Decode once at the largest size any backend needs (lock held)"""
+        if self.decoded is None and not self.decode_failed:
+            try:
+                image = Image.open(io.BytesIO(self.original))
+                largest = max(self.long_edges.values())
+                image.draft('RGB', (largest, largest))
+                self.rotated = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+                image = ImageOps.exif_transpose(image)
+                if image.mode not in ('RGB', 'L'):
+                    image = image.convert('RGB')
+                self.decoded = image
+            except Exception:
+                self.decode_failed = True
+        return self.decoded
+
+    def encode(self, long_edge):
+        image = self.decode()
+        if image is None:
+            return self.original
+
+        if max(image.size) > long_edge:
+            image = image.copy()
+            image.thumbnail((long_edge, long_edge), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=self.jpeg_quality, optimize=True)
+        data = buffer.getvalue()
+        # The original would arrive sideways, so a rotated photo is sent even when larger
+        return data if self.rotated or len(data) < len(self.original) else self.original
+
+
+# Largest long edge, in pixels, to send to each backend
+NORMALIZE_LONG_EDGES = {
+    'amazon_textract': int(os.getenv('OCR_MAX_EDGE_TEXTRACT', '2000')),
+    'google_vision': int(os.getenv('OCR_MAX_EDGE_VISION', '1600')),
+    'tesseract': int(os.getenv('OCR_MAX_EDGE_TESSERACT', '1400')),
+}
+NORMALIZE_ENABLED = os.getenv('OCR_NORMALIZE_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+NORMALIZE_JPEG_QUALITY = int(os.getenv('OCR_NORMALIZE_JPEG_QUALITY', '85'))
+
+normalization_stats = {'backend_calls': 0, 'original_bytes': 0, 'sent_bytes': 0}
+normalization_stats_lock = threading.Lock()
+
+
+def record_normalization(original_bytes, sent_bytes):
+    with normalization_stats_lock:
+        normalization_stats['backend_calls'] += 1
+        normalization_stats['original_bytes'] += original_bytes
+        normalization_stats['sent_bytes'] += sent_bytes
+
+
+def normalization_health():
+    with normalization_stats_lock:
+        stats = dict(normalization_stats)
+    stats['enabled'] = NORMALIZE_ENABLED
+    stats['bytes_saved'] = stats['original_bytes'] - stats['sent_bytes']
+    return stats
+
+
+def prepare_upload(image_data):
+    """Wrap uploaded bytes for the OCR backends (normalization may be disabled)"""
+    long_edges = NORMALIZE_LONG_EDGES if NORMALIZE_ENABLED else {}
+    return NormalizedUpload(image_data, long_edges, NORMALIZE_JPEG_QUALITY)
@@ -0,0 +1,136 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, dense where OCR calls usually land
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (16 * 1024, 64 * 1024, 256 * 1024, 512 * 1024, 1024 * 1024, 2 * 1024 * 1024,
+                 4 * 1024 * 1024, 8 * 1024 * 1024, 16 * 1024 * 1024)
+
+REGISTRY = []
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by label values"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield f'{self.name}_total{format_labels(self.labelnames, key)} {format_value(value)}'
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is one bisect and a few additions under a lock"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=SECONDS_BUCKETS, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self.series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        series = self.series.get(tuple(labels[name] for name in self.labelnames))
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, list(series)) for key, series in self.series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else format_value(float(bound))
+                yield f'{self.name}_bucket{format_labels(self.labelnames, key, [("le", le)])} {cumulative}'
+            labels = format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {format_value(float(series[-1]))}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REQUEST_SECONDS = Histogram('ocr_request_seconds', 'Total time to serve a request',
+                            labelnames=('endpoint', 'status'))
+REQUEST_BYTES = Histogram('ocr_request_size_bytes', 'Size of uploaded images', buckets=BYTES_BUCKETS,
+                          labelnames=('endpoint',))
+BACKEND_SECONDS = Histogram('ocr_backend_attempt_seconds', 'Duration of one OCR backend call by outcome',
+                            labelnames=('backend', 'outcome'))
+PREPROCESS_SECONDS = Histogram('ocr_preprocess_seconds', 'Image preprocessing time',
+                               labelnames=('stage',))
+PARSE_SECONDS = Histogram('ocr_parse_seconds', 'Rule-based parsing time per card')
+FALLBACKS = Counter('ocr_fallbacks', 'Times the chain moved past a backend, by reason',
+                    labelnames=('backend', 'reason'))
+PARSE_LIMITED = Counter('ocr_parse_limited', 'Cards whose OCR text was cut to fit the parser limits, by limit',
+                        labelnames=('limit',))
+EXPORT_ROWS = Counter('ocr_export_rows', 'Card entries streamed by /export, by format', labelnames=('format',))
+DEDUP_CHECKS = Counter('ocr_dedup_checks', 'Duplicate-index checks, by whether a likely duplicate was found',
+                       labelnames=('result',))
+DEDUP_SECONDS = Histogram('ocr_dedup_check_seconds', 'Duplicate-index lookup time per card')
+SEARCH_SECONDS = Histogram('ocr_search_seconds', 'Card search query time',
+                           buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+RATE_LIMITED = Counter('ocr_rate_limited', 'Uploads refused by the per-user rate limit, by endpoint',
+                       labelnames=('endpoint',))
@@ -0,0 +1,280 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from circuit_breaker import CircuitBreaker
+from metrics import BACKEND_SECONDS, FALLBACKS
+from ocr_limits import backend_quota_from_env, current_user
+from ocr_logging import log_event, request_log
+from ocr_plugins import PLUGINS, ImageRejected, NoTextFound, warm_up
+from image_preprocess import normalization_health, prepare_upload
+
+
+log = logging.getLogger('ocr.backends')
+
+
+# Human readable backend names for logs and error messages
+BACKEND_LABELS = {
+    'amazon_textract': 'Amazon Textract',
+    'google_vision': 'Google Vision',
+    'tesseract': 'Tesseract',
+}
+
+DEFAULT_BACKEND_ORDER = 'amazon_textract,google_vision,tesseract'
+
+
+def backend_order_from_env():
+    """Priority order of the fallback chain, from OCR_BACKEND_ORDER"""
+    order = [name.strip() for name in os.getenv('OCR_BACKEND_ORDER', DEFAULT_BACKEND_ORDER).split(',') if name.strip()]
+    unknown = [name for name in order if name not in PLUGINS]
+    if unknown:
+        raise ValueError(f"Unknown OCR backends in OCR_BACKEND_ORDER: {', '.join(unknown)}")
+    return order
+
+
+def breaker_from_env(name):
+    return CircuitBreaker(
+        name,
+        window=int(os.getenv('OCR_BREAKER_WINDOW', '20')),
+        min_calls=int(os.getenv('OCR_BREAKER_MIN_CALLS', '5')),
+        error_rate=float(os.getenv('OCR_BREAKER_ERROR_RATE', '0.5')),
+        open_seconds=float(os.getenv('OCR_BREAKER_OPEN_SECONDS', '30')),
+        slow_call_seconds=float(os.getenv('OCR_BREAKER_SLOW_CALL_SECONDS', '10')),
+    )
+
+
+BACKEND_ORDER = backend_order_from_env()
+# OCR backends by ocr_method name; ones left out of OCR_BACKEND_ORDER are disabled and never imported
+BACKENDS = {name: PLUGINS[name] for name in BACKEND_ORDER}
+BREAKERS = {name: breaker_from_env(name) for name in BACKENDS}
+
+
+def warm_backends():
+    """Import every enabled backend now (e.g. in the gunicorn master, before workers fork)"""
+    warm_up(BACKEND_ORDER)
+
+
+def attempt_outcome(error):
+    """Metric label for how a backend attempt ended"""
+    if isinstance(error, NoTextFound):
+        return 'no_text'
+    if isinstance(error, ImageRejected):
+        return 'rejected'
+    return 'error'
+
+
+def record_fallback(name, error=None, skipped='circuit_open'):
+    """Count the chain moving past a backend (error None: skipped without a call, for the skipped reason)"""
+    reason = skipped if error is None else attempt_outcome(error)
+    FALLBACKS.inc(backend=name, reason=reason)
+    if error is None:
+        request_log().attempt(name, reason, 0.0)
+
+
+# Why a backend is passed over without being called, for error messages
+SKIP_MESSAGES = {
+    'circuit_open': 'skipped (circuit open)',
+    'quota': 'skipped (quota exhausted)',
+}
+
+
+def skip_reason(name):
+    """Why the chain must pass over a backend right now, or None if it may be called.
+
+    Paid backends first draw on the current user's quota; a quota unit is
+    handed back if the breaker then refuses the call.
+    """
+    if QUOTA and not QUOTA.acquire(name, current_user()):
+        return 'quota'
+    if not BREAKERS[name].allow_request():
+        if QUOTA:
+            QUOTA.release(name, current_user())
+        return 'circuit_open'
+    return None
+
+
+def release_admission(name):
+    """Undo what skip_reason took for a call that was admitted but never made"""
+    BREAKERS[name].release_probe()
+    if QUOTA:
+        QUOTA.release(name, current_user())
+
+
+def record_attempt(name, outcome, elapsed, error=None):
+    """Feed one backend attempt to the metrics and the request summary"""
+    BACKEND_SECONDS.observe(elapsed, backend=name, outcome=outcome)
+    request_log().attempt(name, outcome, elapsed, error and str(error))
+    if outcome == 'error':
+        log_event(log, logging.WARNING, 'OCR backend failed', backend=name, error=str(error))
+
+
+def call_backend(name, image_data):
+    """Call one OCR backend, feeding the outcome to its circuit breaker"""
+    breaker = BREAKERS[name]
+    start = time.perf_counter()
+    try:
+        ocr_text = BACKENDS[name](image_data)
+    except (NoTextFound, ImageRejected) as e:
+        # The backend is healthy, it just cannot read this image
+        elapsed = time.perf_counter() - start
+        breaker.record_success(elapsed)
+        record_attempt(name, attempt_outcome(e), elapsed, e)
+        raise
+    except Exception as e:
+        elapsed = time.perf_counter() - start
+        breaker.record_failure(elapsed)
+        record_attempt(name, 'error', elapsed, e)
+        raise
+
+    elapsed = time.perf_counter() - start
+    breaker.record_success(elapsed)
+    record_attempt(name, 'success', elapsed)
+    return ocr_text
+
+
+def run_ocr_chain(image_data, order=None, upload=None):
+    """Run the OCR fallback chain and return (text, ocr_method).
+
+    Backends are tried in priority order; a backend whose circuit breaker is
+    open, or that is paid for and the user is out of quota, is skipped without
+    being called. Each backend receives the upload normalized to its own size.
+    """
+    upload = upload or prepare_upload(image_data)
+    errors = []
+    for name in order or BACKEND_ORDER:
+        label = BACKEND_LABELS[name]
+        skipped = skip_reason(name)
+        if skipped:
+            errors.append(f"{label}: {SKIP_MESSAGES[skipped]}")
+            record_fallback(name, skipped=skipped)
+            continue
+        try:
+            return call_backend(name, upload.for_backend(name)), name
+        except Exception as e:
+            errors.append(f"{label}: {str(e)}")
+            record_fallback(name, e)
+
+    raise Exception(f"All OCR methods failed. {', '.join(errors)}")
+
+
+def backend_costs_from_env():
+    """Relative cost of one call per backend, from OCR_BACKEND_COSTS"""
+    costs = {'amazon_textract': 1.0, 'google_vision': 1.0, 'tesseract': 0.0}
+    for item in os.getenv('OCR_BACKEND_COSTS', '').split(','):
+        if '=' in item:
+            name, cost = item.split('=', 1)
+            costs[name.strip()] = float(cost)
+    return costs
+
+
+# Racing mode: start the next backend if the current one is slow to answer
+HEDGE_ENABLED = os.getenv('OCR_HEDGE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+HEDGE_DELAY = float(os.getenv('OCR_HEDGE_DELAY_MS', '1500')) / 1000.0
+HEDGE_BUDGET = float(os.getenv('OCR_HEDGE_BUDGET', '1.0'))
+HEDGE_WORKERS = int(os.getenv('OCR_HEDGE_WORKERS', '16'))
+BACKEND_COSTS = backend_costs_from_env()
+
+# Per-user and global allowances on the paid backends (None when unlimited)
+QUOTA = backend_quota_from_env(BACKEND_COSTS)
+
+hedge_executor = None
+hedge_executor_lock = threading.Lock()
+
+
+def get_hedge_executor():
+    global hedge_executor
+    if hedge_executor is None:
+        with hedge_executor_lock:
+            if hedge_executor is None:
+                hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix='ocr-hedge')
+    return hedge_executor
+
+
+def run_ocr_race(image_data, order=None, hedge_delay=None, budget=None, upload=None):
+    """Run the OCR backends as a hedged race and return (text, ocr_method).
+
+    The first backend starts immediately. Whenever nothing has answered for
+    hedge_delay seconds, the next backend whose cost fits in what is left of
+    the per-request budget (the first backend's cost counts against it) is
+    started alongside the ones in flight; paid backends that do not fit are
+    passed over but stay queued. A failed backend is always followed by the
+    next one, as in the sequential chain. The first usable
+    result wins; slower backends are left to finish in the background and
+    their results are ignored (their outcomes still feed the breakers), while
+    those still queued are cancelled and their admission released.
+    """
+    hedge_delay = HEDGE_DELAY if hedge_delay is None else hedge_delay
+    budget = HEDGE_BUDGET if budget is None else budget
+    upload = upload or prepare_upload(image_data)
+    executor = get_hedge_executor()
+    pending = list(order or BACKEND_ORDER)
+    running = {}
+    errors = []
+    spent = 0.0
+
+    def launch(hedge):
+        nonlocal spent
+        for name in list(pending):
+            cost = BACKEND_COSTS.get(name, 0.0)
+            if hedge and spent + cost > budget:
+                continue
+            pending.remove(name)
+            skipped = skip_reason(name)
+            if skipped:
+                errors.append(f"{BACKEND_LABELS[name]}: {SKIP_MESSAGES[skipped]}")
+                record_fallback(name, skipped=skipped)
+                continue
+            spent += cost
+            if hedge:
+                request_log().note(hedged=True)
+            # Copy the context so the request summary sees attempts made on executor threads
+            running[executor.submit(contextvars.copy_context().run, call_backend, name,
+                                    upload.for_backend(name))] = name
+            return
+
+    launch(hedge=False)
+    while running:
+        done, _ = wait(running, timeout=hedge_delay, return_when=FIRST_COMPLETED)
+        if not done:
+            launch(hedge=True)
+            continue
+
+        for future in done:
+            name = running.pop(future)
+            try:
+                ocr_text = future.result()
+            except Exception as e:
+                errors.append(f"{BACKEND_LABELS[name]}: {str(e)}")
+                record_fallback(name, e)
+                continue
+            for loser, loser_name in running.items():
+                # A hedge still queued never runs: hand back its quota unit and breaker probe
+                if loser.cancel():
+                    release_admission(loser_name)
+            return ocr_text, name
+
+        # Everything that finished failed: fall through to the next backend
+        launch(hedge=bool(running))
+
+    raise Exception(f"All OCR methods failed. {', '.join(errors)}")
+
+
+def run_ocr(image_data, upload=None):
+    """Run OCR in the configured mode (hedged race or sequential chain)"""
+    if HEDGE_ENABLED:
+        return run_ocr_race(image_data, upload=upload)
+    return run_ocr_chain(image_data, upload=upload)
+
+
+def backend_health():
+    """Breaker state and rolling latencies per backend, in priority order"""
+    return {
+        'order': list(BACKEND_ORDER),
+        'normalization': normalization_health(),
+        'hedging': {'enabled': HEDGE_ENABLED, 'delay_ms': HEDGE_DELAY * 1000, 'budget': HEDGE_BUDGET},
+        'quota': QUOTA.stats() if QUOTA else None,
+        'backends': {name: dict(BREAKERS[name].snapshot(), **PLUGINS[name].snapshot()) for name in BACKENDS},
+    }
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def image_digest(image_data):
+    """Content address for an uploaded image"""
+    return hashlib.sha256(image_data).hexdigest()
+
+
+class DiskCache:
+    """SQLite tier for OCR results, shared by every worker on the host"""
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS ocr_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' expires_at REAL NOT NULL,'
+            ' accessed_at REAL NOT NULL,'
+            ' payload TEXT NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_ocr_cache_accessed ON ocr_cache (accessed_at)')
+        self.conn.commit()
+
+    def get(self, key, now):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT payload, expires_at FROM ocr_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self.conn.execute('DELETE FROM ocr_cache WHERE key = ?', (key,))
+                self.conn.commit()
+                return None
+            self.conn.execute('UPDATE ocr_cache SET accessed_at = ? WHERE key = ?', (now, key))
+            self.conn.commit()
+            return json.loads(row[0]), row[1]
+
+    def put(self, key, value, expires_at, now):
+        """Store a result and return the number of entries evicted"""
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO ocr_cache (key, expires_at, accessed_at, payload) VALUES (?, ?, ?, ?)',
+                (key, expires_at, now, json.dumps(value))
+            )
+            evicted = self.conn.execute('DELETE FROM ocr_cache WHERE expires_at <= ?', (now,)).rowcount
+            count = self.conn.execute('SELECT COUNT(*) FROM ocr_cache').fetchone()[0]
+            if count > self.max_entries:
+                evicted += self.conn.execute(
+                    'DELETE FROM ocr_cache WHERE key IN '
+                    '(SELECT key FROM ocr_cache ORDER BY accessed_at LIMIT ?)',
+                    (count - self.max_entries,)
+                ).rowcount
+            self.conn.commit()
+            return evicted
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM ocr_cache').fetchone()[0]
+
+
+class OCRCache:
+    """Content-addressed cache of OCR results: in-memory LRU with an optional SQLite tier"""
+
+    def __init__(self, max_entries=1024, ttl_seconds=86400, disk_path=None, disk_max_entries=100000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.disk = DiskCache(disk_path, disk_max_entries) if disk_path else None
+        self.counters = {
+            'hits': 0,
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expired': 0,
+        }
+
+    def get(self, image_data):
+        """Return the cached result for these image bytes, or None"""
+        key = image_digest(image_data)
+        now = time.time()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.entries.move_to_end(key)
+                    self.counters['hits'] += 1
+                    self.counters['memory_hits'] += 1
+                    return copy_result(entry[1])
+                del self.entries[key]
+                self.counters['expired'] += 1
+
+        if self.disk:
+            stored = self.disk.get(key, now)
+            if stored is not None:
+                value, expires_at = stored
+                with self.lock:
+                    self.remember(key, value, expires_at)
+                    self.counters['hits'] += 1
+                    self.counters['disk_hits'] += 1
+                return copy_result(value)
+
+        with self.lock:
+            self.counters['misses'] += 1
+        return None
+
+    def put(self, image_data, result):
+        """Cache the raw text, OCR method and parsed data of a successful OCR run"""
+        key = image_digest(image_data)
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        value = {
+            'raw_text': result['raw_text'],
+            'ocr_method': result['ocr_method'],
+            'parsed_data': result['parsed_data'],
+        }
+
+        with self.lock:
+            self.remember(key, value, expires_at)
+
+        if self.disk:
+            evicted = self.disk.put(key, value, expires_at, now)
+            if evicted:
+                with self.lock:
+                    self.counters['evictions'] += evicted
+
+    def remember(self, key, value, expires_at):
+        """Insert into the memory tier, evicting least recently used entries (lock held)"""
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self.entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        if self.disk:
+            stats['disk_entries'] = self.disk.count()
+        return stats
+
+
+def copy_result(value):
+    """Hand out copies so callers cannot mutate cached entries"""
+    return {
+        'raw_text': value['raw_text'],
+        'ocr_method': value['ocr_method'],
+        'parsed_data': dict(value['parsed_data']),
+    }
+
+
+def cache_from_env():
+    """Build the OCR cache from environment settings, or None when disabled"""
+    if os.getenv('OCR_CACHE_ENABLED', 'true').lower() in ('0', 'false', 'no'):
+        return None
+    return OCRCache(
+        max_entries=int(os.getenv('OCR_CACHE_MAX_ENTRIES', '1024')),
+        ttl_seconds=float(os.getenv('OCR_CACHE_TTL_SECONDS', '86400')),
+        disk_path=os.getenv('OCR_CACHE_DB_PATH') or None,
+        disk_max_entries=int(os.getenv('OCR_CACHE_DB_MAX_ENTRIES', '100000')),
+    )
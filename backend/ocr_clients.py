@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+
+# Connection settings shared by the OCR API clients
+MAX_POOL_CONNECTIONS = int(os.getenv('OCR_MAX_POOL_CONNECTIONS', '10'))
+CONNECT_TIMEOUT = float(os.getenv('OCR_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.getenv('OCR_READ_TIMEOUT', '30'))
+MAX_RETRIES = int(os.getenv('OCR_MAX_RETRIES', '2'))
+
+# Comma separated backends to replace with local stubs, e.g. "textract,vision"
+STUB_BACKENDS = {name.strip() for name in os.getenv('OCR_STUB_BACKENDS', '').split(',') if name.strip()}
+STUB_LATENCY = float(os.getenv('OCR_STUB_LATENCY_MS', '0')) / 1000.0
+
+STUB_TEXT = """John Smith
+Senior Software Engineer
+TechCorp Solutions Inc
+john.smith@techcorp.com
+(555) 123-4567
+www.techcorp.com
+123 Technology Lane
+Silicon Valley, CA 94105"""
+
+
+class ClientPool:
+    """One lazily built, thread-shared client per worker process.
+
+    The client is rebuilt when the credential fingerprint changes (rotated keys
+    or a replaced service account file), after a fork, or after invalidate().
+    """
+
+    def __init__(self, name, factory, fingerprint):
+        self.name = name
+        self.factory = factory
+        self.fingerprint = fingerprint
+        self.lock = threading.Lock()
+        self.client = None
+        self.client_key = None
+        self.builds = 0
+
+    def get(self):
+        key = (os.getpid(), self.fingerprint())
+        client = self.client
+        if client is not None and key == self.client_key:
+            return client
+        with self.lock:
+            if self.client is None or key != self.client_key:
+                self.client = self.factory()
+                self.client_key = key
+                self.builds += 1
+            return self.client
+
+    def invalidate(self):
+        """Drop the current client so the next get() builds a fresh one"""
+        with self.lock:
+            self.client = None
+            self.client_key = None
+
+    def install(self, client):
+        """Use a prebuilt client (e.g. a stub) until the fingerprint changes"""
+        with self.lock:
+            self.client = client
+            self.client_key = (os.getpid(), self.fingerprint())
+
+    def stats(self):
+        return {'builds': self.builds, 'active': self.client is not None}
+
+
+def textract_fingerprint():
+    return (
+        os.getenv('AWS_ACCESS_KEY_ID'),
+        os.getenv('AWS_SECRET_ACCESS_KEY'),
+        os.getenv('AWS_SESSION_TOKEN'),
+        os.getenv('AWS_REGION', 'us-east-1'),
+    )
+
+
+def vision_fingerprint():
+    path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+    try:
+        mtime = os.path.getmtime(path) if path else None
+    except OSError:
+        mtime = None
+    return path, mtime
+
+
+def build_textract_client():
+    """Create a Textract client with pooled connections and bounded timeouts"""
+    if 'textract' in STUB_BACKENDS:
+        return StubTextractClient()
+
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import NoCredentialsError
+
+    aws_access_key = os.getenv('AWS_ACCESS_KEY_ID')
+    aws_secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
+    aws_region = os.getenv('AWS_REGION', 'us-east-1')
+    config = Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        retries={'max_attempts': MAX_RETRIES, 'mode': 'standard'}
+    )
+
+    if aws_access_key and aws_secret_key:
+        return boto3.client(
+            'textract',
+            aws_access_key_id=aws_access_key,
+            aws_secret_access_key=aws_secret_key,
+            aws_session_token=os.getenv('AWS_SESSION_TOKEN'),
+            region_name=aws_region,
+            config=config
+        )
+    # Try using default AWS credentials (from ~/.aws/credentials or IAM role)
+    try:
+        return boto3.client('textract', region_name=aws_region, config=config)
+    except NoCredentialsError:
+        return None
+
+
+def build_vision_client():
+    """Create a Google Vision client; gRPC multiplexes requests over one channel"""
+    if 'vision' in STUB_BACKENDS:
+        return StubVisionClient()
+
+    from google.cloud import vision
+    return vision.ImageAnnotatorClient()
+
+
+class StubTextractClient:
+    """Local stand-in for the Textract client, for benchmarks and load tests"""
+
+    def __init__(self, text=STUB_TEXT, latency=None):
+        self.text = text
+        self.latency = STUB_LATENCY if latency is None else latency
+
+    def detect_document_text(self, Document):
+        if self.latency:
+            time.sleep(self.latency)
+        return {'Blocks': [{'BlockType': 'LINE', 'Text': line} for line in self.text.split('\n')]}
+
+
+class StubVisionClient:
+    """Local stand-in for the Vision client, for benchmarks and load tests"""
+
+    def __init__(self, text=STUB_TEXT, latency=None):
+        self.text = text
+        self.latency = STUB_LATENCY if latency is None else latency
+
+    def text_detection(self, image, timeout=None):
+        if self.latency:
+            time.sleep(self.latency)
+        return SimpleNamespace(
+            error=SimpleNamespace(message=''),
+            text_annotations=[SimpleNamespace(description=self.text)]
+        )
+
+
+textract_pool = ClientPool('textract', build_textract_client, textract_fingerprint)
+vision_pool = ClientPool('vision', build_vision_client, vision_fingerprint)
@@ -0,0 +1,358 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+from ocr_limits import ANONYMOUS, fair_pick, set_current_user, user_weights_from_env
+from ocr_logging import log_event
+
+log = logging.getLogger('ocr.jobs')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+# Pause before a worker retries after the job store itself failed
+STORE_ERROR_BACKOFF_SECONDS = 1.0
+
+
+class QueueFull(Exception):
+    """Raised when the job queue is at capacity"""
+
+
+class JobAbandoned(Exception):
+    """A job whose worker stopped before finishing it, on every attempt"""
+
+
+def default_error_body(error):
+    return {'error': str(error), 'success': False}
+
+
+class MemoryJobStore:
+    """In-process job queue; jobs are only visible to the worker that accepted them"""
+
+    def __init__(self, max_pending, ttl_seconds, weights=None):
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self.weights = weights or {}
+        self.jobs = {}
+        self.images = {}
+        self.pending = {}  # user -> deque of queued job ids
+        self.last_claimed = {}
+        self.changed = threading.Condition()
+
+    def enqueue(self, job_id, image_data, user_name=ANONYMOUS):
+        with self.changed:
+            self.expire()
+            queued = sum(1 for job in self.jobs.values() if job['status'] in (QUEUED, RUNNING))
+            if queued >= self.max_pending:
+                raise QueueFull(f"{queued} jobs already pending")
+            now = time.time()
+            self.jobs[job_id] = {'job_id': job_id, 'status': QUEUED, 'user_name': user_name,
+                                 'created_at': now, 'updated_at': now}
+            self.images[job_id] = image_data
+            self.pending.setdefault(user_name, deque()).append(job_id)
+            self.changed.notify_all()
+
+    def claim(self, timeout):
+        """Take the next job, sharing workers fairly between users"""
+        deadline = time.time() + timeout
+        with self.changed:
+            while not self.pending:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self.changed.wait(remaining)
+            running = {}
+            for job in self.jobs.values():
+                if job['status'] == RUNNING:
+                    running[job['user_name']] = running.get(job['user_name'], 0) + 1
+            user_name = fair_pick({user: (running.get(user, 0), self.last_claimed.get(user),
+                                          self.jobs[job_ids[0]]['created_at'])
+                                   for user, job_ids in self.pending.items()}, self.weights)
+            job_ids = self.pending[user_name]
+            job_id = job_ids.popleft()
+            if not job_ids:
+                del self.pending[user_name]
+            now = time.time()
+            self.last_claimed[user_name] = now
+            self.jobs[job_id].update(status=RUNNING, updated_at=now)
+            return job_id, self.images.pop(job_id), user_name
+
+    def finish(self, job_id, status, body):
+        with self.changed:
+            self.jobs[job_id].update(status=status, result=body, updated_at=time.time())
+            self.changed.notify_all()
+
+    def get(self, job_id):
+        with self.changed:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def wait(self, job_id, timeout):
+        """Block until the job has finished or the timeout passes"""
+        deadline = time.time() + timeout
+        with self.changed:
+            while True:
+                job = self.jobs.get(job_id)
+                remaining = deadline - time.time()
+                if job is None or job['status'] in (DONE, FAILED) or remaining <= 0:
+                    return dict(job) if job else None
+                self.changed.wait(remaining)
+
+    def expire(self):
+        """Forget finished jobs older than the TTL (lock held)"""
+        cutoff = time.time() - self.ttl_seconds
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job['status'] in (DONE, FAILED) and job['updated_at'] < cutoff]:
+            del self.jobs[job_id]
+        active = {job['user_name'] for job in self.jobs.values()}
+        for user_name in [user_name for user_name in self.last_claimed if user_name not in active]:
+            del self.last_claimed[user_name]
+
+    def counts(self):
+        with self.changed:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self.jobs.values():
+                counts[job['status']] += 1
+            return counts
+
+
+class SQLiteJobStore:
+    """Job queue in a SQLite file, shared by every worker process on the host
+
+    A job stays running only for its lease: if the worker process dies mid-job, the job is
+    queued again once the lease is over, and failed after max_attempts claims.
+    """
+
+    def __init__(self, path, max_pending, ttl_seconds, poll_interval=0.2, weights=None,
+                 lease_seconds=600, max_attempts=2, on_error=default_error_body):
+        self.path = path
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self.poll_interval = poll_interval
+        self.weights = weights or {}
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.on_error = on_error
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS ocr_jobs ('
+            ' job_id TEXT PRIMARY KEY,'
+            ' status TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' updated_at REAL NOT NULL,'
+            ' image BLOB,'
+            ' result TEXT,'
+            f" user_name TEXT NOT NULL DEFAULT '{ANONYMOUS}',"
+            ' claimed_at REAL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0)'
+        )
+        # Job files created before jobs were tagged with their user, or had leases
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(ocr_jobs)')}
+        if 'user_name' not in columns:
+            self.conn.execute(f"ALTER TABLE ocr_jobs ADD COLUMN user_name TEXT NOT NULL DEFAULT '{ANONYMOUS}'")
+            self.conn.execute('ALTER TABLE ocr_jobs ADD COLUMN claimed_at REAL')
+        if 'attempts' not in columns:
+            self.conn.execute('ALTER TABLE ocr_jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_ocr_jobs_status ON ocr_jobs (status, created_at)')
+
+    def enqueue(self, job_id, image_data, user_name=ANONYMOUS):
+        now = time.time()
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.execute(
+                    'DELETE FROM ocr_jobs WHERE status IN (?, ?) AND updated_at < ?',
+                    (DONE, FAILED, now - self.ttl_seconds)
+                )
+                queued = self.conn.execute(
+                    'SELECT COUNT(*) FROM ocr_jobs WHERE status IN (?, ?)', (QUEUED, RUNNING)
+                ).fetchone()[0]
+                if queued >= self.max_pending:
+                    raise QueueFull(f"{queued} jobs already pending")
+                self.conn.execute(
+                    'INSERT INTO ocr_jobs (job_id, status, created_at, updated_at, image, user_name) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (job_id, QUEUED, now, now, image_data, user_name)
+                )
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def claim(self, timeout):
+        """Take the next job, sharing workers fairly between users (across every worker process)"""
+        deadline = time.time() + timeout
+        while True:
+            with self.lock:
+                self.conn.execute('BEGIN IMMEDIATE')
+                try:
+                    row = self.claim_next()
+                    self.conn.execute('COMMIT')
+                except Exception:
+                    self.conn.execute('ROLLBACK')
+                    raise
+            if row:
+                return row[0], row[1], row[2]
+            if time.time() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def claim_next(self):
+        """Mark the fairest user's oldest queued job running and return it (transaction open)"""
+        now = time.time()
+        self.reclaim_expired(now)
+        candidates = {
+            user_name: (running, last_claimed, oldest)
+            for user_name, running, last_claimed, oldest in self.conn.execute(
+                'SELECT user_name, SUM(status = ?), MAX(claimed_at), MIN(CASE WHEN status = ? THEN created_at END) '
+                'FROM ocr_jobs GROUP BY user_name HAVING SUM(status = ?) > 0',
+                (RUNNING, QUEUED, QUEUED)
+            )
+        }
+        if not candidates:
+            return None
+        return self.conn.execute(
+            'UPDATE ocr_jobs SET status = ?, updated_at = ?, claimed_at = ?, attempts = attempts + 1 WHERE job_id = '
+            '(SELECT job_id FROM ocr_jobs WHERE status = ? AND user_name = ? ORDER BY created_at LIMIT 1) '
+            'RETURNING job_id, image, user_name',
+            (RUNNING, now, now, QUEUED, fair_pick(candidates, self.weights))
+        ).fetchone()
+
+    def reclaim_expired(self, now):
+        """Requeue running jobs whose lease is over, or fail them once out of attempts (transaction open)"""
+        cutoff = now - self.lease_seconds
+        error = JobAbandoned(f"Job worker stopped before finishing, {self.max_attempts} attempts made")
+        failed = self.conn.execute(
+            'UPDATE ocr_jobs SET status = ?, updated_at = ?, result = ?, image = NULL '
+            'WHERE status = ? AND claimed_at < ? AND attempts >= ?',
+            (FAILED, now, json.dumps(self.on_error(error)), RUNNING, cutoff, self.max_attempts)
+        ).rowcount
+        requeued = self.conn.execute(
+            'UPDATE ocr_jobs SET status = ?, updated_at = ? WHERE status = ? AND claimed_at < ?',
+            (QUEUED, now, RUNNING, cutoff)
+        ).rowcount
+        if failed or requeued:
+            log_event(log, logging.WARNING, 'Job leases expired', requeued=requeued, failed=failed)
+
+    def finish(self, job_id, status, body):
+        with self.lock:
+            self.conn.execute(
+                'UPDATE ocr_jobs SET status = ?, updated_at = ?, result = ?, image = NULL WHERE job_id = ?',
+                (status, time.time(), json.dumps(body), job_id)
+            )
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT job_id, status, created_at, updated_at, result FROM ocr_jobs WHERE job_id = ?', (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = {'job_id': row[0], 'status': row[1], 'created_at': row[2], 'updated_at': row[3]}
+        if row[4] is not None:
+            job['result'] = json.loads(row[4])
+        return job
+
+    def wait(self, job_id, timeout):
+        deadline = time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in (DONE, FAILED) or time.time() >= deadline:
+                return job
+            time.sleep(self.poll_interval)
+
+    def counts(self):
+        with self.lock:
+            rows = self.conn.execute('SELECT status, COUNT(*) FROM ocr_jobs GROUP BY status').fetchall()
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+
+class JobQueue:
+    """Bounded pool of background threads running OCR jobs from a job store"""
+
+    def __init__(self, store, process, on_error, workers):
+        self.store = store
+        self.process = process
+        self.on_error = on_error
+        self.workers = workers
+        self.threads = []
+        self.start_lock = threading.Lock()
+
+    def submit(self, image_data, user_name=ANONYMOUS):
+        """Queue an image for a user and return its job id, or raise QueueFull"""
+        self.start()
+        job_id = uuid.uuid4().hex
+        self.store.enqueue(job_id, image_data, user_name)
+        return job_id
+
+    def start(self):
+        """Start the worker threads on first use (after any pre-fork), replacing any that died"""
+        if len(self.threads) == self.workers and all(thread.is_alive() for thread in self.threads):
+            return
+        with self.start_lock:
+            self.threads = [thread for thread in self.threads if thread.is_alive()]
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.run, name=f'ocr-job-{len(self.threads)}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def run(self):
+        while True:
+            try:
+                self.run_one()
+            except Exception as e:
+                # A locked or unreachable store must not end the worker; the lease requeues its job
+                log_event(log, logging.ERROR, 'OCR job worker error', error=str(e))
+                time.sleep(STORE_ERROR_BACKOFF_SECONDS)
+
+    def run_one(self):
+        claimed = self.store.claim(timeout=1.0)
+        if claimed is None:
+            return
+        job_id, image_data, user_name = claimed
+        set_current_user(user_name)
+        try:
+            body = self.process(image_data)
+            self.store.finish(job_id, DONE, body)
+        except Exception as e:
+            log_event(log, logging.WARNING, 'OCR job failed', job_id=job_id, error=str(e))
+            self.store.finish(job_id, FAILED, self.on_error(e))
+
+    def get(self, job_id, wait=0):
+        if wait > 0:
+            return self.store.wait(job_id, wait)
+        return self.store.get(job_id)
+
+    def stats(self):
+        stats = self.store.counts()
+        stats['workers'] = self.workers
+        stats['max_pending'] = self.store.max_pending
+        return stats
+
+
+def job_store_from_env(on_error=default_error_body):
+    max_pending = int(os.getenv('OCR_JOB_MAX_PENDING', '100'))
+    ttl_seconds = float(os.getenv('OCR_JOB_TTL_SECONDS', '3600'))
+    weights = user_weights_from_env()
+    if os.getenv('OCR_JOB_BACKEND', 'memory') == 'sqlite':
+        return SQLiteJobStore(os.getenv('OCR_JOB_DB_PATH', 'ocr_jobs.db'), max_pending, ttl_seconds, weights=weights,
+                              lease_seconds=float(os.getenv('OCR_JOB_LEASE_SECONDS', '600')),
+                              max_attempts=int(os.getenv('OCR_JOB_MAX_ATTEMPTS', '2')), on_error=on_error)
+    return MemoryJobStore(max_pending, ttl_seconds, weights=weights)
+
+
+def job_queue_from_env(process, on_error):
+    return JobQueue(job_store_from_env(on_error), process, on_error, int(os.getenv('OCR_JOB_WORKERS', '4')))
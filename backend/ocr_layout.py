@@ -0,0 +1,152 @@
+class OcrLine:
+    """One line of OCR output with its box as fractions of the image and a 0-1 confidence.
+
+    Geometry and confidence are None when the backend did not report them.
+    """
+
+    __slots__ = ('text', 'left', 'top', 'width', 'height', 'confidence')
+
+    def __init__(self, text, left=None, top=None, width=None, height=None, confidence=None):
+        self.text = text
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.confidence = confidence
+
+    def __eq__(self, other):
+        return isinstance(other, OcrLine) and all(getattr(self, name) == getattr(other, name)
+                                                  for name in self.__slots__)
+
+    def __repr__(self):
+        return f'OcrLine({self.text!r}, top={self.top}, height={self.height}, confidence={self.confidence})'
+
+    def has_box(self):
+        return self.height is not None
+
+
+class OcrText(str):
+    """Text from an OCR backend that also carries its lines.
+
+    It is a str, so the cache, logs and JSON responses keep working on plain
+    text; the parser looks at .lines to use the layout when it is there. A
+    backend that already parsed the text (Tesseract, to judge a pass) keeps
+    the fields in .parsed for the parser to reuse.
+    """
+
+    def __new__(cls, text, lines=(), parsed=None):
+        self = super().__new__(cls, text)
+        self.lines = tuple(lines)
+        self.parsed = parsed
+        return self
+
+    def __reduce__(self):
+        # Tesseract results come back from worker processes pickled
+        return OcrText, (str(self), self.lines, self.parsed)
+
+    def has_layout(self):
+        return bool(self.lines) and all(line.has_box() for line in self.lines)
+
+
+def from_lines(lines):
+    """OcrText whose text is its lines joined by newlines"""
+    return OcrText('\n'.join(line.text for line in lines), lines)
+
+
+def textract_text(response):
+    """Lines from a DetectDocumentText response (boxes are already image fractions)"""
+    lines = []
+    for block in response['Blocks']:
+        if block['BlockType'] != 'LINE':
+            continue
+        box = block.get('Geometry', {}).get('BoundingBox')
+        confidence = block.get('Confidence')
+        confidence = confidence / 100.0 if confidence is not None else None
+        if box:
+            lines.append(OcrLine(block['Text'], box['Left'], box['Top'], box['Width'], box['Height'], confidence))
+        else:
+            lines.append(OcrLine(block['Text'], confidence=confidence))
+    return from_lines(lines)
+
+
+def vertices_box(vertices):
+    xs = [vertex.x for vertex in vertices]
+    ys = [vertex.y for vertex in vertices]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def vision_text(response):
+    """Lines from a Vision text_detection response.
+
+    The first annotation is the full text; the rest are words in reading
+    order, which are matched to its lines by their characters. Word boxes are
+    in pixels and are scaled by the page size (or the text's extent when the
+    response has no page).
+    """
+    annotations = response.text_annotations
+    text = annotations[0].description
+    words = []
+    for word in annotations[1:]:
+        vertices = getattr(getattr(word, 'bounding_poly', None), 'vertices', None)
+        if not vertices:
+            return OcrText(text, [OcrLine(line) for line in text.splitlines() if line.strip()])
+        words.append((word.description, vertices_box(vertices)))
+
+    pages = getattr(getattr(response, 'full_text_annotation', None), 'pages', None)
+    if pages and pages[0].width and pages[0].height:
+        page_width, page_height = pages[0].width, pages[0].height
+    elif words:
+        page_width = max(box[2] for _, box in words) or 1
+        page_height = max(box[3] for _, box in words) or 1
+    else:
+        page_width = page_height = 1
+
+    lines = []
+    position = 0
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        wanted = len(''.join(line.split()))
+        taken = 0
+        boxes = []
+        while taken < wanted and position < len(words):
+            word, box = words[position]
+            taken += len(''.join(word.split()))
+            boxes.append(box)
+            position += 1
+        if not boxes or taken != wanted:
+            # Words no longer line up with the text: keep the rest without geometry
+            lines.append(OcrLine(line))
+            position = len(words)
+            continue
+        left, top = min(box[0] for box in boxes), min(box[1] for box in boxes)
+        right, bottom = max(box[2] for box in boxes), max(box[3] for box in boxes)
+        lines.append(OcrLine(line, left / page_width, top / page_height,
+                             (right - left) / page_width, (bottom - top) / page_height))
+    return OcrText(text, lines)
+
+
+def reading_order(lines):
+    """Lines top to bottom, and left to right within lines sharing a row"""
+    result = []
+    row_start = 0
+    row_top = row_height = None
+    for line in sorted(lines, key=top_of):
+        # Same row when it starts within half a line height of the row's top line
+        if row_top is not None and line.top - row_top < min(line.height, row_height) / 2:
+            result.append(line)
+            if line.left < result[-2].left:
+                result[row_start:] = sorted(result[row_start:], key=left_of)
+        else:
+            row_start = len(result)
+            row_top, row_height = line.top, line.height
+            result.append(line)
+    return result
+
+
+def top_of(line):
+    return line.top
+
+
+def left_of(line):
+    return line.left
@@ -0,0 +1,429 @@
+"""
+Per-user limits on OCR work.
+
+Three things keep one user's bulk scan from crowding everyone else out:
+
+- a token bucket per user (keyed by the username the frontend sends with an
+  upload) caps how many cards a user can submit per minute; uploads over the
+  limit get 429 with a Retry-After,
+- queued OCR work (batch cards and async jobs) is handed out fairly: the next
+  piece of work goes to the user with the fewest cards in progress for their
+  weight, and among those to the one served longest ago, so users take turns
+  instead of waiting behind one long batch,
+- paid backends (cost above zero in OCR_BACKEND_COSTS) draw on per-user and
+  global quotas per window; a user over quota falls through to the free
+  backends instead of failing.
+
+Bucket and quota state lives in this process by default, or in a SQLite file
+(OCR_LIMIT_BACKEND=sqlite) so every worker on the host shares one set of limits.
+"""
+
+import contextvars
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from ocr_logging import log_event
+
+log = logging.getLogger('ocr.limits')
+
+ANONYMOUS = 'anonymous'
+MAX_USER_KEY_CHARS = 64
+# How often the stores drop full buckets and quota windows that have ended
+PRUNE_SECONDS = 60
+
+# User the current upload or OCR job is running for
+current_user_name = contextvars.ContextVar('ocr_user_name', default=ANONYMOUS)
+
+
+def user_key(username, address=None):
+    """Limiter key for a request: the username it was sent with, else the client address"""
+    username = (username or '').strip().lower()[:MAX_USER_KEY_CHARS]
+    if username:
+        return username
+    return f'ip:{address}' if address else ANONYMOUS
+
+
+def set_current_user(user_name):
+    """Record who the work running in this context is for"""
+    current_user_name.set(user_name)
+
+
+def current_user():
+    """The user the current upload or job is for ('anonymous' outside one)"""
+    return current_user_name.get()
+
+
+def user_weights_from_env():
+    """Relative share of queued OCR work per user, from OCR_USER_WEIGHTS (default 1)"""
+    weights = {}
+    for item in os.getenv('OCR_USER_WEIGHTS', '').split(','):
+        if '=' in item:
+            name, weight = item.split('=', 1)
+            weights[user_key(name)] = max(float(weight), 0.01)
+    return weights
+
+
+def fair_pick(candidates, weights):
+    """The user whose queued work goes next.
+
+    candidates maps user -> (running, last_served, oldest_queued): the user
+    with the fewest cards in progress per unit of weight wins, then the one
+    served longest ago, then the one with the oldest waiting card.
+    """
+    return min(candidates, key=lambda user: (candidates[user][0] / weights.get(user, 1.0),
+                                             candidates[user][1] or 0.0, candidates[user][2]))
+
+
+class MemoryLimitStore:
+    """Token buckets and quota windows for this worker only.
+
+    A full bucket or a window that has ended is the same as no entry, so
+    both are dropped every PRUNE_SECONDS; usernames are client supplied and
+    would otherwise add an entry each for good.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.buckets = {}  # key -> (tokens, updated_at, full_at)
+        self.windows = {}  # key -> (window_start, used, window_end)
+        self.pruned_at = clock()
+
+    def prune(self, now):
+        if now - self.pruned_at < PRUNE_SECONDS:
+            return
+        self.pruned_at = now
+        self.buckets = {key: bucket for key, bucket in self.buckets.items() if bucket[2] > now}
+        self.windows = {key: window for key, window in self.windows.items() if window[2] > now}
+
+    def take(self, key, cost, rate, burst):
+        """Take cost tokens from a bucket refilled at rate per second up to burst.
+
+        Returns 0 when taken, else the seconds until enough tokens have
+        accumulated. A cost above burst needs a full bucket and leaves it in
+        debt, so a large batch is let through once and then paid back.
+        """
+        with self.lock:
+            now = self.clock()
+            self.prune(now)
+            tokens, updated_at, _ = self.buckets.get(key, (burst, now, now))
+            tokens, wait = take_tokens(tokens, now - updated_at, cost, rate, burst)
+            self.buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            return wait
+
+    def consume(self, limits, amount, window):
+        """Count amount against every (key, limit) quota, or against none if any would be exceeded"""
+        with self.lock:
+            now = self.clock()
+            self.prune(now)
+            start = window_start(now, window)
+            used = {}
+            for key, _ in limits:
+                started, value, _ = self.windows.get(key, (start, 0.0, None))
+                used[key] = value if started == start else 0.0
+            if amount > 0 and any(used[key] + amount > limit for key, limit in limits):
+                return False
+            for key, _ in limits:
+                self.windows[key] = (start, max(used[key] + amount, 0.0), start + window)
+            return True
+
+    def usage(self, key, window):
+        """Amount counted against a quota in the current window"""
+        with self.lock:
+            start, used, _ = self.windows.get(key, (None, 0.0, None))
+            return used if start == window_start(self.clock(), window) else 0.0
+
+    def stats(self):
+        with self.lock:
+            return {'backend': 'memory', 'buckets': len(self.buckets)}
+
+
+class SQLiteLimitStore:
+    """Token buckets and quota windows in a SQLite file, shared by every worker process on the host"""
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS limit_buckets ('
+            ' key TEXT PRIMARY KEY,'
+            ' tokens REAL NOT NULL,'
+            ' updated_at REAL NOT NULL) WITHOUT ROWID'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS limit_quotas ('
+            ' key TEXT PRIMARY KEY,'
+            ' window_start REAL NOT NULL,'
+            ' used REAL NOT NULL) WITHOUT ROWID'
+        )
+        self.pruned_at = clock()
+
+    def due_for_prune(self, now):
+        if now - self.pruned_at < PRUNE_SECONDS:
+            return False
+        self.pruned_at = now
+        return True
+
+    def transaction(self, work):
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = work()
+                self.conn.execute('COMMIT')
+                return result
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def take(self, key, cost, rate, burst):
+        def work():
+            now = self.clock()
+            if self.due_for_prune(now):
+                # Buckets that have refilled since their last use (the file is shared by one limiter)
+                self.conn.execute('DELETE FROM limit_buckets WHERE tokens + (? - updated_at) * ? >= ?',
+                                  (now, rate, burst))
+            row = self.conn.execute('SELECT tokens, updated_at FROM limit_buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated_at = row or (burst, now)
+            tokens, wait = take_tokens(tokens, now - updated_at, cost, rate, burst)
+            self.conn.execute('INSERT OR REPLACE INTO limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?)',
+                              (key, tokens, now))
+            return wait
+        return self.transaction(work)
+
+    def consume(self, limits, amount, window):
+        def work():
+            now = self.clock()
+            start = window_start(now, window)
+            if self.due_for_prune(now):
+                self.conn.execute('DELETE FROM limit_quotas WHERE window_start + ? <= ?', (window, now))
+            used = {}
+            for key, _ in limits:
+                row = self.conn.execute('SELECT window_start, used FROM limit_quotas WHERE key = ?',
+                                        (key,)).fetchone()
+                used[key] = row[1] if row and row[0] == start else 0.0
+            if amount > 0 and any(used[key] + amount > limit for key, limit in limits):
+                return False
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO limit_quotas (key, window_start, used) VALUES (?, ?, ?)',
+                [(key, start, max(used[key] + amount, 0.0)) for key, _ in limits]
+            )
+            return True
+        return self.transaction(work)
+
+    def usage(self, key, window):
+        with self.lock:
+            row = self.conn.execute('SELECT window_start, used FROM limit_quotas WHERE key = ?', (key,)).fetchone()
+        return row[1] if row and row[0] == window_start(self.clock(), window) else 0.0
+
+    def stats(self):
+        with self.lock:
+            buckets = self.conn.execute('SELECT COUNT(*) FROM limit_buckets').fetchone()[0]
+        return {'backend': 'sqlite', 'path': self.path, 'buckets': buckets}
+
+
+def take_tokens(tokens, elapsed, cost, rate, burst):
+    """Refill a bucket for elapsed seconds and try to take cost; returns (tokens, seconds to wait)"""
+    tokens = min(burst, tokens + max(elapsed, 0.0) * rate)
+    need = min(cost, burst)
+    if tokens >= need:
+        return tokens - cost, 0.0
+    return tokens, (need - tokens) / rate
+
+
+def window_start(now, window):
+    return math.floor(now / window) * window
+
+
+class RateLimiter:
+    """Token bucket per user: rate_per_minute cards, with bursts of up to burst cards"""
+
+    def __init__(self, store, rate_per_minute, burst):
+        self.store = store
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+
+    def acquire(self, user_name, cost=1):
+        """Take cost cards from the user's bucket; returns 0, or the seconds to wait before retrying"""
+        wait = self.store.take(f'rate:{user_name}', cost, self.rate_per_minute / 60.0, self.burst)
+        if wait:
+            log_event(log, logging.INFO, 'Upload rate limited', user=user_name, cards=cost, retry_after=round(wait, 1))
+        return wait
+
+    def stats(self):
+        stats = self.store.stats()
+        stats.update(rate_per_minute=self.rate_per_minute, burst=self.burst)
+        return stats
+
+
+class BackendQuota:
+    """Per-user and global allowances on paid OCR backends, in backend cost units per window.
+
+    A limit of 0 leaves that quota unlimited. Calls to free backends are never
+    counted.
+    """
+
+    def __init__(self, store, costs, per_user, global_limit, window):
+        self.store = store
+        self.costs = costs
+        self.per_user = per_user
+        self.global_limit = global_limit
+        self.window = window
+
+    def limits(self, user_name):
+        limits = []
+        if self.per_user > 0:
+            limits.append((f'quota:{user_name}', self.per_user))
+        if self.global_limit > 0:
+            limits.append(('quota:*', self.global_limit))
+        return limits
+
+    def acquire(self, backend, user_name):
+        """Count one call to backend against the quotas; False if it would exceed one"""
+        cost = self.costs.get(backend, 0.0)
+        limits = self.limits(user_name)
+        if cost <= 0 or not limits:
+            return True
+        if self.store.consume(limits, cost, self.window):
+            return True
+        log_event(log, logging.INFO, 'Paid backend quota exhausted', backend=backend, user=user_name)
+        return False
+
+    def release(self, backend, user_name):
+        """Give back a call that was counted but not made"""
+        cost = self.costs.get(backend, 0.0)
+        limits = self.limits(user_name)
+        if cost > 0 and limits:
+            self.store.consume(limits, -cost, self.window)
+
+    def stats(self):
+        return {'per_user': self.per_user, 'global': self.global_limit, 'window_seconds': self.window,
+                'global_used': self.store.usage('quota:*', self.window)}
+
+
+class FairExecutor:
+    """Thread pool that hands queued calls out fairly across users instead of first come, first served.
+
+    Threads start on first use (after any pre-fork). Calls run in a copy of
+    the context they were submitted from (request log included), with the
+    user they were submitted for as the current user.
+    """
+
+    def __init__(self, workers, weights=None, name='ocr-fair', clock=time.monotonic):
+        self.workers = workers
+        self.weights = weights or {}
+        self.name = name
+        self.clock = clock
+        self.ready = threading.Condition()
+        self.queues = {}  # user -> deque of (future, context, fn, args)
+        self.running = {}
+        self.last_served = {}
+        self.threads = []
+
+    def submit(self, user_name, fn, *args):
+        future = Future()
+        with self.ready:
+            self.start()
+            self.queues.setdefault(user_name, deque()).append((future, contextvars.copy_context(), fn, args))
+            self.ready.notify()
+        return future
+
+    def start(self):
+        """Start the worker threads (lock held)"""
+        while len(self.threads) < self.workers:
+            thread = threading.Thread(target=self.run, name=f'{self.name}-{len(self.threads)}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def next_call(self):
+        with self.ready:
+            while not self.queues:
+                self.ready.wait()
+            user_name = fair_pick({user: (self.running.get(user, 0), self.last_served.get(user), 0)
+                                   for user in self.queues}, self.weights)
+            calls = self.queues[user_name]
+            call = calls.popleft()
+            if not calls:
+                del self.queues[user_name]
+            self.running[user_name] = self.running.get(user_name, 0) + 1
+            self.last_served[user_name] = self.clock()
+            return user_name, call
+
+    def done(self, user_name):
+        with self.ready:
+            self.running[user_name] -= 1
+            if not self.running[user_name]:
+                del self.running[user_name]
+                if user_name not in self.queues:
+                    self.last_served.pop(user_name, None)
+
+    def run(self):
+        while True:
+            user_name, (future, context, fn, args) = self.next_call()
+            try:
+                if future.set_running_or_notify_cancel():
+                    context.run(self.call, user_name, future, fn, args)
+            finally:
+                self.done(user_name)
+
+    def call(self, user_name, future, fn, args):
+        """Run one call inside its submitter's copied context"""
+        current_user_name.set(user_name)
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def stats(self):
+        with self.ready:
+            return {'workers': self.workers, 'queued': sum(len(calls) for calls in self.queues.values()),
+                    'users_waiting': len(self.queues), 'users_running': len(self.running)}
+
+
+def limit_store_from_env():
+    if os.getenv('OCR_LIMIT_BACKEND', 'memory') == 'sqlite':
+        return SQLiteLimitStore(os.getenv('OCR_LIMIT_DB_PATH', 'ocr_limits.db'))
+    return MemoryLimitStore()
+
+
+limit_store = None
+limit_store_lock = threading.Lock()
+
+
+def get_limit_store():
+    """The limit store shared by the rate limiter and the quotas in this process"""
+    global limit_store
+    if limit_store is None:
+        with limit_store_lock:
+            if limit_store is None:
+                limit_store = limit_store_from_env()
+    return limit_store
+
+
+def rate_limiter_from_env():
+    """Per-user upload rate limiter, or None when OCR_RATE_LIMIT_ENABLED is off"""
+    if os.getenv('OCR_RATE_LIMIT_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    return RateLimiter(get_limit_store(), float(os.getenv('OCR_RATE_LIMIT_PER_MINUTE', '30')),
+                       float(os.getenv('OCR_RATE_LIMIT_BURST', '20')))
+
+
+def backend_quota_from_env(costs):
+    """Paid-backend quotas, or None when neither OCR_QUOTA_PER_USER nor OCR_QUOTA_GLOBAL is set"""
+    per_user = float(os.getenv('OCR_QUOTA_PER_USER', '0'))
+    global_limit = float(os.getenv('OCR_QUOTA_GLOBAL', '0'))
+    if per_user <= 0 and global_limit <= 0:
+        return None
+    return BackendQuota(get_limit_store(), costs, per_user, global_limit,
+                        float(os.getenv('OCR_QUOTA_WINDOW_SECONDS', '86400')))
@@ -0,0 +1,231 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv('OCR_LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('OCR_LOG_FORMAT', 'json')
+LOG_QUEUE_SIZE = int(os.getenv('OCR_LOG_QUEUE_SIZE', '10000'))
+# Fraction of successful request summaries written; errors and debug requests are always written
+LOG_SAMPLE_RATE = float(os.getenv('OCR_LOG_SAMPLE_RATE', '1.0'))
+# Mask emails and phone numbers in debug dumps
+LOG_REDACT = os.getenv('OCR_LOG_REDACT', 'true').lower() in ('1', 'true', 'yes')
+# Requests carrying this header get a full debug dump; with a token set, the header must match it
+DEBUG_HEADER = os.getenv('OCR_LOG_DEBUG_HEADER', 'X-OCR-Debug')
+DEBUG_TOKEN = os.getenv('OCR_LOG_DEBUG_TOKEN', '')
+
+logger = logging.getLogger('ocr')
+debug_logger = logging.getLogger('ocr.debug')
+
+EMAIL_RE = re.compile(r'([A-Za-z0-9._%+-])[A-Za-z0-9._%+-]*@([A-Za-z0-9.-]+\.[A-Za-z]{2,})')
+DIGITS_RE = re.compile(r'\d(?=(?:[\s().-]*\d){2})')
+
+
+def redact(value):
+    """Mask emails and all but the last two digits of numbers in strings, dicts and lists"""
+    if isinstance(value, str):
+        return DIGITS_RE.sub('#', EMAIL_RE.sub(r'\1***@\2', value))
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any structured fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        return f'{line} {json.dumps(fields, default=str)}' if fields else line
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to a writer thread; drops them rather than block when the queue is full.
+
+    The writer thread is started on first use in each process, so it survives
+    a pre-forking server.
+    """
+
+    def __init__(self, target, max_size):
+        super().__init__(queue.Queue(maxsize=max_size))
+        self.target = target
+        self.listener = None
+        self.listener_pid = None
+        self.start_lock = threading.Lock()
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Keep the structured fields; formatting happens on the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_text = logging.Formatter().formatException(record.exc_info) if record.exc_info else None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.listener_pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        with self.start_lock:
+            if self.listener_pid != os.getpid():
+                self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+                self.listener.start()
+                self.listener_pid = os.getpid()
+
+    def flush(self):
+        """Wait until queued records have been written"""
+        deadline = time.time() + 5
+        while not self.queue.empty() and time.time() < deadline:
+            time.sleep(0.01)
+
+
+queue_handler = None
+
+
+def configure_logging(stream=None):
+    """Route the service's 'ocr' loggers through a non-blocking queue to stdout"""
+    global queue_handler
+    if queue_handler is not None:
+        return queue_handler
+    target = logging.StreamHandler(stream or sys.stdout)
+    target.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+    queue_handler = NonBlockingQueueHandler(target, LOG_QUEUE_SIZE)
+    logger.addHandler(queue_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    # Per-request dumps are let through regardless of the service log level
+    debug_logger.setLevel(logging.DEBUG)
+    atexit.register(queue_handler.flush)
+    return queue_handler
+
+
+def log_event(log, level, message, **fields):
+    """Log a message with structured fields"""
+    if log.isEnabledFor(level):
+        log.log(level, message, extra={'fields': fields})
+
+
+class RequestLog:
+    """Collects what happened during one request and writes it as a single summary record"""
+
+    def __init__(self, method, path, debug=False):
+        self.request_id = uuid.uuid4().hex[:16]
+        self.debug_enabled = debug or logger.isEnabledFor(logging.DEBUG)
+        self.started = time.perf_counter()
+        self.fields = {'request_id': self.request_id, 'method': method, 'path': path}
+        self.attempts = []
+
+    def note(self, **fields):
+        """Add fields to the request summary"""
+        self.fields.update(fields)
+
+    def attempt(self, backend, outcome, seconds, error=None):
+        entry = {'backend': backend, 'outcome': outcome, 'ms': round(seconds * 1000, 1)}
+        if error:
+            entry['error'] = error[:200]
+        self.attempts.append(entry)
+
+    def debug(self, message, **payload):
+        """Full payload dump, only for requests that asked for one (redacted unless disabled)"""
+        if self.debug_enabled:
+            fields = {'request_id': self.request_id, **(redact(payload) if LOG_REDACT else payload)}
+            debug_logger.debug(message, extra={'fields': fields})
+
+    def finish(self, status):
+        """Write the summary record (sampled unless the request failed or was being debugged)"""
+        if status < 500 and not self.debug_enabled and LOG_SAMPLE_RATE < 1.0 and random.random() >= LOG_SAMPLE_RATE:
+            return
+        self.fields.update(status=status, duration_ms=round((time.perf_counter() - self.started) * 1000, 1))
+        if self.attempts:
+            self.fields['attempts'] = self.attempts
+        log_event(logger, logging.WARNING if status >= 500 else logging.INFO, 'request', **self.fields)
+
+
+class NullRequestLog:
+    """Stand-in outside a request (batch workers, job threads, CLI) that records nothing"""
+
+    request_id = None
+
+    @property
+    def debug_enabled(self):
+        return logger.isEnabledFor(logging.DEBUG)
+
+    def note(self, **fields):
+        pass
+
+    def attempt(self, backend, outcome, seconds, error=None):
+        pass
+
+    def debug(self, message, **payload):
+        if self.debug_enabled:
+            debug_logger.debug(message, extra={'fields': redact(payload) if LOG_REDACT else payload})
+
+    def finish(self, status):
+        pass
+
+
+NULL_REQUEST_LOG = NullRequestLog()
+current_request_log = contextvars.ContextVar('ocr_request_log', default=NULL_REQUEST_LOG)
+
+
+def debug_requested(header_value):
+    """Whether the debug header on a request turns on its debug dump"""
+    if not header_value:
+        return False
+    if DEBUG_TOKEN:
+        return header_value == DEBUG_TOKEN
+    return header_value.lower() in ('1', 'true', 'yes')
+
+
+def begin_request(method, path, header_value=None):
+    """Start collecting the summary for the request running in this context"""
+    request_log = RequestLog(method, path, debug=debug_requested(header_value))
+    request_log.context_token = current_request_log.set(request_log)
+    return request_log
+
+
+def end_request(request_log):
+    """Stop attributing work in this context to a request begun with begin_request"""
+    current_request_log.reset(request_log.context_token)
+
+
+def request_log():
+    """The current request's log, or a no-op one outside a request"""
+    return current_request_log.get()
@@ -0,0 +1,78 @@
+"""
+Registry of OCR backends, each imported the first time it is used.
+
+The OCR SDKs are the heaviest imports in the service: google-cloud-vision
+pulls in gRPC and protobuf, pytesseract and botocore are smaller but not
+free. Each backend therefore lives in its own module (ocr_textract,
+ocr_vision, tesseract_ocr) and the fallback chain holds a BackendPlugin that
+imports the module on its first call. A deployment that leaves a backend out
+of OCR_BACKEND_ORDER never imports it.
+
+warm_up() imports the enabled backends ahead of time. Called in the gunicorn
+master (OCR_WARM_BACKENDS=true with --preload) the imported modules are
+shared copy-on-write by every forked worker instead of being loaded once per
+worker on its first request. API clients are still built per worker, after
+the fork.
+"""
+
+import importlib
+import logging
+import threading
+import time
+
+from ocr_logging import log_event
+
+log = logging.getLogger('ocr.plugins')
+
+
+class NoTextFound(Exception):
+    """The backend answered normally but found no text in the image"""
+
+
+class ImageRejected(Exception):
+    """The backend is healthy but cannot process this particular image"""
+
+
+class BackendPlugin:
+    """One OCR backend, given as 'module:function' and imported on first use"""
+
+    def __init__(self, name, target):
+        self.name = name
+        self.module_name, self.function_name = target.split(':')
+        self.function = None
+        self.import_seconds = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Import the backend module (once) and return its extract function"""
+        if self.function is None:
+            with self.lock:
+                if self.function is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self.module_name)
+                    self.import_seconds = time.perf_counter() - start
+                    self.function = getattr(module, self.function_name)
+                    log_event(log, logging.INFO, 'OCR backend loaded', backend=self.name,
+                              import_ms=round(self.import_seconds * 1000, 1))
+        return self.function
+
+    def __call__(self, image_data):
+        return (self.function or self.load())(image_data)
+
+    def snapshot(self):
+        return {'loaded': self.function is not None,
+                'import_ms': None if self.import_seconds is None else round(self.import_seconds * 1000, 1)}
+
+
+# Every backend the service knows, by ocr_method name
+PLUGINS = {
+    'amazon_textract': BackendPlugin('amazon_textract', 'ocr_textract:extract_text_with_textract'),
+    'google_vision': BackendPlugin('google_vision', 'ocr_vision:extract_text_with_vision'),
+    'tesseract': BackendPlugin('tesseract', 'tesseract_ocr:extract_text_with_tesseract'),
+}
+
+
+def warm_up(names):
+    """Import the named backends now rather than on their first request"""
+    for name in names:
+        PLUGINS[name].load()
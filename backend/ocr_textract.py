@@ -0,0 +1,45 @@
+"""
+Amazon Textract backend (loaded on first use through ocr_plugins)
+"""
+
+from botocore.exceptions import ClientError
+
+from ocr_clients import textract_pool
+from ocr_layout import textract_text
+from ocr_plugins import ImageRejected
+
+
+# AWS Textract client, shared by every request in this worker
+def get_textract_client():
+    """Return the pooled AWS Textract client, building it on first use"""
+    return textract_pool.get()
+
+# Error codes that mean the cached client holds stale credentials
+CREDENTIAL_ERROR_CODES = {'ExpiredTokenException', 'UnrecognizedClientException', 'InvalidSignatureException'}
+# Error codes caused by the uploaded image rather than the service
+IMAGE_ERROR_CODES = {'UnsupportedDocumentException', 'BadDocumentException', 'DocumentTooLargeException', 'InvalidParameterException'}
+
+def extract_text_with_textract(image_data):
+    """Extract text using Amazon Textract"""
+    try:
+        client = get_textract_client()
+        if not client:
+            raise Exception("AWS Textract credentials not configured")
+
+        # Call Textract
+        response = client.detect_document_text(
+            Document={'Bytes': image_data}
+        )
+
+        # Extract the lines, with their boxes and confidences, from the response
+        return textract_text(response)
+
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        if code in CREDENTIAL_ERROR_CODES:
+            textract_pool.invalidate()
+        if code in IMAGE_ERROR_CODES:
+            raise ImageRejected(f"Amazon Textract failed: {str(e)}")
+        raise Exception(f"Amazon Textract failed: {str(e)}")
+    except Exception as e:
+        raise Exception(f"Amazon Textract failed: {str(e)}")
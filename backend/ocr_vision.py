@@ -0,0 +1,25 @@
+"""
+Google Cloud Vision backend (loaded on first use through ocr_plugins)
+"""
+
+from google.cloud import vision
+
+from ocr_clients import READ_TIMEOUT, vision_pool
+from ocr_layout import vision_text
+from ocr_plugins import NoTextFound
+
+
+def extract_text_with_vision(image_data):
+    """Extract text using Google Cloud Vision"""
+    client = vision_pool.get()
+    image = vision.Image(content=image_data)
+    response = client.text_detection(image=image, timeout=READ_TIMEOUT)
+
+    if response.error.message:
+        raise Exception(f'Vision API error: {response.error.message}')
+
+    texts = response.text_annotations
+    if not texts:
+        raise NoTextFound('No text found in image')
+
+    return vision_text(response)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Re-parse stored OCR text with the current rule-based parser.
+
+Reads rows from a JSONL or CSV dump of business_card_entries, parses the
+ocr_text column across a process pool in chunks and streams the results out
+as JSONL or CSV, reporting throughput on stderr.
+
+    python reparse.py entries.jsonl -o reparsed.jsonl --workers 8
+    psql -c "\\copy (SELECT id, ocr_text FROM business_card_entries) TO STDOUT CSV HEADER" \\
+        | python reparse.py - --format csv > reparsed.jsonl
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from card_batch import CardBatch
+from card_parser import RESULT_FIELDS, parse_batch
+
+
+def read_rows(stream, input_format):
+    """Yield one dict per row of a JSONL or CSV dump"""
+    if input_format == 'csv':
+        csv.field_size_limit(sys.maxsize)
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def chunk_rows(rows, id_field, text_field, chunk_size):
+    """Group rows into (ids, texts) chunks"""
+    ids, texts = [], []
+    for row in rows:
+        ids.append(row.get(id_field))
+        texts.append(row.get(text_field) or '')
+        if len(texts) >= chunk_size:
+            yield ids, texts
+            ids, texts = [], []
+    if texts:
+        yield ids, texts
+
+
+def parse_chunk(chunk, fields=RESULT_FIELDS):
+    """Worker entry point: parse one chunk of texts into a columnar batch (cheap to send back)"""
+    ids, texts = chunk
+    return ids, parse_batch(texts, CardBatch(fields))
+
+
+def iter_results(chunks, workers, fields=RESULT_FIELDS):
+    """Parse chunks in order, keeping at most a few chunks in flight per worker"""
+    if workers <= 1:
+        for chunk in chunks:
+            yield parse_chunk(chunk, fields)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(parse_chunk, chunk, fields))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class ResultWriter:
+    """Stream parsed records out as JSONL or CSV"""
+
+    def __init__(self, stream, output_format, id_field, keep_raw_text):
+        self.stream = stream
+        self.output_format = output_format
+        self.id_field = id_field
+        self.fields = [id_field, *RESULT_FIELDS] + (['raw_text'] if keep_raw_text else [])
+        self.csv_writer = None
+        if output_format == 'csv':
+            self.csv_writer = csv.DictWriter(stream, fieldnames=self.fields, extrasaction='ignore')
+            self.csv_writer.writeheader()
+
+    def write(self, row_id, info):
+        record = {self.id_field: row_id}
+        for field in self.fields[1:]:
+            record[field] = info[field]
+        if self.csv_writer:
+            self.csv_writer.writerow(record)
+        else:
+            self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def reparse(input_stream, output_stream, input_format='jsonl', output_format='jsonl',
+            workers=None, chunk_size=500, id_field='id', text_field='ocr_text',
+            keep_raw_text=False, report_every=5.0, log=sys.stderr):
+    """Re-parse every row of a dump and return (cards, seconds)"""
+    workers = workers or os.cpu_count() or 1
+    writer = ResultWriter(output_stream, output_format, id_field, keep_raw_text)
+    rows = read_rows(input_stream, input_format)
+    chunks = chunk_rows(rows, id_field, text_field, chunk_size)
+
+    cards = 0
+    started = last_report = time.perf_counter()
+    for ids, results in iter_results(chunks, workers, writer.fields[1:]):
+        for row_id, info in zip(ids, results):
+            writer.write(row_id, info)
+        cards += len(results)
+
+        now = time.perf_counter()
+        if log and now - last_report >= report_every:
+            print(f"Parsed {cards} cards ({cards / (now - started):.0f} cards/s)", file=log)
+            last_report = now
+
+    elapsed = time.perf_counter() - started
+    if log:
+        rate = cards / elapsed if elapsed else 0.0
+        print(f"Done: {cards} cards in {elapsed:.2f}s ({rate:.0f} cards/s, {workers} workers)", file=log)
+    return cards, elapsed
+
+
+def detect_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Re-parse stored business card OCR text')
+    parser.add_argument('input', help="JSONL or CSV dump of business_card_entries ('-' for stdin)")
+    parser.add_argument('-o', '--output', default='-', help="Output path ('-' for stdout)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='Input format (default: from file extension)')
+    parser.add_argument('--output-format', choices=['jsonl', 'csv'], help='Output format (default: from output extension)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=500, help='Cards per worker task')
+    parser.add_argument('--id-field', default='id')
+    parser.add_argument('--text-field', default='ocr_text')
+    parser.add_argument('--keep-raw-text', action='store_true', help='Include raw_text in the output')
+    args = parser.parse_args(argv)
+
+    input_format = args.format or detect_format(args.input)
+    output_format = args.output_format or detect_format(args.output)
+
+    input_stream = sys.stdin if args.input == '-' else open(args.input, newline='', encoding='utf-8')
+    output_stream = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+    try:
+        reparse(input_stream, output_stream, input_format, output_format,
+                workers=args.workers, chunk_size=args.chunk_size,
+                id_field=args.id_field, text_field=args.text_field,
+                keep_raw_text=args.keep_raw_text)
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+
+
+if __name__ == '__main__':
+    main()
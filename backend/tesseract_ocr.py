@@ -0,0 +1,202 @@
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytesseract
+from PIL import Image, UnidentifiedImageError
+
+from card_parser import parses_confidently, with_parse
+from image_preprocess import preprocess_with_numpy, preprocess_with_pil
+from metrics import PREPROCESS_SECONDS
+from ocr_layout import OcrLine, OcrText
+from ocr_plugins import ImageRejected, NoTextFound
+
+# First pass: uniform block of text, restricted to characters found on cards
+PRIMARY_CONFIG = r'--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz.@-+()[]{}/:;,!?$%&*# '
+# Other page segmentation modes worth trying on hard cards
+FALLBACK_CONFIGS = [
+    r'--oem 3 --psm 3',
+    r'--oem 3 --psm 4',
+]
+
+# Mean word confidence (0-100) above which the first pass is accepted as is
+MIN_CONFIDENCE = float(os.getenv('OCR_TESSERACT_MIN_CONFIDENCE', '60'))
+FALLBACK_WORKERS = int(os.getenv('OCR_TESSERACT_WORKERS', str(len(FALLBACK_CONFIGS))))
+
+fallback_executor = None
+fallback_executor_lock = threading.Lock()
+
+
+def get_fallback_executor():
+    global fallback_executor
+    if fallback_executor is None:
+        with fallback_executor_lock:
+            if fallback_executor is None:
+                fallback_executor = ThreadPoolExecutor(max_workers=FALLBACK_WORKERS, thread_name_prefix='tesseract')
+    return fallback_executor
+
+
+class TesseractResult:
+    """Text and confidence from one image_to_data pass"""
+
+    def __init__(self, config, text, confidence, words):
+        self.config = config
+        self.text = text
+        self.confidence = confidence
+        self.words = words
+
+    def score(self):
+        # Most confident wins; word count breaks ties between equally sure passes
+        return (self.confidence, self.words)
+
+
+def result_from_data(config, data):
+    """Rebuild line-ordered text, line boxes and mean word confidence from image_to_data output"""
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data['text']):
+        word = word.strip()
+        if not word:
+            continue
+        confidence = float(data['conf'][i])
+        if confidence < 0:
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        lines.setdefault(key, []).append((word, confidence, i))
+        confidences.append(confidence)
+
+    page_size = None
+    if 'height' in data:
+        # The page entries (level 1) give the image size
+        pages = [i for i, level in enumerate(data['level']) if level == 1]
+        page_size = (max((data['width'][i] for i in pages), default=0) or 1,
+                     max((data['height'][i] for i in pages), default=0) or 1)
+    ocr_lines = [line_from_words(data, words, page_size) for _, words in sorted(lines.items())]
+    text = OcrText('\n'.join(line.text for line in ocr_lines), ocr_lines)
+    confidence = sum(confidences) / len(confidences) if confidences else -1.0
+    return TesseractResult(config, text, confidence, len(confidences))
+
+
+def line_from_words(data, words, page_size):
+    """One OcrLine from a line's (word, confidence, index) entries, boxed when data has geometry"""
+    text = ' '.join(word for word, _, _ in words)
+    confidence = sum(conf for _, conf, _ in words) / len(words) / 100.0
+    if page_size is None:
+        return OcrLine(text, confidence=confidence)
+    page_width, page_height = page_size
+    indexes = [i for _, _, i in words]
+    left = min(data['left'][i] for i in indexes)
+    top = min(data['top'][i] for i in indexes)
+    right = max(data['left'][i] + data['width'][i] for i in indexes)
+    bottom = max(data['top'][i] + data['height'][i] for i in indexes)
+    return OcrLine(text, left / page_width, top / page_height, (right - left) / page_width,
+                   (bottom - top) / page_height, confidence)
+
+
+def run_pass(image_path, config):
+    data = pytesseract.image_to_data(image_path, config=config, output_type=pytesseract.Output.DICT)
+    return result_from_data(config, data)
+
+
+def run_tesseract_smart(image):
+    """OCR with one confidence-scored pass, plus concurrent fallback modes only when needed.
+
+    A first pass below MIN_CONFIDENCE is still kept when the card's required
+    fields parse confidently from it: the mean word confidence is dragged down
+    by logos and artwork that the contact lines do not share. That parse is
+    returned with the text, so the card is not parsed a second time.
+
+    The image is encoded to a temporary PNG once and every pass reads that
+    file, instead of pytesseract re-encoding the image for each call.
+    """
+    with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as handle:
+        image.save(handle, format='PNG')
+        image_path = handle.name
+    try:
+        best = run_pass(image_path, PRIMARY_CONFIG)
+        if best.words and best.confidence < MIN_CONFIDENCE:
+            best.text = with_parse(best.text)
+        if best.words and (best.confidence >= MIN_CONFIDENCE or parses_confidently(best.text.parsed)):
+            return best.text, best.confidence
+
+        executor = get_fallback_executor()
+        futures = [executor.submit(run_pass, image_path, config) for config in FALLBACK_CONFIGS]
+        for future in futures:
+            result = future.result()
+            if result.score() > best.score():
+                best = result
+        return best.text, best.confidence
+    finally:
+        os.unlink(image_path)
+
+
+def run_tesseract_sequential(image):
+    """Original behaviour: retry image_to_string with each mode until one returns text"""
+    for config in [PRIMARY_CONFIG] + FALLBACK_CONFIGS:
+        ocr_text = pytesseract.image_to_string(image, config=config)
+        if ocr_text.strip():
+            return ocr_text, None
+    return '', None
+
+
+# Tesseract preprocessing: 'numpy' (downscaled, binarized) or 'pil' (original full-size chain)
+PREPROCESSORS = {
+    'numpy': preprocess_with_numpy,
+    'pil': preprocess_with_pil,
+}
+TESSERACT_PREPROCESS = os.getenv('OCR_TESSERACT_PREPROCESS', 'numpy')
+if TESSERACT_PREPROCESS not in PREPROCESSORS:
+    raise ValueError(f"Unknown OCR_TESSERACT_PREPROCESS: {TESSERACT_PREPROCESS}")
+
+TESSERACT_MODES = {
+    'smart': run_tesseract_smart,
+    'sequential': run_tesseract_sequential,
+}
+TESSERACT_MODE = os.getenv('OCR_TESSERACT_MODE', 'smart')
+if TESSERACT_MODE not in TESSERACT_MODES:
+    raise ValueError(f"Unknown OCR_TESSERACT_MODE: {TESSERACT_MODE}")
+
+# Run Tesseract work in a pool of worker processes (0 = in the calling thread)
+TESSERACT_PROCESSES = int(os.getenv('OCR_TESSERACT_PROCESSES', '0'))
+
+tesseract_executor = None
+tesseract_executor_lock = threading.Lock()
+
+
+def get_tesseract_executor():
+    global tesseract_executor
+    if tesseract_executor is None:
+        with tesseract_executor_lock:
+            if tesseract_executor is None:
+                tesseract_executor = ProcessPoolExecutor(max_workers=TESSERACT_PROCESSES)
+    return tesseract_executor
+
+
+def extract_text_with_tesseract(image_data):
+    """Extract text using local Tesseract OCR with preprocessing"""
+    if TESSERACT_PROCESSES > 0:
+        # Preprocessing is CPU bound; keep it off the request threads and the GIL
+        return get_tesseract_executor().submit(tesseract_text, image_data).result()
+    return tesseract_text(image_data)
+
+
+def tesseract_text(image_data):
+    """Decode, preprocess and OCR one image with Tesseract"""
+    try:
+        image = Image.open(io.BytesIO(image_data))
+    except UnidentifiedImageError as e:
+        raise ImageRejected(str(e))
+
+    # Image preprocessing for better OCR results
+    with PREPROCESS_SECONDS.time(stage=f'tesseract_{TESSERACT_PREPROCESS}'):
+        image = PREPROCESSORS[TESSERACT_PREPROCESS](image)
+
+    # One confidence-scored pass, or the original retry-per-mode loop
+    ocr_text, _ = TESSERACT_MODES[TESSERACT_MODE](image)
+
+    if not ocr_text.strip():
+        raise NoTextFound('No text found in image using Tesseract')
+
+    return ocr_text
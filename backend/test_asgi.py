@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Tests for the native asyncio (ASGI) serving path
+"""
+
+import asyncio
+import io
+import time
+
+import httpx
+from PIL import Image
+
+import app as flask_app
+import asgi
+import async_ocr
+import ocr_backends
+import ocr_logging
+from circuit_breaker import CircuitBreaker
+
+CARD_TEXT = 'John Smith\nSenior Engineer\nAcme Corp\njohn@acme.com\n+1 555 123 4567'
+
+
+def card_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (320, 200), 'white').save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class FailingClient:
+    async def detect_document_text(self, image_data):
+        raise Exception('throttled')
+
+
+def with_stub_backends(textract, test):
+    """Run an async test against stub API clients and a disabled cache"""
+    saved = (async_ocr.async_textract_pool.get, async_ocr.async_vision_pool.get,
+             ocr_backends.BREAKERS, ocr_backends.BACKEND_ORDER, flask_app.ocr_cache)
+    vision = async_ocr.AsyncStubClient(text=CARD_TEXT, latency=0.01)
+    async_ocr.async_textract_pool.get = lambda: textract
+    async_ocr.async_vision_pool.get = lambda: vision
+    ocr_backends.BREAKERS = {name: CircuitBreaker(name) for name in ocr_backends.BACKENDS}
+    ocr_backends.BACKEND_ORDER = ['amazon_textract', 'google_vision']
+    flask_app.ocr_cache = None
+    try:
+        asyncio.run(test())
+    finally:
+        (async_ocr.async_textract_pool.get, async_ocr.async_vision_pool.get,
+         ocr_backends.BREAKERS, ocr_backends.BACKEND_ORDER, flask_app.ocr_cache) = saved
+
+
+def client():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi.app), base_url='http://test')
+
+
+def test_concurrent_uploads_share_one_loop():
+    """100 uploads waiting on a 0.3s backend finish together rather than one after another"""
+    image = card_image()
+
+    async def test():
+        async with client() as http:
+            start = time.perf_counter()
+            responses = await asyncio.gather(*[
+                http.post('/upload', files={'image': ('card.jpg', image, 'image/jpeg')}) for _ in range(100)
+            ])
+            elapsed = time.perf_counter() - start
+
+        assert all(response.status_code == 200 for response in responses)
+        body = responses[0].json()
+        assert body['ocr_method'] == 'amazon_textract'
+        assert body['parsed_data']['email'] == 'john@acme.com'
+        assert body['cached'] is False and body['success'] is True
+        assert elapsed < 5
+
+    with_stub_backends(async_ocr.AsyncStubClient(text=CARD_TEXT, latency=0.3), test)
+
+
+def test_failed_backend_falls_through_and_errors_match_flask():
+    image = card_image()
+
+    async def test():
+        async with client() as http:
+            response = await http.post('/upload', files={'image': ('card.jpg', image, 'image/jpeg')})
+            assert response.json()['ocr_method'] == 'google_vision'
+
+            response = await http.post('/upload', data={'name': 'x'})
+            assert response.status_code == 400
+            assert response.json() == {'error': 'No image file provided'}
+            body = (b'--b\r\nContent-Disposition: form-data; name="image"; filename=""\r\n\r\n'
+                    b'\r\n--b--\r\n')
+            response = await http.post('/upload', content=body,
+                                       headers={'Content-Type': 'multipart/form-data; boundary=b'})
+            assert response.json() == {'error': 'No file selected'}
+
+            assert (await http.get('/test-ocr')).json() == flask_app.TEST_OCR_BODY
+            health = (await http.get('/health')).json()
+            assert health['message'] == 'ASGI server is running'
+            assert (await http.get('/missing')).status_code == 404
+            metrics = (await http.get('/metrics')).text
+            assert 'ocr_request_seconds_count{endpoint="/upload",status="400"}' in metrics
+
+    with_stub_backends(FailingClient(), test)
+
+
+def test_parsing_runs_in_the_request_context():
+    """The parser thread sees the request's log, and the log is dropped once the response is sent"""
+    image = card_image()
+    seen = []
+    extract = async_ocr.extract_business_card_info
+
+    def recording_extract(text):
+        seen.append(ocr_logging.request_log())
+        return extract(text)
+
+    async def test():
+        async with client() as http:
+            response = await http.post('/upload', files={'image': ('card.jpg', image, 'image/jpeg')})
+        assert response.json()['parsed_data']['email'] == 'john@acme.com'
+        assert [log.request_id for log in seen] == [response.headers['x-request-id']]
+        assert ocr_logging.request_log() is ocr_logging.NULL_REQUEST_LOG
+
+    async_ocr.extract_business_card_info = recording_extract
+    try:
+        with_stub_backends(async_ocr.AsyncStubClient(text=CARD_TEXT), test)
+    finally:
+        async_ocr.extract_business_card_info = extract
+
+
+if __name__ == "__main__":
+    test_concurrent_uploads_share_one_loop()
+    test_failed_backend_falls_through_and_errors_match_flask()
+    test_parsing_runs_in_the_request_context()
+    print("All ASGI tests passed")
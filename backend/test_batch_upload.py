@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Tests for the multi-card batch upload endpoint
+"""
+
+import io
+import json
+import struct
+import time
+import zipfile
+
+from werkzeug.datastructures import FileStorage
+
+from batch_upload import BatchError, BatchLimits, collect_images, read_zip
+from ocr_logging import request_log
+
+
+def zip_of(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def fake_process(image_data):
+    if image_data == b'slow':
+        time.sleep(0.3)
+    if image_data == b'bad':
+        raise Exception('unreadable')
+    return {'text': image_data.decode(), 'success': True}
+
+
+def post_batch(client, data):
+    response = client.post('/upload/batch', data=data)
+    return response, [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_batch_streams_each_card_and_summary():
+    """Files and ZIP contents are all processed; slow cards arrive last"""
+    import app
+
+    original = app.process_image
+    app.process_image = fake_process
+    try:
+        client = app.app.test_client()
+        archive = zip_of({'cards/a.jpg': b'zip-a', 'cards/notes.txt': b'skip me', '__MACOSX/._a.jpg': b'x'})
+        response, lines = post_batch(client, {
+            'images': [(io.BytesIO(b'slow'), 'slow.jpg'), (io.BytesIO(b'bad'), 'bad.jpg'),
+                       (archive, 'cards.zip')],
+        })
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+
+        cards, summary = lines[:-1], lines[-1]['summary']
+        assert sorted(card['filename'] for card in cards) == ['bad.jpg', 'cards/a.jpg', 'slow.jpg']
+        assert cards[-1]['filename'] == 'slow.jpg'
+        assert [card for card in cards if card['filename'] == 'bad.jpg'][0]['error'] == 'unreadable'
+        assert summary == {'total': 3, 'succeeded': 2, 'failed': 1}
+    finally:
+        app.process_image = original
+
+
+def test_batch_rejects_empty_and_corrupt_archives():
+    import app
+
+    client = app.app.test_client()
+    assert client.post('/upload/batch', data={}).status_code == 400
+    response = client.post('/upload/batch', data={'images': [(io.BytesIO(b'not a zip'), 'cards.zip')]})
+    assert response.status_code == 400
+    assert 'Invalid ZIP' in response.get_json()['error']
+
+
+def read_until_refused(data, limits):
+    """Names read from a ZIP before read_zip refused it, and the refusal"""
+    read = []
+    try:
+        for name, _ in read_zip(data, limits):
+            read.append(name)
+    except BatchError as e:
+        return read, str(e)
+    raise AssertionError('the archive was not refused')
+
+
+def test_zip_limits_apply_while_decompressing():
+    """Count and bytes are enforced entry by entry, on the bytes actually inflated"""
+    archive = zip_of({f'card{i}.jpg': b'x' * 100 for i in range(10)}).getvalue()
+    read, error = read_until_refused(archive, BatchLimits(max_files=3))
+    assert read == ['card0.jpg', 'card1.jpg', 'card2.jpg'] and 'at most 3 images' in error
+    read, error = read_until_refused(archive, BatchLimits(max_bytes=250))
+    assert len(read) == 2 and 'at most 250 bytes' in error
+
+    # A header claiming 10 bytes for a 5000-byte entry is not taken at its word
+    data = bytearray(zip_of({'big.jpg': b'y' * 5000}).getvalue())
+    for signature, offset in ((b'PK\x03\x04', 22), (b'PK\x01\x02', 24)):
+        at = data.index(signature) + offset
+        data[at:at + 4] = struct.pack('<I', 10)
+    assert read_until_refused(bytes(data), BatchLimits(max_file_bytes=100))[0] == []
+
+
+class CountingStream(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def test_plain_files_are_read_within_the_limits():
+    """An oversized image is refused after one byte past the room left, not read whole"""
+    stream = CountingStream(b'z' * 100000)
+    try:
+        collect_images([FileStorage(stream, 'huge.jpg')], BatchLimits(max_file_bytes=1000))
+        assert False, 'expected BatchError'
+    except BatchError as e:
+        assert 'huge.jpg is larger than 1000 bytes' in str(e)
+    assert stream.bytes_read == 1001
+
+    files = [FileStorage(io.BytesIO(b'a' * 600), 'a.jpg'), FileStorage(CountingStream(b'b' * 600), 'b.jpg')]
+    try:
+        collect_images(files, BatchLimits(max_bytes=1000))
+        assert False, 'expected BatchError'
+    except BatchError as e:
+        assert 'at most 1000 bytes' in str(e)
+    assert files[1].stream.bytes_read == 401
+
+
+def test_batch_cards_report_to_the_request_log():
+    """Backend attempts made by batch cards on the pool threads land in the batch request's summary"""
+    import app
+
+    logs = []
+
+    def recording_process(image_data):
+        log = request_log()
+        log.attempt('tesseract', 'success', 0.01)
+        logs.append(log)
+        return fake_process(image_data)
+
+    original = app.process_image
+    app.process_image = recording_process
+    try:
+        response, lines = post_batch(app.app.test_client(), {
+            'images': [(io.BytesIO(b'a'), 'a.jpg'), (io.BytesIO(b'b'), 'b.jpg')],
+        })
+        assert lines[-1]['summary']['succeeded'] == 2
+        assert [log.request_id for log in logs] == [response.headers['X-Request-ID']] * 2
+        assert len(logs[0].attempts) == 2
+    finally:
+        app.process_image = original
+
+
+if __name__ == "__main__":
+    test_batch_streams_each_card_and_summary()
+    test_batch_rejects_empty_and_corrupt_archives()
+    test_zip_limits_apply_while_decompressing()
+    test_plain_files_are_read_within_the_limits()
+    test_batch_cards_report_to_the_request_log()
+    print("All batch upload tests passed")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests for the columnar parsed-card batch
+"""
+
+import io
+import pickle
+
+from card_batch import CardBatch
+from card_corpus import generate_cards
+from card_parser import RESULT_FIELDS, parse_batch
+
+
+def test_batch_rows_match_parsed_dicts():
+    texts = [card['text'] for card in generate_cards(300, seed=9)] + ['']
+    dicts = parse_batch(texts)
+    batch = parse_batch(texts, CardBatch())
+
+    assert len(batch) == len(dicts)
+    for row, info in zip(batch, dicts):
+        assert dict(row) == {field: info[field] for field in RESULT_FIELDS}
+    assert batch[-1]['name'] == '' and batch[0]['email'] == dicts[0]['email']
+    assert batch.column('company') == [info['company'] for info in dicts]
+    # Repeated companies and titles are stored once
+    assert len(batch.columns['title'].values) < 50
+
+
+def test_batch_file_round_trip():
+    batch = CardBatch(RESULT_FIELDS + ('ocr_method',))
+    batch.append({'name': 'Zoë Müller', 'company': 'Acme GmbH', 'ocr_method': 'amazon_textract'})
+    batch.append({'name': 'Jane Doe', 'company': 'Acme GmbH', 'email': 'jane@acme.com', 'ocr_method': 'tesseract'})
+
+    buffer = io.BytesIO()
+    batch.write(buffer)
+    loaded = CardBatch.read(io.BytesIO(buffer.getvalue()))
+    assert loaded.fields == batch.fields
+    assert [dict(row) for row in loaded] == [dict(row) for row in batch]
+
+    # A loaded batch can still grow, and batches cross process boundaries
+    loaded.append({'name': 'Li Wei'})
+    assert loaded[2]['name'] == 'Li Wei' and loaded[0]['name'] == 'Zoë Müller'
+    assert [dict(row) for row in pickle.loads(pickle.dumps(batch))] == [dict(row) for row in batch]
+
+    try:
+        CardBatch.read(io.BytesIO(buffer.getvalue()[:-4]))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('a damaged file should be rejected')
+
+
+if __name__ == "__main__":
+    test_batch_rows_match_parsed_dicts()
+    test_batch_file_round_trip()
+    print("All card batch tests passed")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for the synthetic card corpus and the parser benchmark's regression check
+"""
+
+import io
+
+from PIL import Image
+
+from bench_parser import accuracy, compare
+from card_corpus import LOCALES, STYLES, field_matches, generate_cards, render_card
+
+
+def test_corpus_is_reproducible_and_varied():
+    cards = generate_cards(300, seed=7)
+    assert [card['text'] for card in cards] == [card['text'] for card in generate_cards(300, seed=7)]
+    assert {card['locale'] for card in cards} == set(LOCALES)
+    assert {card['layout'] for card in cards} == {'classic', 'company_first', 'labelled', 'minimal'}
+    noisy = generate_cards(300, seed=7, noise=0.05)
+    assert [card['truth'] for card in noisy] == [card['truth'] for card in cards]
+    assert sum(a['text'] != b['text'] for a, b in zip(noisy, cards)) > 200
+    # Typesetting is drawn apart from the text, so the styles used leave the text alone
+    uniform = generate_cards(300, seed=7, styles=('uniform',))
+    assert [card['text'] for card in uniform] == [card['text'] for card in cards]
+    assert {card['style'] for card in cards} == set(STYLES)
+    assert all(scale == 1.0 for card in uniform for scale in card['scales'])
+
+
+def test_rendered_card_is_a_card_sized_jpeg():
+    image = Image.open(io.BytesIO(render_card(generate_cards(1, seed=3)[0])))
+    assert image.format == 'JPEG' and image.size == (1050, 600)
+
+
+def test_clean_us_cards_parse_exactly():
+    """Ground truth follows the parser's conventions for the formats it supports"""
+    result = accuracy(generate_cards(200, seed=11, locales=('us',)))
+    assert result['overall'] == {field: 1.0 for field in result['overall']}
+    assert field_matches('phone', '+1 (555) 123-4567', '(555) 123-4567')
+    assert field_matches('website', 'www.acme.com', 'https://acme.com/')
+
+
+def test_compare_flags_regressions():
+    config = {'cards': 100, 'seed': 1, 'noise': [0.0], 'upload_cards': 10, 'upload_latency_ms': 0.0}
+    baseline = {
+        'config': config,
+        'parser': {'cards_per_second': 1000.0},
+        'accuracy': {'0.0': {'overall': {'name': 0.9, 'email': 1.0}}},
+        'upload': {'p95_ms': 10.0},
+    }
+    same = {**baseline, 'config': dict(config)}
+    assert compare(same, baseline, 0.3, 0.01, 0.5) == []
+
+    worse = {
+        'config': dict(config),
+        'parser': {'cards_per_second': 500.0},
+        'accuracy': {'0.0': {'overall': {'name': 0.85, 'email': 1.0}}},
+        'upload': {'p95_ms': 20.0},
+    }
+    problems = compare(worse, baseline, 0.3, 0.01, 0.5)
+    assert len(problems) == 3
+    assert any('name accuracy' in problem for problem in problems)
+
+
+if __name__ == "__main__":
+    test_corpus_is_reproducible_and_varied()
+    test_rendered_card_is_a_card_sized_jpeg()
+    test_clean_us_cards_parse_exactly()
+    test_compare_flags_regressions()
+    print("All card corpus tests passed")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Tests for the duplicate-contact index
+"""
+
+from card_corpus import generate_cards
+from card_dedup import DedupIndex, fingerprint, normalize_email, normalize_phone
+from card_parser import EXTRACTOR
+
+
+def test_keys_are_normalized():
+    us = {normalize_phone(phone) for phone in ('(212) 555-0147', '212-555-0147', '+1 212 555 0147',
+                                               '1 212 555 0147', '212.555.0147 ext. 3')}
+    assert us == {'+12125550147'}
+    assert normalize_phone('020 7946 0958', '44') == normalize_phone('+44 20 7946 0958') == '+442079460958'
+    assert normalize_phone('0049 30 1234567') == '+49301234567'
+    assert normalize_phone('555-01') == ''
+    assert normalize_email(' <Jane.Doe@Acme.COM>. ') == 'jane.doe@acme.com'
+    assert normalize_email('jane.doe@acme') == ''
+
+    # A .co.uk email says which country a local number is in
+    keys = fingerprint({'name': 'Ian Clarke', 'email': 'ian@harbor.co.uk', 'phone': '020 7946 0958'})[0]
+    assert 'phone:+442079460958' in keys
+    # Word order, case, accents and legal suffixes do not change the blocking key
+    assert (fingerprint({'name': 'Müller Anna', 'company': 'Lumen GmbH'})[0] ==
+            fingerprint({'name': 'anna muller', 'company': 'LUMEN'})[0])
+
+
+def test_noisy_rescans_are_found():
+    cards = generate_cards(300, seed=11)
+    rescans = generate_cards(300, seed=11, noise=0.05)
+    index = DedupIndex(':memory:')
+    index.rebuild([[dict(card['truth'], id=entry_id) for entry_id, card in enumerate(cards)]])
+    assert index.count() == 300
+
+    found = wrong = 0
+    for entry_id, card in enumerate(rescans):
+        matches = index.check(EXTRACTOR.parse(card['text']))
+        found += any(match['id'] == entry_id for match in matches)
+        wrong += any(match['id'] != entry_id for match in matches)
+    assert found >= 280, found
+    assert wrong <= 15, wrong
+
+    # Different people at the same company are not duplicates
+    assert index.check({'name': 'Zed Nobody', 'company': cards[0]['truth']['company']}) == []
+
+
+def test_add_replaces_and_rebuild_drops_stale_entries():
+    index = DedupIndex(':memory:')
+    assert index.add(1, {'name': 'Jane Doe', 'company': 'Acme, Inc.', 'phone': '(212) 555-0147'}) == []
+    matches = index.add(2, {'name': 'Jane Doe', 'company': 'Acme', 'email': 'jane@acme.com'})
+    assert [match['id'] for match in matches] == [1] and matches[0]['score'] == 1.0
+
+    # A shared switchboard number alone is not a match; with the same name it is
+    assert index.check({'name': 'Bob Stone', 'phone': '212 555 0147'}) == []
+    assert index.check({'name': 'Jane Do', 'phone': '212 555 0147'})[0]['reasons'][:1] == ['phone']
+
+    # Editing an entry replaces its keys
+    index.add(2, {'name': 'John Roe', 'company': 'Globex', 'email': 'john@globex.com'})
+    assert index.check({'email': 'jane@acme.com'}) == []
+    assert [match['id'] for match in index.check({'email': 'JOHN@globex.com'})] == [2]
+
+    assert index.remove(1) and not index.remove(1)
+    index.add(3, {'name': 'Jane Doe', 'company': 'Acme'})
+    assert index.rebuild([[{'id': 2, 'name': 'John Roe', 'company': 'Globex', 'email': 'john@globex.com'}]]) == 1
+    assert index.count() == 1
+    assert index.check({'name': 'Jane Doe', 'company': 'Acme'}) == []
+
+
+def test_common_names_need_agreeing_contacts():
+    """Same name and no company is not a match when the email and phone differ"""
+    index = DedupIndex(':memory:')
+    index.add(1, {'name': 'John Smith', 'email': 'jsmith@northwind.com', 'phone': '(212) 555-0147'})
+    assert 'name_company' not in ' '.join(fingerprint({'name': 'John Smith'})[0])
+    assert index.check({'name': 'John Smith', 'email': 'john.smith@bluepeak.io', 'phone': '(415) 555-0199'}) == []
+
+    # One differing contact (a new job) still leaves a likely match, flagged as such
+    matches = index.check({'name': 'John Smith', 'email': 'john.smith@bluepeak.io', 'phone': '212-555-0147'})
+    assert [match['id'] for match in matches] == [1] and matches[0]['score'] < 1.0
+    assert 'email_differs' in matches[0]['reasons']
+    # An OCR slip in the email or a digit of the phone is not a conflict
+    matches = index.check({'name': 'John Smith', 'email': 'jsmlth@northwind.com', 'phone': '212-555-0141'})
+    assert matches[0]['score'] == 1.0
+
+
+if __name__ == "__main__":
+    test_keys_are_normalized()
+    test_noisy_rescans_are_found()
+    test_add_replaces_and_rebuild_drops_stale_entries()
+    test_common_names_need_agreeing_contacts()
+    print("All duplicate index tests passed")
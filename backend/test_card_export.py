@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming card export (SQLite stands in for PostgreSQL)
+"""
+
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+
+import card_export
+from card_export import CsvFormat, VcardFormat, fold, iter_chunks, open_source, stream_export
+
+SQLITE_SCHEMA = """
+CREATE TABLE business_card_entries (
+    id INTEGER PRIMARY KEY, user_name TEXT NOT NULL, ocr_text TEXT NOT NULL, ocr_method TEXT NOT NULL,
+    parsing_method TEXT NOT NULL, name TEXT, title TEXT, company TEXT, email TEXT, phone TEXT, website TEXT,
+    address TEXT, user_comment TEXT, ocr_success BOOLEAN DEFAULT 1, parsing_success BOOLEAN DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_business_card_user_name ON business_card_entries (user_name);
+CREATE INDEX idx_business_card_created_at ON business_card_entries (created_at);
+CREATE INDEX idx_business_card_company ON business_card_entries (company);
+"""
+
+
+def make_database(rows=250):
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    conn = sqlite3.connect(path)
+    conn.executescript(SQLITE_SCHEMA)
+    conn.executemany(
+        'INSERT INTO business_card_entries (user_name, ocr_text, ocr_method, parsing_method, name, title, company, '
+        'email, phone, website, address, user_comment, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [(f'user{i % 3}', 'text', 'amazon_textract', 'rule_based', f'Person {i}', 'CEO',
+          'Acme, Inc.' if i % 2 else 'Globex', f'p{i}@acme.com', '+1 (555) 123-4567', 'www.acme.com',
+          '1 Main St\nSpringfield', None, f'2025-01-{1 + i % 28:02d} 12:00:00') for i in range(rows)]
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_export_streams_in_chunks_with_filters():
+    path = make_database()
+    try:
+        chunks = list(iter_chunks(open_source(path), {}, chunk_rows=40))
+        assert [len(chunk) for chunk in chunks] == [40] * 6 + [10]
+
+        filters = card_export.filters_from_args({'user_name': 'user1', 'company': 'Acme, Inc.',
+                                                 'created_from': '2025-01-10', 'created_to': '2025-01-20'})
+        body = ''.join(stream_export(open_source(path), CsvFormat(), filters, chunk_rows=7))
+        records = list(csv.DictReader(io.StringIO(body)))
+        assert records and all(record['user_name'] == 'user1' and record['company'] == 'Acme, Inc.' and
+                               '2025-01-10' <= record['created_at'] < '2025-01-20' for record in records)
+        assert [int(record['id']) for record in records] == sorted(int(record['id']) for record in records)
+    finally:
+        os.unlink(path)
+
+
+def test_vcard_output_is_escaped_and_folded():
+    row = dict.fromkeys(card_export.EXPORT_COLUMNS, None)
+    row.update(name='Zoë Müller', company='Acme, Inc.', phone='+1 (555) 123-4567', email='zoe@acme.com',
+               website='www.acme.com', address='1 Main St\nSpringfield', user_comment='x' * 100)
+    card = VcardFormat().card(row)
+    lines = card.split('\r\n')
+    assert lines[:3] == ['BEGIN:VCARD', 'VERSION:4.0', 'FN:Zoë Müller']
+    assert 'ORG:Acme\\, Inc.' in lines
+    assert 'TEL;VALUE=uri;TYPE=work:tel:+15551234567' in lines
+    assert 'URL:https://www.acme.com' in lines
+    assert any(line.startswith('ADR;TYPE=work;LABEL="1 Main St\\nSpringfield":;;1 Main St\\nSpringfield')
+               for line in lines)
+    assert all(len(line.encode('utf-8')) <= 75 for line in lines)
+    assert card.endswith('END:VCARD\r\n')
+    assert fold('é' * 50).replace('\r\n ', '').rstrip('\r\n') == 'é' * 50
+
+
+def test_export_endpoint():
+    import app
+
+    path = make_database(30)
+    saved = card_export.EXPORT_DATABASE_URL
+    card_export.EXPORT_DATABASE_URL = path
+    try:
+        client = app.app.test_client()
+        response = client.get('/export?format=jsonl&user_name=user2')
+        assert response.status_code == 200
+        assert response.headers['Content-Disposition'] == 'attachment; filename="business_cards.jsonl"'
+        records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert len(records) == 10 and {record['user_name'] for record in records} == {'user2'}
+
+        response = client.get('/export?format=vcard')
+        assert response.get_data(as_text=True).count('BEGIN:VCARD') == 30
+
+        assert client.get('/export?format=xml').status_code == 400
+        assert client.get('/export?created_from=yesterday').status_code == 400
+        card_export.EXPORT_DATABASE_URL = path + '.missing'
+        assert client.get('/export').status_code == 500
+    finally:
+        card_export.EXPORT_DATABASE_URL = saved
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    test_export_streams_in_chunks_with_filters()
+    test_vcard_output_is_escaped_and_folded()
+    test_export_endpoint()
+    print("All export tests passed")
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Tests for the precompiled business card extractor
+"""
+
+import io
+import json
+import math
+import sys
+import threading
+import time
+
+import bench_regex
+from card_parser import EXTRACTOR, CardExtractor, KeywordMatcher, TITLE, COMPANY, ADDRESS, parse_batch
+from ocr_layout import OcrLine, OcrText
+from reparse import reparse
+
+STANDARD_CARD = """
+John Smith
+Senior Software Engineer
+TechCorp Solutions Inc
+john.smith@techcorp.com
+(555) 123-4567
+www.techcorp.com
+123 Technology Lane
+Silicon Valley, CA 94105
+"""
+
+OCR_ERROR_CARD = """
+Jane D0e
+Marketing Manager
+Innovate LLC
+jane@inn0vate.c0m
+555-987-6543
+inn0vate.com
+456 Business St, Suite 200
+New York, NY 10001
+"""
+
+
+def test_standard_card():
+    """All fields are extracted from a well-formed card"""
+    info = EXTRACTOR.parse(STANDARD_CARD)
+    confidence = info.pop('confidence')
+    assert info == {
+        'name': 'John Smith',
+        'company': 'TechCorp Solutions Inc',
+        'title': 'Senior Software Engineer',
+        'phone': '(555) 123-4567',
+        'email': 'john.smith@techcorp.com',
+        'website': 'www.techcorp.com',
+        'address': '123 Technology Lane, Silicon Valley, CA 94105',
+        'raw_text': STANDARD_CARD
+    }
+    assert confidence == {'name': 0.75, 'company': 0.85, 'title': 0.8, 'phone': 0.9, 'email': 0.95,
+                          'website': 0.9, 'address': 0.85}
+
+
+def test_ocr_error_card():
+    """Digits substituted for letters do not stop extraction"""
+    info = EXTRACTOR.parse(OCR_ERROR_CARD)
+    assert info['name'] == 'Jane D0e'
+    assert info['email'] == 'jane@inn0vate.c0m'
+    assert info['website'] == 'www.inn0vate.com'
+    assert info['address'] == '456 Business St, Suite 200, New York, NY 10001'
+
+
+def test_empty_text():
+    """Blank input returns the empty result structure"""
+    info = EXTRACTOR.parse('  \n ')
+    assert info['raw_text'] == '  \n '
+    assert all(info[field] == '' for field in ('name', 'company', 'title', 'address'))
+
+
+def test_confidence_uses_pattern_and_ocr_confidence():
+    """Weak patterns, digits in a name and unsure OCR lines all lower a field's confidence"""
+    confidence = EXTRACTOR.parse(OCR_ERROR_CARD)['confidence']
+    assert confidence['name'] == 0.45
+    assert confidence['phone'] == 0.9
+    assert confidence['website'] == 0.6
+
+    lines = [OcrLine('John Smith', confidence=0.5), OcrLine('john@acme.com', confidence=0.9)]
+    confidence = EXTRACTOR.parse(OcrText('John Smith\njohn@acme.com', lines))['confidence']
+    assert confidence['name'] == 0.38
+    assert confidence['email'] == 0.85
+    assert confidence['address'] == 0.0
+
+
+def test_confident_required_fields_skip_fallback_guesses():
+    """Leftover lines become company and address guesses only while a required field is unsure"""
+    card = 'Jane Doe\njane@acme.com\n555-987-6543\nLeftover Line Words\n'
+    guessing = CardExtractor(required_fields=('name', 'email', 'company'))
+    info = guessing.parse(card)
+    assert info['company'] == 'Leftover Line Words'
+    assert info['confidence']['company'] == 0.35
+
+    exiting = CardExtractor(required_fields=('name', 'email', 'phone'))
+    info = exiting.parse(card)
+    assert info['company'] == info['address'] == ''
+    assert info['name'] == 'Jane Doe' and info['phone'] == '555-987-6543'
+
+    boxed = OcrText(card, [OcrLine(line, 0.1, 0.1 * i, 0.5, 0.05, 0.95) for i, line in enumerate(card.splitlines())])
+    assert exiting.parse(boxed)['company'] == ''
+    assert guessing.parse(boxed)['company'] != ''
+
+
+def test_early_exit_skips_only_the_address_guess_by_default():
+    """Company is required by default, so a confident card never needed the company guess"""
+    card = 'Jane Doe\nAcme Corp\njane@acme.com\n555-987-6543\nLeftover Line Words\n'
+    info = CardExtractor().parse(card)
+    assert info['company'] == 'Acme Corp' and info['address'] == ''
+    assert CardExtractor(early_exit_confidence=2).parse(card)['address'] == 'Leftover Line Words'
+    # Without a confident company there is no early exit and the guess is made
+    info = CardExtractor().parse(card.replace('Acme Corp\n', ''))
+    assert info['company'] == 'Leftover Line Words'
+
+
+def test_keyword_matcher_overlapping_groups():
+    """Keywords that prefix each other report every group they belong to"""
+    matcher = KeywordMatcher([
+        (TITLE, ['Partner']),
+        (COMPANY, ['Partners']),
+        (ADDRESS, ['st']),
+    ])
+    assert matcher.scan('partners') == TITLE | COMPANY
+    assert matcher.scan('partner st') == TITLE | ADDRESS
+    assert matcher.scan('nothing here') == 0
+
+
+def test_parse_batch_matches_single_parse():
+    """Batch parsing returns the same dicts as parsing one card at a time"""
+    texts = [STANDARD_CARD, OCR_ERROR_CARD, '']
+    assert parse_batch(texts) == [EXTRACTOR.parse(text) for text in texts]
+
+
+def test_reparse_streams_jsonl():
+    """The re-parse tool writes one record per input row, in order"""
+    rows = [{'id': i, 'ocr_text': text} for i, text in enumerate([STANDARD_CARD, OCR_ERROR_CARD] * 3)]
+    input_stream = io.StringIO(''.join(json.dumps(row) + '\n' for row in rows))
+    output_stream = io.StringIO()
+
+    cards, _ = reparse(input_stream, output_stream, workers=1, chunk_size=4, log=None)
+
+    records = [json.loads(line) for line in output_stream.getvalue().splitlines()]
+    assert cards == len(rows)
+    assert [record['id'] for record in records] == [row['id'] for row in rows]
+    assert records[1]['email'] == 'jane@inn0vate.c0m'
+    assert 'raw_text' not in records[0]
+
+
+def test_adversarial_lines_parse_in_linear_time():
+    """Runs that used to backtrack quadratically stay fast with the limits turned off"""
+    unbounded = CardExtractor(max_text_length=math.inf, max_line_length=math.inf, time_budget=math.inf)
+    for build in bench_regex.FAMILIES.values():
+        start = time.perf_counter()
+        unbounded.parse(build(20000))
+        # Quadratic patterns took seconds at this size
+        assert time.perf_counter() - start < 0.5
+    assert unbounded.parse('x' * 5000 + ' ops@acme.com')['email'] == 'ops@acme.com'
+    assert unbounded.parse('a-' * 5000 + ' acme.io')['website'] == 'www.acme.io'
+
+
+def test_length_caps_and_time_budget():
+    capped = CardExtractor(max_text_length=40, max_line_length=12)
+    result = capped.parse('Jane Doe\n' + 'Chief Executive Officer\n' + 'jane@acme.com\n')
+    assert result['title'] == 'Chief Execut'
+    assert result['email'] == ''
+    assert len(capped.clean_lines('a' * 100)[0]) == 12
+
+    # No time left after the first line: the rest of the card is not classified
+    out_of_time = CardExtractor(time_budget=-1)
+    result = out_of_time.parse(STANDARD_CARD)
+    assert result['name'] == 'John Smith'
+    assert result['email'] == result['phone'] == result['title'] == ''
+
+
+def test_time_budget_ignores_competing_threads():
+    """Waiting for the GIL behind busy threads does not use up a card's budget"""
+    extractor = CardExtractor()
+    expected = extractor.parse(STANDARD_CARD)
+    scan = extractor.keywords.scan
+
+    def yielding_scan(line):
+        # Hand the GIL to the busy threads on every line and wait to get it back
+        time.sleep(0)
+        return scan(line)
+
+    extractor.keywords.scan = yielding_scan
+    stop = threading.Event()
+
+    def spin():
+        while not stop.is_set():
+            sum(range(1000))
+
+    threads = [threading.Thread(target=spin) for _ in range(16)]
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(0.001)
+    for thread in threads:
+        thread.start()
+    try:
+        start = time.perf_counter()
+        results = [extractor.parse(STANDARD_CARD) for _ in range(3)]
+        waited = time.perf_counter() - start
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        sys.setswitchinterval(switch_interval)
+    # Each parse waited longer than the whole budget, yet every card was read to the end
+    assert waited > 3 * extractor.time_budget
+    assert all(result == expected for result in results)
+
+
+if __name__ == "__main__":
+    test_standard_card()
+    test_ocr_error_card()
+    test_empty_text()
+    test_confidence_uses_pattern_and_ocr_confidence()
+    test_confident_required_fields_skip_fallback_guesses()
+    test_early_exit_skips_only_the_address_guess_by_default()
+    test_keyword_matcher_overlapping_groups()
+    test_parse_batch_matches_single_parse()
+    test_reparse_streams_jsonl()
+    test_adversarial_lines_parse_in_linear_time()
+    test_length_caps_and_time_budget()
+    test_time_budget_ignores_competing_threads()
+    print("All card parser tests passed")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Tests for the trigram search index
+"""
+
+import math
+import os
+import random
+import tempfile
+
+import card_search
+from card_corpus import generate_cards
+from card_search import ChangeFeed, SearchIndex, document_text, trigram_pairs, trigram_set
+
+
+def corpus_records(count, seed, first_id=0):
+    return [{'id': first_id + offset, 'user_name': f'user{offset % 3}', 'name': card['truth']['name'],
+             'company': card['truth']['company'], 'title': card['truth']['title'], 'ocr_text': card['text']}
+            for offset, card in enumerate(generate_cards(count, seed=seed, noise=0.03))]
+
+
+def test_fuzzy_query_ranks_parsed_fields_first():
+    index = SearchIndex()
+    index.add(1, {'name': 'Jane Doe', 'company': 'Innovate Labs', 'title': 'CTO', 'user_name': 'ann',
+                  'ocr_text': 'Jane Doe\nCTO\nInnovate Labs\njane@innovatelabs.io'})
+    index.add(2, {'name': 'John Roe', 'company': 'Globex', 'title': 'CEO', 'user_name': 'bob',
+                  'ocr_text': 'John Roe\nGlobex\n12 Innovation Way'})
+    index.add(3, {'name': 'Ana Lima', 'company': 'Cedar', 'title': 'CFO', 'user_name': 'ann',
+                  'ocr_text': 'Ana Lima\nCedar'})
+
+    results = index.search('inn0vate')
+    assert [result['id'] for result in results] == [1, 2]
+    assert results[0]['company'] == 'Innovate Labs' and results[0]['score'] == 1.0
+    assert [result['id'] for result in index.search('inn0vate', user_name='bob')] == [2]
+    assert index.search('inn0vate', user_name='nobody') == []
+    assert index.search('  ') == []
+
+
+def build(rng, index, live, batches=12):
+    """Add cards one at a time and in batches, editing and deleting a few after each"""
+    next_id = 0
+    for _ in range(batches):
+        count = rng.choice([1, 5, 300, card_search.PENDING_DOCS + 10])
+        records = corpus_records(count, seed=next_id, first_id=next_id)
+        if count == 1:
+            index.add(records[0]['id'], records[0])
+        else:
+            index.add_many(records)
+        live.update((record['id'], record) for record in records)
+        next_id += count
+        for entry_id in rng.sample(sorted(live), 3):
+            if rng.random() < 0.5:
+                assert index.remove(entry_id)
+                del live[entry_id]
+            else:
+                edited = dict(live[entry_id], company='Zephyr Dynamics', ocr_text='Zephyr Dynamics')
+                index.add(entry_id, edited)
+                live[entry_id] = edited
+
+
+def test_segments_match_a_full_scan():
+    """Single adds, batches, merges, edits and deletes give what scanning every card gives"""
+    index = SearchIndex()
+    live = {}
+    merge_factor, card_search.MERGE_FACTOR = card_search.MERGE_FACTOR, 3
+    try:
+        build(random.Random(4), index, live)
+    finally:
+        card_search.MERGE_FACTOR = merge_factor
+    assert len(index) == len(live)
+    assert len(index.segments) < 3
+
+    for query in ('Zephyr', 'Stcfan Weber', 'Bluepeak', 'S0ftware Engineer', 'berlin'):
+        codes = trigram_set(query)
+        need = max(1, math.ceil(len(codes) * index.min_similarity))
+        expected = {entry_id for entry_id, record in live.items()
+                    if len(trigram_set(document_text(record)) & codes) >= need}
+        found = {result['id'] for result in index.search(query, limit=len(live))}
+        assert found == expected, query
+
+
+def card(entry_id, name):
+    return {'id': entry_id, 'user_name': 'ann', 'name': name, 'company': '', 'title': '', 'ocr_text': name}
+
+
+def test_live_changes_win_over_rows_loaded_later():
+    """An entry edited or deleted while the stored rows load keeps its live version"""
+    index = SearchIndex()
+    index.loading = True
+    index.add(5, card(5, 'Marisol Quintero'))
+    index.add(9, card(9, 'Octavia Brennan'))
+    assert index.remove(7)
+    index.load([[card(entry_id, f'Stored Person{entry_id}') for entry_id in range(1, 9)],
+                [card(5, 'Stored Person5')]])
+
+    assert [result['id'] for result in index.search('Marisol Quintero')] == [5]
+    assert {result['id'] for result in index.search('Stored Person', limit=20)} == {1, 2, 3, 4, 6, 8}
+    assert [result['id'] for result in index.search('Octavia Brennan')] == [9]
+    assert len(index) == 8 and not index.loading
+    # Only the edited entry is out of id order; the loaded rows are not
+    assert list(index.moved) == [5]
+
+
+def test_changes_reach_every_worker_through_the_feed():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'feed.db')
+        first, second = SearchIndex(feed=ChangeFeed(path)), SearchIndex(feed=ChangeFeed(path))
+        first.add(1, card(1, 'Marisol Quintero'))
+        assert [result['id'] for result in second.search('Marisol')] == [1]
+        second.add(1, card(1, 'Octavia Brennan'))
+        assert first.search('Marisol') == []
+        assert first.remove(1)
+        assert second.search('Octavia') == [] and len(second) == 0
+        assert not second.remove(1)
+
+
+def test_vectorized_trigrams_match_per_text_trigrams():
+    texts = ['Jürgen Müller\nACME GmbH', '', 'x', 'inn0vate, inc.', 'a b  c']
+    docs, codes = trigram_pairs(texts)
+    for number, text in enumerate(texts):
+        assert set(codes[docs == number].tolist()) == trigram_set(text)
+
+
+if __name__ == "__main__":
+    test_fuzzy_query_ranks_parsed_fields_first()
+    test_segments_match_a_full_scan()
+    test_live_changes_win_over_rows_loaded_later()
+    test_changes_reach_every_worker_through_the_feed()
+    test_vectorized_trigrams_match_per_text_trigrams()
+    print("All search index tests passed")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for the OCR backend circuit breaker and fallback chain
+"""
+
+import ocr_backends
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_and_recovers_through_probe():
+    """Errors open the breaker, a successful half-open probe closes it"""
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', window=4, min_calls=4, error_rate=0.5, open_seconds=10, clock=clock)
+    for _ in range(4):
+        assert breaker.allow_request()
+        breaker.record_failure(0.1)
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+    clock.now = 11
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request()  # only one probe at a time
+    breaker.record_success(0.05)
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()['times_opened'] == 1
+
+
+def test_failed_probe_reopens_and_slow_calls_count():
+    """A failing probe re-opens the breaker; calls over the slow threshold count as failures"""
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', window=2, min_calls=2, error_rate=1.0,
+                             open_seconds=5, slow_call_seconds=1.0, clock=clock)
+    breaker.record_success(2.0)
+    breaker.record_success(3.0)
+    assert breaker.state == OPEN
+
+    clock.now = 6
+    assert breaker.allow_request()
+    breaker.record_failure(0.1)
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+
+def test_chain_skips_backend_with_open_breaker():
+    """An open breaker means the backend is not called at all"""
+    calls = []
+
+    def failing(image_data):
+        calls.append('primary')
+        raise Exception('down')
+
+    def working(image_data):
+        calls.append('secondary')
+        return 'Jane Doe'
+
+    original_backends, original_breakers = ocr_backends.BACKENDS, ocr_backends.BREAKERS
+    ocr_backends.BACKENDS = {'amazon_textract': failing, 'google_vision': working}
+    ocr_backends.BREAKERS = {
+        'amazon_textract': CircuitBreaker('amazon_textract', window=2, min_calls=2),
+        'google_vision': CircuitBreaker('google_vision'),
+    }
+    try:
+        order = ['amazon_textract', 'google_vision']
+        for _ in range(3):
+            assert ocr_backends.run_ocr_chain(b'card', order) == ('Jane Doe', 'google_vision')
+        assert calls == ['primary', 'secondary', 'primary', 'secondary', 'secondary']
+        assert ocr_backends.BREAKERS['amazon_textract'].snapshot()['state'] == OPEN
+    finally:
+        ocr_backends.BACKENDS, ocr_backends.BREAKERS = original_backends, original_breakers
+
+
+if __name__ == "__main__":
+    test_breaker_opens_and_recovers_through_probe()
+    test_failed_probe_reopens_and_slow_calls_count()
+    test_chain_skips_backend_with_open_breaker()
+    print("All circuit breaker tests passed")
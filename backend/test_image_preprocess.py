@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for Tesseract preprocessing and OCR upload normalization
+"""
+
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from image_preprocess import NormalizedUpload, preprocess_with_numpy
+
+
+def card_photo(width, height, background=(180, 170, 160)):
+    image = Image.new('RGB', (width, height), background)
+    ImageDraw.Draw(image).rectangle([width // 4, height // 3, width // 2, height // 2], fill=(20, 20, 20))
+    return image
+
+
+def test_output_is_binary_and_downscaled():
+    """Large photos come out as black and white at the target card resolution"""
+    output = preprocess_with_numpy(card_photo(4000, 3000), target_dpi=300)
+    assert output.mode == 'L'
+    assert max(output.size) == 1050
+    assert set(np.unique(np.asarray(output))) <= {0, 255}
+
+
+def test_small_images_are_not_upscaled():
+    output = preprocess_with_numpy(card_photo(600, 400), target_dpi=300)
+    assert output.size == (600, 400)
+
+
+def test_dark_text_survives_uneven_lighting():
+    """Ink stays black and paper stays white even with a lighting gradient"""
+    width, height = 800, 400
+    ramp = np.linspace(120, 240, width, dtype=np.float32)
+    pixels = np.tile(ramp, (height, 1)).astype(np.uint8)
+    pixels[180:220, 100:700] = (ramp[100:700] * 0.3).astype(np.uint8)  # a line of "text"
+    output = np.asarray(preprocess_with_numpy(Image.fromarray(pixels).convert('RGB')))
+
+    assert (output[190:210, 120:680] == 0).mean() > 0.9
+    assert (output[20:60, :] == 255).mean() > 0.9
+
+
+def jpeg_bytes(image, **save_args):
+    buffer = io.BytesIO()
+    save_args.setdefault('quality', 95)
+    image.save(buffer, format='JPEG', **save_args)
+    return buffer.getvalue()
+
+
+def test_upload_downscaled_per_backend():
+    """Each backend gets a JPEG no larger than its own long edge"""
+    rng = np.random.default_rng(0)
+    photo = Image.fromarray(rng.integers(0, 255, size=(3000, 4000, 3), dtype=np.uint8))
+    upload = NormalizedUpload(jpeg_bytes(photo), {'amazon_textract': 2000, 'google_vision': 1000})
+
+    textract = Image.open(io.BytesIO(upload.for_backend('amazon_textract')))
+    vision = Image.open(io.BytesIO(upload.for_backend('google_vision')))
+    assert max(textract.size) == 2000
+    assert max(vision.size) == 1000
+    # Savings are those of the answering backend's payload, counted once however often it is sent
+    saved = len(upload.original) - len(upload.for_backend('google_vision'))
+    assert saved > 0 and upload.bytes_saved('google_vision') == saved
+    assert upload.bytes_saved('amazon_textract') < saved
+    assert upload.for_backend('tesseract') == upload.original  # no size configured
+    assert upload.bytes_saved('tesseract') == 0
+
+
+def test_upload_applies_exif_orientation():
+    """A portrait photo stored sideways with an EXIF rotation arrives upright"""
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 degrees clockwise on display
+    stored = card_photo(1200, 800)
+    upload = NormalizedUpload(jpeg_bytes(stored, exif=exif), {'amazon_textract': 600})
+
+    normalized = Image.open(io.BytesIO(upload.for_backend('amazon_textract')))
+    assert normalized.size == (400, 600)
+
+
+def test_rotated_upload_is_sent_rotated_even_when_larger():
+    """A small, heavily compressed sideways photo re-encodes larger but must still arrive upright"""
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    rng = np.random.default_rng(1)
+    photo = Image.fromarray(rng.integers(0, 255, size=(200, 300, 3), dtype=np.uint8))
+    original = jpeg_bytes(photo, exif=exif, quality=10)
+    upload = NormalizedUpload(original, {'amazon_textract': 2000}, jpeg_quality=95)
+
+    data = upload.for_backend('amazon_textract')
+    assert len(data) > len(original)
+    assert Image.open(io.BytesIO(data)).size == (200, 300)
+    assert upload.bytes_saved('amazon_textract') < 0
+
+
+def test_undecodable_upload_passes_through():
+    upload = NormalizedUpload(b'not an image', {'amazon_textract': 2000})
+    assert upload.for_backend('amazon_textract') == b'not an image'
+    assert upload.bytes_saved('amazon_textract') == 0
+
+
+if __name__ == "__main__":
+    test_output_is_binary_and_downscaled()
+    test_small_images_are_not_upscaled()
+    test_dark_text_survives_uneven_lighting()
+    test_upload_downscaled_per_backend()
+    test_upload_applies_exif_orientation()
+    test_rotated_upload_is_sent_rotated_even_when_larger()
+    test_undecodable_upload_passes_through()
+    print("All image preprocessing tests passed")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for the latency histograms and the /metrics endpoint
+"""
+
+import io
+
+from PIL import Image
+
+import ocr_backends
+from circuit_breaker import CircuitBreaker
+from metrics import BACKEND_SECONDS, FALLBACKS, PARSE_SECONDS, Counter, Histogram, render
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('test_latency_seconds', 'Test latency', buckets=(0.1, 1.0), labelnames=('stage',))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, stage='parse')
+    counter = Counter('test_events', 'Test events', labelnames=('kind',))
+    counter.inc(kind='a "quoted" kind')
+
+    text = render()
+    assert '# TYPE test_latency_seconds histogram' in text
+    assert 'test_latency_seconds_bucket{stage="parse",le="0.1"} 2' in text
+    assert 'test_latency_seconds_bucket{stage="parse",le="1.0"} 3' in text
+    assert 'test_latency_seconds_bucket{stage="parse",le="+Inf"} 4' in text
+    assert 'test_latency_seconds_sum{stage="parse"} 2.65' in text
+    assert 'test_latency_seconds_count{stage="parse"} 4' in text
+    assert 'test_events_total{kind="a \\"quoted\\" kind"} 1' in text
+
+
+def test_upload_records_backend_attempts_and_fallbacks():
+    import app
+
+    def failing(image_data):
+        raise Exception('throttled')
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (200, 120), 'white').save(buffer, format='JPEG')
+
+    saved = ocr_backends.BACKENDS, ocr_backends.BREAKERS, ocr_backends.BACKEND_ORDER, app.ocr_cache
+    ocr_backends.BACKENDS = {'amazon_textract': failing, 'google_vision': lambda image_data: 'Jane Doe'}
+    ocr_backends.BREAKERS = {name: CircuitBreaker(name) for name in ocr_backends.BACKENDS}
+    ocr_backends.BACKEND_ORDER = ['amazon_textract', 'google_vision']
+    app.ocr_cache = None
+    fallbacks = FALLBACKS.get(backend='amazon_textract', reason='error')
+    successes = BACKEND_SECONDS.count(backend='google_vision', outcome='success')
+    parses = PARSE_SECONDS.count()
+    try:
+        client = app.app.test_client()
+        response = client.post('/upload', data={'image': (io.BytesIO(buffer.getvalue()), 'card.jpg')})
+        assert response.get_json()['ocr_method'] == 'google_vision'
+
+        assert FALLBACKS.get(backend='amazon_textract', reason='error') == fallbacks + 1
+        assert BACKEND_SECONDS.count(backend='google_vision', outcome='success') == successes + 1
+        assert PARSE_SECONDS.count() == parses + 1
+
+        response = client.get('/metrics')
+        assert response.content_type.startswith('text/plain')
+        text = response.get_data(as_text=True)
+        assert 'ocr_request_seconds_count{endpoint="/upload",status="200"}' in text
+        assert 'ocr_request_size_bytes_bucket{endpoint="/upload",le="16384.0"}' in text
+        assert 'ocr_backend_attempt_seconds_count{backend="amazon_textract",outcome="error"}' in text
+    finally:
+        ocr_backends.BACKENDS, ocr_backends.BREAKERS, ocr_backends.BACKEND_ORDER, app.ocr_cache = saved
+
+
+if __name__ == "__main__":
+    test_histogram_buckets_are_cumulative()
+    test_upload_records_backend_attempts_and_fallbacks()
+    print("All metrics tests passed")
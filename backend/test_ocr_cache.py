@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed OCR result cache
+"""
+
+import io
+import os
+import tempfile
+import time
+
+from ocr_cache import OCRCache
+
+
+def sample_result(text):
+    return {
+        'raw_text': text,
+        'ocr_method': 'amazon_textract',
+        'parsed_data': {'name': text},
+        'parsing_method': 'rule_based',
+        'success': True
+    }
+
+
+def test_memory_hit_and_miss():
+    """Identical image bytes hit the cache, other bytes miss"""
+    cache = OCRCache(max_entries=4)
+    assert cache.get(b'card-1') is None
+    cache.put(b'card-1', sample_result('one'))
+
+    cached = cache.get(b'card-1')
+    assert cached == {'raw_text': 'one', 'ocr_method': 'amazon_textract', 'parsed_data': {'name': 'one'}}
+    assert cache.get(b'card-2') is None
+
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+
+
+def test_lru_eviction_and_ttl():
+    """The least recently used entry is evicted first and expired entries are dropped"""
+    cache = OCRCache(max_entries=2)
+    cache.put(b'a', sample_result('a'))
+    cache.put(b'b', sample_result('b'))
+    cache.get(b'a')
+    cache.put(b'c', sample_result('c'))
+    assert cache.get(b'b') is None
+    assert cache.get(b'a') is not None
+    assert cache.stats()['evictions'] == 1
+
+    short = OCRCache(ttl_seconds=0.01)
+    short.put(b'a', sample_result('a'))
+    time.sleep(0.02)
+    assert short.get(b'a') is None
+    assert short.stats()['expired'] == 1
+
+
+def test_disk_tier_survives_new_process_cache():
+    """A fresh cache pointed at the same SQLite file serves earlier results"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'ocr_cache.db')
+        OCRCache(disk_path=path).put(b'card', sample_result('disk'))
+
+        cache = OCRCache(disk_path=path)
+        assert cache.get(b'card')['raw_text'] == 'disk'
+        assert cache.stats()['disk_hits'] == 1
+        assert cache.get(b'card')['raw_text'] == 'disk'
+        assert cache.stats()['memory_hits'] == 1
+
+
+def test_upload_reuses_cached_ocr():
+    """A repeated upload of the same photo does not run OCR again"""
+    import app
+
+    calls = []
+
+    def fake_ocr(image_data):
+        calls.append(image_data)
+        return sample_result('John Smith')
+
+    original_ocr, original_cache = app.perform_ocr_with_rule_based_parsing, app.ocr_cache
+    app.perform_ocr_with_rule_based_parsing = fake_ocr
+    app.ocr_cache = OCRCache()
+    try:
+        client = app.app.test_client()
+        for _ in range(2):
+            response = client.post('/upload', data={'image': (io.BytesIO(b'same-photo'), 'card.jpg')})
+            assert response.status_code == 200
+        assert response.get_json()['cached'] is True
+        assert len(calls) == 1
+        assert client.get('/health').get_json()['ocr_cache']['hits'] == 1
+    finally:
+        app.perform_ocr_with_rule_based_parsing, app.ocr_cache = original_ocr, original_cache
+
+
+if __name__ == "__main__":
+    test_memory_hit_and_miss()
+    test_lru_eviction_and_ttl()
+    test_disk_tier_survives_new_process_cache()
+    test_upload_reuses_cached_ocr()
+    print("All OCR cache tests passed")
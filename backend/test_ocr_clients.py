@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for the pooled OCR API clients
+"""
+
+import threading
+
+from ocr_clients import ClientPool, StubTextractClient, textract_pool
+
+
+def counting_pool(fingerprint):
+    built = []
+
+    def factory():
+        built.append(object())
+        return built[-1]
+
+    return ClientPool('test', factory, fingerprint), built
+
+
+def test_client_built_once_and_shared_across_threads():
+    """Concurrent callers all receive the same lazily built client"""
+    pool, built = counting_pool(lambda: 'key')
+    seen = []
+    threads = [threading.Thread(target=lambda: seen.append(pool.get())) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1
+    assert all(client is built[0] for client in seen)
+
+
+def test_client_rebuilt_on_rotation_and_invalidate():
+    """Changed credentials or an explicit invalidate produce a fresh client"""
+    credentials = {'key': 'old'}
+    pool, built = counting_pool(lambda: credentials['key'])
+    first = pool.get()
+    assert pool.get() is first
+
+    credentials['key'] = 'new'
+    second = pool.get()
+    assert second is not first
+
+    pool.invalidate()
+    assert pool.get() is not second
+    assert pool.stats()['builds'] == 3
+
+
+def test_textract_extraction_with_stub_client():
+    """The Textract path works against the local stub backend"""
+    import ocr_textract
+
+    textract_pool.install(StubTextractClient(text='Jane Doe\nCEO'))
+    try:
+        assert ocr_textract.extract_text_with_textract(b'card') == 'Jane Doe\nCEO'
+    finally:
+        textract_pool.invalidate()
+
+
+if __name__ == "__main__":
+    test_client_built_once_and_shared_across_threads()
+    test_client_rebuilt_on_rotation_and_invalidate()
+    test_textract_extraction_with_stub_client()
+    print("All OCR client tests passed")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Tests for the asynchronous OCR job queue
+"""
+
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import ocr_jobs
+from ocr_jobs import DONE, FAILED, RUNNING, JobQueue, MemoryJobStore, QueueFull, SQLiteJobStore
+
+
+def fake_process(image_data):
+    if image_data == b'bad':
+        raise Exception('unreadable')
+    return {'text': image_data.decode(), 'success': True}
+
+
+def fake_error(error):
+    return {'error': str(error), 'success': False}
+
+
+def check_store(store):
+    jobs = JobQueue(store, fake_process, fake_error, workers=2)
+    good = jobs.submit(b'John Smith')
+    bad = jobs.submit(b'bad')
+
+    job = jobs.get(good, wait=5)
+    assert job['status'] == DONE
+    assert job['result'] == {'text': 'John Smith', 'success': True}
+
+    job = jobs.get(bad, wait=5)
+    assert job['status'] == FAILED
+    assert job['result']['error'] == 'unreadable'
+    assert jobs.get('missing') is None
+
+
+def test_memory_store_runs_jobs():
+    check_store(MemoryJobStore(max_pending=10, ttl_seconds=60))
+
+
+def test_sqlite_store_runs_jobs():
+    with tempfile.TemporaryDirectory() as directory:
+        check_store(SQLiteJobStore(os.path.join(directory, 'jobs.db'), max_pending=10,
+                                   ttl_seconds=60, poll_interval=0.01))
+
+
+def test_full_queue_rejects_new_jobs():
+    store = MemoryJobStore(max_pending=2, ttl_seconds=60)
+    store.enqueue('a', b'1')
+    store.enqueue('b', b'2')
+    try:
+        store.enqueue('c', b'3')
+        assert False, 'expected QueueFull'
+    except QueueFull:
+        pass
+
+
+def test_expired_leases_requeue_then_fail_jobs():
+    """A job claimed by a worker that died runs again after the lease, and fails after max_attempts"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteJobStore(os.path.join(directory, 'jobs.db'), max_pending=10, ttl_seconds=60,
+                               lease_seconds=0.05, max_attempts=2)
+        store.enqueue('a', b'John Smith')
+        assert store.claim(timeout=0)[:2] == ('a', b'John Smith')
+        assert store.claim(timeout=0) is None
+
+        time.sleep(0.1)
+        assert store.claim(timeout=0)[:2] == ('a', b'John Smith')
+        time.sleep(0.1)
+        assert store.claim(timeout=0) is None
+        job = store.get('a')
+        assert job['status'] == FAILED
+        assert job['result']['error'].startswith('Job worker stopped before finishing')
+        assert store.counts()[RUNNING] == 0
+
+
+class FlakyStore(MemoryJobStore):
+    """Fails the first claim and the first finish, as a locked SQLite file would"""
+
+    def __init__(self):
+        super().__init__(max_pending=10, ttl_seconds=60)
+        self.failures = {'claim', 'finish'}
+
+    def fail_once(self, operation):
+        if operation in self.failures:
+            self.failures.discard(operation)
+            raise sqlite3.OperationalError('database is locked')
+
+    def claim(self, timeout):
+        self.fail_once('claim')
+        return super().claim(timeout)
+
+    def finish(self, job_id, status, body):
+        self.fail_once('finish')
+        super().finish(job_id, status, body)
+
+
+def test_workers_survive_store_errors():
+    """Store errors are logged and retried; a dead worker is replaced on the next submit"""
+    backoff, ocr_jobs.STORE_ERROR_BACKOFF_SECONDS = ocr_jobs.STORE_ERROR_BACKOFF_SECONDS, 0.01
+    try:
+        jobs = JobQueue(FlakyStore(), fake_process, fake_error, workers=1)
+        jobs.submit(b'lost')  # claimed, then its finish fails
+        good = jobs.submit(b'John Smith')
+        assert jobs.get(good, wait=5)['status'] == DONE
+        assert not jobs.store.failures
+
+        dead = threading.Thread(target=lambda: None)
+        dead.start()
+        dead.join()
+        jobs.threads = [dead]
+        assert jobs.get(jobs.submit(b'Jane Doe'), wait=5)['status'] == DONE
+        assert len(jobs.threads) == 1 and jobs.threads[0].is_alive()
+    finally:
+        ocr_jobs.STORE_ERROR_BACKOFF_SECONDS = backoff
+
+
+def test_async_upload_endpoint():
+    """POST /upload?async=1 returns 202 and the result is fetched from /jobs/<id>"""
+    import app
+
+    release = threading.Event()
+
+    def slow_process(image_data):
+        release.wait(5)
+        return fake_process(image_data)
+
+    original = app.job_queue
+    app.job_queue = JobQueue(MemoryJobStore(max_pending=1, ttl_seconds=60), slow_process, fake_error, workers=1)
+    try:
+        client = app.app.test_client()
+        response = client.post('/upload?async=1', data={'image': (io.BytesIO(b'Jane Doe'), 'card.jpg')})
+        assert response.status_code == 202
+        job_id = response.get_json()['job_id']
+
+        response = client.post('/upload?async=1', data={'image': (io.BytesIO(b'Bob'), 'card.jpg')})
+        assert response.status_code == 429
+
+        assert client.get(f'/jobs/{job_id}').get_json()['status'] in ('queued', 'running')
+        release.set()
+        body = client.get(f'/jobs/{job_id}?wait=5').get_json()
+        assert body['status'] == 'done'
+        assert body['text'] == 'Jane Doe'
+        assert client.get('/jobs/unknown').status_code == 404
+    finally:
+        release.set()
+        app.job_queue = original
+
+
+if __name__ == "__main__":
+    test_memory_store_runs_jobs()
+    test_sqlite_store_runs_jobs()
+    test_full_queue_rejects_new_jobs()
+    test_expired_leases_requeue_then_fail_jobs()
+    test_workers_survive_store_errors()
+    test_async_upload_endpoint()
+    print("All OCR job tests passed")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared OCR line layout and the geometry-aware parser
+"""
+
+import pickle
+from types import SimpleNamespace
+
+from card_corpus import card_ocr_text, generate_cards
+from card_parser import CardExtractor, EXTRACTOR
+from ocr_layout import OcrLine, OcrText, from_lines, reading_order, textract_text, vision_text
+from tesseract_ocr import PRIMARY_CONFIG, result_from_data
+
+# Layout parsing is opt-in (OCR_LAYOUT_PARSING)
+LAYOUT_EXTRACTOR = CardExtractor(use_layout=True)
+
+
+def vision_word(text, left, top, right, bottom):
+    vertices = [SimpleNamespace(x=x, y=y) for x, y in ((left, top), (right, top), (right, bottom), (left, bottom))]
+    return SimpleNamespace(description=text, bounding_poly=SimpleNamespace(vertices=vertices))
+
+
+def test_backends_fill_the_same_structure():
+    textract = textract_text({'Blocks': [
+        {'BlockType': 'PAGE'},
+        {'BlockType': 'LINE', 'Text': 'Jane Doe', 'Confidence': 99.0,
+         'Geometry': {'BoundingBox': {'Left': 0.1, 'Top': 0.1, 'Width': 0.4, 'Height': 0.08}}},
+        {'BlockType': 'LINE', 'Text': 'CEO', 'Confidence': 90.0},
+    ]})
+    assert textract == 'Jane Doe\nCEO'
+    assert textract.lines[0] == OcrLine('Jane Doe', 0.1, 0.1, 0.4, 0.08, 0.99)
+    assert not textract.has_layout()
+
+    # Vision splits punctuation into its own words; they still line up with the text's lines
+    response = SimpleNamespace(
+        text_annotations=[SimpleNamespace(description='Jane Doe\nAcme, Inc.\n'),
+                          vision_word('Jane', 100, 50, 200, 90), vision_word('Doe', 210, 50, 300, 90),
+                          vision_word('Acme', 100, 120, 180, 140), vision_word(',', 180, 120, 185, 140),
+                          vision_word('Inc.', 190, 120, 240, 140)],
+        full_text_annotation=SimpleNamespace(pages=[SimpleNamespace(width=1000, height=500)]),
+    )
+    vision = vision_text(response)
+    assert vision == 'Jane Doe\nAcme, Inc.\n' and vision.has_layout()
+    assert [line.text for line in vision.lines] == ['Jane Doe', 'Acme, Inc.']
+    assert (vision.lines[1].left, vision.lines[1].top, vision.lines[1].height) == (0.1, 0.24, 0.04)
+
+    data = {
+        'level': [1, 5, 5, 5], 'text': ['', 'Jane', 'Doe', 'CEO'], 'conf': ['-1', '90', '80', '70'],
+        'block_num': [0, 1, 1, 1], 'par_num': [0, 1, 1, 1], 'line_num': [0, 1, 1, 2],
+        'left': [0, 10, 60, 10], 'top': [0, 10, 12, 40], 'width': [200, 40, 40, 30], 'height': [100, 20, 18, 10],
+    }
+    tesseract = result_from_data(PRIMARY_CONFIG, data).text
+    assert tesseract == 'Jane Doe\nCEO' and tesseract.has_layout()
+    assert tesseract.lines[0] == OcrLine('Jane Doe', 0.05, 0.1, 0.45, 0.2, 0.85)
+
+    # Tesseract results cross process boundaries
+    assert pickle.loads(pickle.dumps(tesseract)).lines == tesseract.lines
+
+
+def test_reading_order_joins_lines_on_one_row():
+    lines = [OcrLine('right', 0.6, 0.21, 0.2, 0.05), OcrLine('below', 0.1, 0.5, 0.2, 0.05),
+             OcrLine('left', 0.1, 0.2, 0.2, 0.05), OcrLine('top', 0.1, 0.05, 0.2, 0.05)]
+    assert [line.text for line in reading_order(lines)] == ['top', 'left', 'right', 'below']
+
+
+def test_largest_line_is_the_name():
+    """A company printed above the name no longer takes the name"""
+    lines = [
+        OcrLine('Bluepeak Studio', 0.3, 0.05, 0.4, 0.06),
+        OcrLine('Stefan Weber', 0.3, 0.15, 0.4, 0.09),
+        OcrLine('Lead Designer', 0.3, 0.28, 0.3, 0.05),
+        OcrLine('stefan@bluepeak.de', 0.3, 0.4, 0.3, 0.05),
+        OcrLine('Lindenallee 7, 10115 Berlin', 0.3, 0.5, 0.4, 0.05),
+    ]
+    text = from_lines(lines)
+    layout = LAYOUT_EXTRACTOR.parse(text)
+    assert layout['name'] == 'Stefan Weber'
+    assert layout['company'] == 'Bluepeak Studio'
+    assert layout['title'] == 'Lead Designer'
+    assert layout['email'] == 'stefan@bluepeak.de'
+    assert layout['address'] == 'Lindenallee 7, 10115 Berlin'
+
+    assert CardExtractor(use_layout=False).parse(text)['name'] == 'Bluepeak Studio'
+    # Without boxes the text parser is used
+    assert LAYOUT_EXTRACTOR.parse(OcrText(text, [OcrLine(line.text) for line in lines]))['name'] == 'Bluepeak Studio'
+
+
+def test_layout_parse_matches_text_parse_on_classic_cards():
+    """With the name printed largest and first, heights agree with the text parser's pick"""
+    cards = generate_cards(200, seed=5, layouts=('classic',), styles=('name_largest',))
+    for card in cards:
+        assert LAYOUT_EXTRACTOR.parse(card_ocr_text(card))['name'] == EXTRACTOR.parse(card['text'])['name']
+
+
+if __name__ == "__main__":
+    test_backends_fill_the_same_structure()
+    test_reading_order_joins_lines_on_one_row()
+    test_largest_line_is_the_name()
+    test_layout_parse_matches_text_parse_on_classic_cards()
+    print("All OCR layout tests passed")
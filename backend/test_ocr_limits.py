@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Tests for per-user rate limits, paid-backend quotas and fair OCR scheduling
+"""
+
+import io
+import os
+import tempfile
+import threading
+
+import ocr_backends
+from circuit_breaker import CircuitBreaker
+from ocr_jobs import DONE, MemoryJobStore, SQLiteJobStore
+from ocr_limits import (BackendQuota, FairExecutor, MemoryLimitStore, RateLimiter, SQLiteLimitStore,
+                        current_user, set_current_user, user_key)
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def check_bucket(store, clock):
+    limiter = RateLimiter(store, rate_per_minute=60, burst=3)
+    assert [limiter.acquire('alice') for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire('alice') == 1.0
+    assert limiter.acquire('bob') == 0
+    clock.now += 2
+    assert limiter.acquire('alice') == 0
+
+    # A batch bigger than the burst needs a full bucket, then leaves it in debt
+    clock.now += 10
+    assert limiter.acquire('alice', cost=5) == 0
+    assert limiter.acquire('alice') == 3.0
+
+
+def test_token_bucket_limits_each_user():
+    clock = FakeClock()
+    check_bucket(MemoryLimitStore(clock), clock)
+    with tempfile.TemporaryDirectory() as directory:
+        clock = FakeClock()
+        check_bucket(SQLiteLimitStore(os.path.join(directory, 'limits.db'), clock), clock)
+    assert user_key('  Alice ') == 'alice'
+    assert user_key('', '10.0.0.7') == 'ip:10.0.0.7'
+
+
+def test_idle_buckets_and_ended_windows_are_dropped():
+    """One entry per made-up username would otherwise stay in the store for good"""
+    clock = FakeClock()
+    store = MemoryLimitStore(clock)
+    limiter = RateLimiter(store, rate_per_minute=60, burst=3)
+    for number in range(100):
+        limiter.acquire(f'user{number}')
+    store.consume([('quota:alice', 5)], 1, window=60)
+    assert len(store.buckets) == 100 and len(store.windows) == 1
+
+    clock.now += 61
+    limiter.acquire('bob', cost=100)
+    assert list(store.buckets) == ['rate:bob'] and store.windows == {}
+    # bob's bucket is still paying back the big batch, so it is kept
+    clock.now += 61
+    limiter.acquire('carol')
+    assert sorted(store.buckets) == ['rate:bob', 'rate:carol']
+
+    with tempfile.TemporaryDirectory() as directory:
+        clock = FakeClock()
+        store = SQLiteLimitStore(os.path.join(directory, 'limits.db'), clock)
+        limiter = RateLimiter(store, rate_per_minute=60, burst=3)
+        for number in range(10):
+            limiter.acquire(f'user{number}')
+        clock.now += 61
+        limiter.acquire('bob')
+        assert store.stats()['buckets'] == 1
+
+
+def test_quota_skips_paid_backends_per_user_and_globally():
+    clock = FakeClock()
+    costs = {'amazon_textract': 1.0, 'tesseract': 0.0}
+    quota = BackendQuota(MemoryLimitStore(clock), costs, per_user=2, global_limit=3, window=60)
+    assert quota.acquire('amazon_textract', 'alice') and quota.acquire('amazon_textract', 'alice')
+    assert not quota.acquire('amazon_textract', 'alice')
+    assert quota.acquire('tesseract', 'alice')
+    assert quota.acquire('amazon_textract', 'bob')
+    assert not quota.acquire('amazon_textract', 'carol')
+    quota.release('amazon_textract', 'bob')
+    assert quota.acquire('amazon_textract', 'carol')
+    clock.now += 60
+    assert quota.acquire('amazon_textract', 'alice')
+
+    calls = []
+
+    def paid(image_data):
+        calls.append('paid')
+        return 'Jane Doe'
+
+    def free(image_data):
+        calls.append('free')
+        return 'Jane Doe'
+
+    original = ocr_backends.BACKENDS, ocr_backends.BREAKERS, ocr_backends.QUOTA
+    ocr_backends.BACKENDS = {'amazon_textract': paid, 'tesseract': free}
+    ocr_backends.BREAKERS = {name: CircuitBreaker(name) for name in ocr_backends.BACKENDS}
+    ocr_backends.QUOTA = BackendQuota(MemoryLimitStore(), costs, per_user=1, global_limit=0, window=60)
+    try:
+        order = ['amazon_textract', 'tesseract']
+        set_current_user('alice')
+        assert ocr_backends.run_ocr_chain(b'card', order) == ('Jane Doe', 'amazon_textract')
+        assert ocr_backends.run_ocr_chain(b'card', order) == ('Jane Doe', 'tesseract')
+        set_current_user('bob')
+        assert ocr_backends.run_ocr_chain(b'card', order) == ('Jane Doe', 'amazon_textract')
+        assert calls == ['paid', 'free', 'paid']
+    finally:
+        ocr_backends.BACKENDS, ocr_backends.BREAKERS, ocr_backends.QUOTA = original
+        set_current_user('anonymous')
+
+
+def check_turns(store):
+    for job_id, user_name in [('a1', 'alice'), ('a2', 'alice'), ('a3', 'alice'), ('a4', 'alice'),
+                              ('b1', 'bob'), ('b2', 'bob')]:
+        store.enqueue(job_id, job_id.encode(), user_name)
+    order = []
+    for _ in range(6):
+        job_id, image_data, user_name = store.claim(timeout=0)
+        assert image_data == job_id.encode() and user_name[0] == job_id[0]
+        order.append(job_id)
+        store.finish(job_id, DONE, {})
+    assert order == ['a1', 'b1', 'a2', 'b2', 'a3', 'a4']
+    assert store.claim(timeout=0) is None
+
+    # A newcomer goes first; then whoever has fewer jobs running
+    for job_id, user_name in [('a5', 'alice'), ('a6', 'alice'), ('c1', 'carol'), ('c2', 'carol')]:
+        store.enqueue(job_id, b'', user_name)
+    assert [store.claim(timeout=0)[0] for _ in range(4)] == ['c1', 'a5', 'c2', 'a6']
+
+
+def test_job_stores_take_turns_between_users():
+    check_turns(MemoryJobStore(max_pending=10, ttl_seconds=60))
+    with tempfile.TemporaryDirectory() as directory:
+        check_turns(SQLiteJobStore(os.path.join(directory, 'jobs.db'), max_pending=10, ttl_seconds=60))
+
+
+def test_fair_executor_interleaves_users():
+    executor = FairExecutor(workers=1)
+    release = threading.Event()
+    order = []
+
+    def work(label):
+        release.wait(5)
+        order.append((label, current_user()))
+        return label
+
+    futures = [executor.submit('alice', work, label) for label in ('a0', 'a1', 'a2', 'a3')]
+    futures.append(executor.submit('bob', work, 'b1'))
+    futures[2].cancel()
+    release.set()
+    assert [future.result(5) for future in futures if not future.cancelled()] == ['a0', 'a1', 'a3', 'b1']
+    assert order == [('a0', 'alice'), ('b1', 'bob'), ('a1', 'alice'), ('a3', 'alice')]
+    assert executor.stats()['queued'] == 0
+
+
+def test_upload_is_rate_limited_per_user():
+    import app
+
+    original = app.process_image, app.rate_limiter
+    app.process_image = lambda image_data: {'text': image_data.decode(), 'success': True}
+    app.rate_limiter = RateLimiter(MemoryLimitStore(FakeClock()), rate_per_minute=6, burst=2)
+    try:
+        client = app.app.test_client()
+
+        def upload(username):
+            return client.post('/upload', data={'image': (io.BytesIO(b'Jane Doe'), 'card.jpg'), 'username': username})
+
+        assert [upload('alice').status_code for _ in range(2)] == [200, 200]
+        response = upload('Alice')
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '10'
+        assert upload('bob').status_code == 200
+    finally:
+        app.process_image, app.rate_limiter = original
+
+
+if __name__ == "__main__":
+    test_token_bucket_limits_each_user()
+    test_idle_buckets_and_ended_windows_are_dropped()
+    test_quota_skips_paid_backends_per_user_and_globally()
+    test_job_stores_take_turns_between_users()
+    test_fair_executor_interleaves_users()
+    test_upload_is_rate_limited_per_user()
+    print("All OCR limit tests passed")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for structured, non-blocking request logging
+"""
+
+import io
+import logging
+import threading
+
+from PIL import Image
+
+import ocr_backends
+from circuit_breaker import CircuitBreaker
+from ocr_logging import NonBlockingQueueHandler, logger, redact
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_redact_masks_emails_and_numbers():
+    text = 'Jane Doe\njane.doe@acme.com\n+1 (555) 123-4567'
+    assert redact(text) == 'Jane Doe\nj***@acme.com\n+# (###) ###-##67'
+    assert redact({'phone': '555 1234', 'lines': ['ext 12']}) == {'phone': '### ##34', 'lines': ['ext 12']}
+
+
+def test_full_queue_drops_instead_of_blocking():
+    release = threading.Event()
+
+    class SlowHandler(logging.Handler):
+        def emit(self, record):
+            release.wait(5)
+
+    handler = NonBlockingQueueHandler(SlowHandler(), max_size=2)
+    test_logger = logging.getLogger('ocr_test_dropping')
+    test_logger.addHandler(handler)
+    test_logger.propagate = False
+    try:
+        for index in range(10):
+            test_logger.warning('record %d', index)
+        assert handler.dropped >= 7
+    finally:
+        release.set()
+        handler.flush()
+        handler.listener.stop()
+
+
+def test_upload_writes_one_summary_and_debug_dump_on_request():
+    import app
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (200, 120), 'white').save(buffer, format='JPEG')
+    image = buffer.getvalue()
+
+    saved = ocr_backends.BACKENDS, ocr_backends.BREAKERS, ocr_backends.BACKEND_ORDER, app.ocr_cache
+    ocr_backends.BACKENDS = {'google_vision': lambda image_data: 'Jane Doe\njane@acme.com'}
+    ocr_backends.BREAKERS = {name: CircuitBreaker(name) for name in ocr_backends.BACKENDS}
+    ocr_backends.BACKEND_ORDER = ['google_vision']
+    app.ocr_cache = None
+    capture = ListHandler()
+    logger.addHandler(capture)
+    try:
+        client = app.app.test_client()
+        response = client.post('/upload', data={'image': (io.BytesIO(image), 'card.jpg')})
+        assert response.status_code == 200
+        summaries = [record for record in capture.records if record.getMessage() == 'request']
+        assert len(summaries) == 1
+        fields = summaries[0].fields
+        assert fields['request_id'] == response.headers['X-Request-ID']
+        assert fields['ocr_method'] == 'google_vision' and fields['status'] == 200
+        assert fields['attempts'][0]['outcome'] == 'success'
+        # No card contents in the default records
+        assert not any('jane@acme.com' in str(getattr(record, 'fields', '')) for record in capture.records)
+
+        capture.records.clear()
+        response = client.post('/upload', data={'image': (io.BytesIO(image), 'card.jpg')},
+                               headers={'X-OCR-Debug': '1'})
+        dumps = [record for record in capture.records if record.name == 'ocr.debug']
+        assert len(dumps) == 1
+        assert dumps[0].fields['request_id'] == response.headers['X-Request-ID']
+        assert dumps[0].fields['parsed_data']['email'] == 'j***@acme.com'
+    finally:
+        logger.removeHandler(capture)
+        ocr_backends.BACKENDS, ocr_backends.BREAKERS, ocr_backends.BACKEND_ORDER, app.ocr_cache = saved
+
+
+if __name__ == "__main__":
+    test_redact_masks_emails_and_numbers()
+    test_full_queue_drops_instead_of_blocking()
+    test_upload_writes_one_summary_and_debug_dump_on_request()
+    print("All logging tests passed")
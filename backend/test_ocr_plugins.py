@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Tests for the lazily imported OCR backend registry
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from ocr_plugins import BackendPlugin
+
+SDK_MODULES = ('google.cloud.vision', 'botocore', 'pytesseract')
+
+CHECK_SCRIPT = '''
+import json, sys
+import app, ocr_backends
+before = [name for name in %r if name in sys.modules]
+ocr_backends.warm_backends()
+after = [name for name in %r if name in sys.modules]
+print('RESULT', json.dumps({'enabled': list(ocr_backends.BACKENDS), 'before': before, 'after': after}), file=sys.stderr)
+''' % (SDK_MODULES, SDK_MODULES)
+
+
+def imports_with(env):
+    # The result goes to stderr: the JSON log lines written to stdout from the log thread can interleave with it
+    output = subprocess.run([sys.executable, '-c', CHECK_SCRIPT], env=dict(os.environ, **env), check=True,
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stderr
+    return json.loads([line for line in output.splitlines() if line.startswith('RESULT ')][0][7:])
+
+
+def test_app_import_loads_no_ocr_sdk():
+    """SDKs load on warm-up only, and a backend left out of the order is never loaded"""
+    result = imports_with({'OCR_BACKEND_ORDER': 'tesseract', 'OCR_WARM_BACKENDS': 'false'})
+    assert result == {'enabled': ['tesseract'], 'before': [], 'after': ['pytesseract']}
+
+
+def test_plugin_imports_on_first_call():
+    plugin = BackendPlugin('upper', 'string:capwords')
+    assert plugin.snapshot() == {'loaded': False, 'import_ms': None}
+    assert plugin('jane doe') == 'Jane Doe'
+    assert plugin.snapshot()['loaded'] and plugin.load() is plugin.function
+
+
+if __name__ == "__main__":
+    test_app_import_loads_no_ocr_sdk()
+    test_plugin_imports_on_first_call()
+    print("All OCR plugin tests passed")
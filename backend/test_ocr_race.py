@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Tests for the hedged OCR racing mode
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+
+import ocr_backends
+from circuit_breaker import HALF_OPEN, CircuitBreaker
+
+
+def with_backends(backends, costs, test):
+    """Run a test against fake backends, restoring the real ones afterwards"""
+    saved = ocr_backends.BACKENDS, ocr_backends.BREAKERS, ocr_backends.BACKEND_COSTS
+    ocr_backends.BACKENDS = backends
+    ocr_backends.BREAKERS = {name: CircuitBreaker(name) for name in backends}
+    ocr_backends.BACKEND_COSTS = costs
+    try:
+        test()
+    finally:
+        ocr_backends.BACKENDS, ocr_backends.BREAKERS, ocr_backends.BACKEND_COSTS = saved
+
+
+def sleeping(seconds, text, calls, name):
+    def backend(image_data):
+        calls.append(name)
+        time.sleep(seconds)
+        return text
+    return backend
+
+
+ORDER = ['amazon_textract', 'google_vision', 'tesseract']
+
+
+def test_hedge_beats_slow_primary():
+    """A slow primary is overtaken by the hedged backend"""
+    calls = []
+    backends = {
+        'amazon_textract': sleeping(1.0, 'slow', calls, 'amazon_textract'),
+        'google_vision': sleeping(0.01, 'fast', calls, 'google_vision'),
+        'tesseract': sleeping(0.01, 'local', calls, 'tesseract'),
+    }
+
+    def test():
+        start = time.perf_counter()
+        result = ocr_backends.run_ocr_race(b'card', ORDER, hedge_delay=0.05, budget=2.0)
+        assert result == ('fast', 'google_vision')
+        assert time.perf_counter() - start < 0.5
+        assert calls == ['amazon_textract', 'google_vision']
+
+    with_backends(backends, {'amazon_textract': 1.0, 'google_vision': 1.0, 'tesseract': 0.0}, test)
+
+
+def test_budget_prevents_double_billing():
+    """With room for one paid call and no free backend, nothing is hedged"""
+    calls = []
+    backends = {
+        'amazon_textract': sleeping(0.3, 'slow', calls, 'amazon_textract'),
+        'google_vision': sleeping(0.01, 'paid', calls, 'google_vision'),
+    }
+
+    def test():
+        result = ocr_backends.run_ocr_race(b'card', ['amazon_textract', 'google_vision'],
+                                           hedge_delay=0.05, budget=1.0)
+        assert result == ('slow', 'amazon_textract')
+        assert calls == ['amazon_textract']
+
+    with_backends(backends, {'amazon_textract': 1.0, 'google_vision': 1.0}, test)
+
+
+def test_hedge_skips_ahead_to_free_backend():
+    """With room for one paid call, the hedge passes over Vision and races the free Tesseract"""
+    calls = []
+    backends = {
+        'amazon_textract': sleeping(0.5, 'slow', calls, 'amazon_textract'),
+        'google_vision': sleeping(0.01, 'paid', calls, 'google_vision'),
+        'tesseract': sleeping(0.01, 'local', calls, 'tesseract'),
+    }
+
+    def test():
+        result = ocr_backends.run_ocr_race(b'card', ORDER, hedge_delay=0.05, budget=1.0)
+        assert result == ('local', 'tesseract')
+        assert calls == ['amazon_textract', 'tesseract']
+
+    with_backends(backends, {'amazon_textract': 1.0, 'google_vision': 1.0, 'tesseract': 0.0}, test)
+
+
+def test_failure_falls_through_without_waiting():
+    """A failing backend is followed immediately, regardless of the budget"""
+    def failing(image_data):
+        raise Exception('down')
+
+    backends = {
+        'amazon_textract': failing,
+        'google_vision': sleeping(0.01, 'vision', [], 'google_vision'),
+    }
+
+    def test():
+        start = time.perf_counter()
+        result = ocr_backends.run_ocr_race(b'card', ['amazon_textract', 'google_vision'],
+                                           hedge_delay=5.0, budget=1.0)
+        assert result == ('vision', 'google_vision')
+        assert time.perf_counter() - start < 1.0
+
+    with_backends(backends, {'amazon_textract': 1.0, 'google_vision': 1.0}, test)
+
+
+class OneWorkerExecutor:
+    """Runs the first task submitted; later ones wait in the queue for good"""
+
+    def __init__(self):
+        self.worker = None
+        self.queued = []
+
+    def submit(self, function, *args):
+        future = Future()
+        if self.worker:
+            self.queued.append(future)
+            return future
+
+        def run():
+            future.set_running_or_notify_cancel()
+            future.set_result(function(*args))
+        self.worker = threading.Thread(target=run)
+        self.worker.start()
+        return future
+
+
+def test_cancelled_hedge_releases_its_probe():
+    """A half-open probe cancelled while queued does not keep the backend skipped"""
+    calls = []
+    backends = {
+        'amazon_textract': sleeping(0.2, 'primary', calls, 'amazon_textract'),
+        'google_vision': sleeping(0.01, 'probe', calls, 'google_vision'),
+    }
+
+    def test():
+        breaker = ocr_backends.BREAKERS['google_vision']
+        breaker.state = HALF_OPEN
+        # The only worker is busy with the primary, so the hedge waits in the queue until it is cancelled
+        executor = OneWorkerExecutor()
+        saved, ocr_backends.hedge_executor = ocr_backends.hedge_executor, executor
+        try:
+            result = ocr_backends.run_ocr_race(b'card', ['amazon_textract', 'google_vision'],
+                                               hedge_delay=0.05, budget=2.0)
+        finally:
+            ocr_backends.hedge_executor = saved
+        assert result == ('primary', 'amazon_textract')
+        assert calls == ['amazon_textract'] and executor.queued[0].cancelled()
+        assert breaker.allow_request()
+
+    with_backends(backends, {'amazon_textract': 1.0, 'google_vision': 1.0}, test)
+
+
+if __name__ == "__main__":
+    test_hedge_beats_slow_primary()
+    test_budget_prevents_double_billing()
+    test_hedge_skips_ahead_to_free_backend()
+    test_failure_falls_through_without_waiting()
+    test_cancelled_hedge_releases_its_probe()
+    print("All OCR race tests passed")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Tests for confidence-driven Tesseract OCR (pytesseract calls are faked)
+"""
+
+from PIL import Image
+
+import card_parser
+import tesseract_ocr
+from tesseract_ocr import FALLBACK_CONFIGS, PRIMARY_CONFIG, result_from_data, run_tesseract_smart
+
+
+def fake_data(words, confidence):
+    """image_to_data style dict with one word per line"""
+    count = len(words)
+    return {
+        'text': words,
+        'conf': [confidence] * count,
+        'block_num': [1] * count,
+        'par_num': [1] * count,
+        'line_num': list(range(1, count + 1)),
+    }
+
+
+def with_fake_tesseract(results, test):
+    calls = []
+
+    def image_to_data(image_path, config, output_type):
+        calls.append(config)
+        return results[config]
+
+    original = tesseract_ocr.pytesseract.image_to_data
+    tesseract_ocr.pytesseract.image_to_data = image_to_data
+    try:
+        test(calls)
+    finally:
+        tesseract_ocr.pytesseract.image_to_data = original
+
+
+def test_result_from_data_groups_lines_and_skips_noise():
+    data = {
+        'text': ['', 'John', 'Smith', 'CEO', '~'],
+        'conf': ['-1', '95', '85.5', '90', '-1'],
+        'block_num': [1, 1, 1, 1, 1],
+        'par_num': [1, 1, 1, 1, 1],
+        'line_num': [0, 1, 1, 2, 2],
+    }
+    result = result_from_data(PRIMARY_CONFIG, data)
+    assert result.text == 'John Smith\nCEO'
+    assert result.words == 3
+    assert round(result.confidence, 2) == 90.17
+
+
+def test_confident_first_pass_runs_once():
+    """A confident first pass does not trigger any other page segmentation mode"""
+    results = {PRIMARY_CONFIG: fake_data(['Jane', 'Doe'], 92)}
+
+    def test(calls):
+        text, confidence = run_tesseract_smart(Image.new('L', (50, 20), 255))
+        assert text == 'Jane\nDoe'
+        assert confidence == 92
+        assert calls == [PRIMARY_CONFIG]
+
+    with_fake_tesseract(results, test)
+
+
+def test_low_confidence_tries_other_modes_and_keeps_best():
+    results = {
+        PRIMARY_CONFIG: fake_data(['J@ne'], 20),
+        FALLBACK_CONFIGS[0]: fake_data(['Jane', 'Doe'], 80),
+        FALLBACK_CONFIGS[1]: fake_data(['Jane'], 70),
+    }
+
+    def test(calls):
+        text, confidence = run_tesseract_smart(Image.new('L', (50, 20), 255))
+        assert text == 'Jane\nDoe'
+        assert confidence == 80
+        assert sorted(calls) == sorted([PRIMARY_CONFIG] + FALLBACK_CONFIGS)
+
+    with_fake_tesseract(results, test)
+
+
+def test_low_confidence_pass_that_parses_confidently_is_kept():
+    """Artwork drags the mean confidence down, but the contact lines are sure: no fallback passes"""
+    lines = ['Jane Doe', 'Acme Corp', 'jane@acme.com', '555-987-6543']
+    data = fake_data(lines + ['~~'] * 6, 95)
+    data['conf'][len(lines):] = [5] * 6
+    results = {PRIMARY_CONFIG: data}
+
+    def test(calls):
+        text, confidence = run_tesseract_smart(Image.new('L', (50, 20), 255))
+        assert text.startswith('Jane Doe\nAcme Corp')
+        assert confidence == 41
+        assert calls == [PRIMARY_CONFIG]
+
+        # The parse that judged the pass is the one the response uses
+        parse = card_parser.EXTRACTOR.parse
+        card_parser.EXTRACTOR.parse = None
+        try:
+            info = card_parser.extract_business_card_info(text)
+        finally:
+            del card_parser.EXTRACTOR.parse
+        assert info['email'] == 'jane@acme.com' and info['raw_text'] is text
+        assert info == dict(parse(text), raw_text=text)
+
+    with_fake_tesseract(results, test)
+
+
+if __name__ == "__main__":
+    test_result_from_data_groups_lines_and_skips_noise()
+    test_confident_first_pass_runs_once()
+    test_low_confidence_tries_other_modes_and_keeps_best()
+    test_low_confidence_pass_that_parses_confidently_is_kept()
+    print("All Tesseract OCR tests passed")
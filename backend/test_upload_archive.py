@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Tests for the background upload archive
+"""
+
+import io
+import os
+import tempfile
+import time
+
+from ocr_cache import image_digest
+from upload_archive import UploadArchive
+
+
+def test_duplicates_stored_once_by_content_hash():
+    with tempfile.TemporaryDirectory() as directory:
+        archive = UploadArchive(directory)
+        for _ in range(3):
+            archive.submit(b'\xff\xd8 same card')
+        archive.submit(b'\x89PNG other card')
+        archive.flush()
+
+        names = os.listdir(directory)
+        assert sorted(os.path.splitext(name)[1] for name in names) == ['.jpg', '.png']
+        assert image_digest(b'\xff\xd8 same card') + '.jpg' in names
+        stats = archive.stats()
+        assert stats['archived'] == 2 and stats['duplicates'] == 2
+
+
+def test_oldest_files_evicted_past_size_cap():
+    with tempfile.TemporaryDirectory() as directory:
+        archive = UploadArchive(directory, max_bytes=250)
+        for index in range(4):
+            archive.submit(bytes([index]) * 100)
+            archive.flush()
+            time.sleep(0.01)
+        # The first upload comes back, so it is no longer the oldest
+        archive.submit(bytes([1]) * 100)
+        archive.submit(bytes([4]) * 100)
+        archive.flush()
+
+        stats = archive.stats()
+        assert stats['bytes'] <= 250 and stats['files'] == 2
+        assert sorted(os.listdir(directory)) == sorted(
+            image_digest(bytes([index]) * 100) + '.jpg' for index in (1, 4))
+        assert sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)) <= 250
+
+
+def test_existing_files_counted_after_restart():
+    with tempfile.TemporaryDirectory() as directory:
+        first = UploadArchive(directory)
+        first.submit(b'a' * 100)
+        first.flush()
+
+        second = UploadArchive(directory, max_bytes=150)
+        second.submit(b'b' * 100)
+        second.flush()
+        # The file left by the first run is evicted to make room
+        assert os.listdir(directory) == [image_digest(b'b' * 100) + '.jpg']
+
+
+def test_size_cap_shared_by_workers():
+    with tempfile.TemporaryDirectory() as directory:
+        # Two workers over one directory, each started before the other wrote
+        workers = [UploadArchive(directory, max_bytes=250, rescan_seconds=60) for _ in range(2)]
+        for worker in workers:
+            worker.submit(b'\xff\xd8 warm up')
+            worker.flush()
+        for index in range(3):
+            for number, worker in enumerate(workers):
+                worker.submit(bytes([number, index]) * 50)
+                worker.flush()
+                time.sleep(0.01)
+
+        names = os.listdir(directory)
+        assert sum(os.path.getsize(os.path.join(directory, name)) for name in names) <= 250
+        # The newest files survive whichever worker wrote them
+        assert image_digest(bytes([1, 2]) * 50) + '.jpg' in names
+        assert image_digest(bytes([0, 2]) * 50) + '.jpg' in names
+        assert sum(worker.stats()['evicted'] for worker in workers) >= 4
+
+        # A file another worker evicted is written again rather than counted as a duplicate
+        first = workers[0]
+        first.submit(b'\xff\xd8 warm up')
+        first.flush()
+        assert image_digest(b'\xff\xd8 warm up') + '.jpg' in os.listdir(directory)
+
+
+def test_sampling_and_full_queue_never_block():
+    with tempfile.TemporaryDirectory() as directory:
+        archive = UploadArchive(directory, sample_rate=0.0)
+        archive.submit(b'card')
+        assert archive.stats()['sampled_out'] == 1 and archive.thread is None
+
+        archive = UploadArchive(directory, max_queue=1)
+        archive.write = lambda image_data: time.sleep(0.2)
+        start = time.perf_counter()
+        for index in range(10):
+            archive.submit(bytes([index]))
+        assert time.perf_counter() - start < 0.1
+        assert archive.stats()['dropped'] >= 8
+
+
+def test_upload_uses_archive_only_when_enabled():
+    import app
+
+    submitted = []
+    original_archive, original_process = app.upload_archive, app.process_image
+    app.process_image = lambda image_data: {'text': '', 'success': True}
+    try:
+        client = app.app.test_client()
+        app.upload_archive = None
+        assert client.post('/upload', data={'image': (io.BytesIO(b'card'), 'card.jpg')}).status_code == 200
+
+        app.upload_archive = type('Archive', (), {'submit': lambda self, data: submitted.append(data),
+                                                  'stats': lambda self: {}})()
+        assert client.post('/upload', data={'image': (io.BytesIO(b'card'), 'card.jpg')}).status_code == 200
+        assert submitted == [b'card']
+    finally:
+        app.upload_archive, app.process_image = original_archive, original_process
+
+
+if __name__ == "__main__":
+    test_duplicates_stored_once_by_content_hash()
+    test_oldest_files_evicted_past_size_cap()
+    test_existing_files_counted_after_restart()
+    test_size_cap_shared_by_workers()
+    test_sampling_and_full_queue_never_block()
+    test_upload_uses_archive_only_when_enabled()
+    print("All upload archive tests passed")
@@ -0,0 +1,161 @@
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from ocr_cache import image_digest
+from ocr_logging import log_event
+
+log = logging.getLogger('ocr.archive')
+
+
+def image_extension(image_data):
+    """File extension from the image's magic bytes"""
+    if image_data.startswith(b'\x89PNG'):
+        return '.png'
+    if image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
+        return '.webp'
+    return '.jpg'
+
+
+class UploadArchive:
+    """Sampled copies of uploaded images, written off the request path.
+
+    Files are named by content hash so repeated uploads are stored once, and
+    the directory is kept under max_bytes by deleting the oldest files first.
+    When the write queue is full new uploads are dropped rather than waited on.
+
+    The cap covers the whole directory, not just this process's writes: each
+    worker rescans it (sizes and mtimes) at most every rescan_seconds, and
+    always before evicting, so files written by other workers are counted and
+    evicted too. Disk use can overshoot by what the other workers write
+    between two rescans.
+    """
+
+    def __init__(self, directory, sample_rate=1.0, max_bytes=500 * 1024 * 1024, max_queue=64,
+                 rescan_seconds=5.0):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.rescan_seconds = rescan_seconds
+        self.scanned_at = None
+        self.pending = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.files = None  # name -> size, oldest first; loaded by the writer thread
+        self.total_bytes = 0
+        self.counters = {'archived': 0, 'duplicates': 0, 'evicted': 0, 'dropped': 0, 'sampled_out': 0, 'errors': 0}
+
+    def submit(self, image_data):
+        """Queue an upload for archiving; never blocks"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.counters['sampled_out'] += 1
+            return
+        self.start()
+        try:
+            self.pending.put_nowait(image_data)
+        except queue.Full:
+            self.counters['dropped'] += 1
+
+    def start(self):
+        """Start the writer thread on first use (after any pre-fork)"""
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='upload-archive', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            image_data = self.pending.get()
+            try:
+                self.write(image_data)
+            except OSError as e:
+                self.counters['errors'] += 1
+                log_event(log, logging.WARNING, 'Upload archive write failed', error=str(e))
+            finally:
+                self.pending.task_done()
+
+    def load(self):
+        """Index the files on disk, including other workers', oldest first"""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        entries.sort()
+        self.files = OrderedDict((name, size) for _, name, size in entries)
+        self.total_bytes = sum(self.files.values())
+        self.scanned_at = time.monotonic()
+
+    def write(self, image_data):
+        if self.files is None or time.monotonic() - self.scanned_at >= self.rescan_seconds:
+            self.load()
+        name = image_digest(image_data) + image_extension(image_data)
+        path = os.path.join(self.directory, name)
+
+        if name in self.files:
+            # Seen before: mark it recently used instead of writing it again
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                # Another worker evicted it since the last scan
+                self.total_bytes -= self.files.pop(name)
+            else:
+                self.files.move_to_end(name)
+                self.counters['duplicates'] += 1
+                return
+
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(image_data)
+        os.replace(temp_path, path)
+        self.files[name] = len(image_data)
+        self.total_bytes += len(image_data)
+        self.counters['archived'] += 1
+
+        if self.total_bytes > self.max_bytes:
+            # Evict from the directory as it is now, not from this process's view
+            self.load()
+        while self.total_bytes > self.max_bytes and len(self.files) > 1:
+            oldest, size = self.files.popitem(last=False)
+            try:
+                os.remove(os.path.join(self.directory, oldest))
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+            self.counters['evicted'] += 1
+
+    def flush(self):
+        """Wait for queued writes to finish"""
+        self.pending.join()
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats.update(
+            directory=self.directory,
+            sample_rate=self.sample_rate,
+            queued=self.pending.qsize(),
+            files=len(self.files or ()),
+            bytes=self.total_bytes,
+            max_bytes=self.max_bytes,
+        )
+        return stats
+
+
+def archive_from_env():
+    """Build the upload archive from environment settings, or None when disabled"""
+    if os.getenv('OCR_ARCHIVE_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    return UploadArchive(
+        directory=os.getenv('OCR_ARCHIVE_DIR', 'static/uploads'),
+        sample_rate=float(os.getenv('OCR_ARCHIVE_SAMPLE_RATE', '1.0')),
+        max_bytes=int(os.getenv('OCR_ARCHIVE_MAX_BYTES', str(500 * 1024 * 1024))),
+        max_queue=int(os.getenv('OCR_ARCHIVE_QUEUE_SIZE', '64')),
+        rescan_seconds=float(os.getenv('OCR_ARCHIVE_RESCAN_SECONDS', '5')),
+    )
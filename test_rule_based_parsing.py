@@ -5,7 +5,7 @@ Test script for rule-based business card parsing
 
 import sys
 import os
-sys.path.append('/home/maverick/Documents/PROJECTS/Card_OCR/backend')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
 
 from app import extract_business_card_info
 